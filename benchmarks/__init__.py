@@ -0,0 +1,12 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Allow running from a source checkout where the package is not installed as hqf_de
+try:
+    import hqf_de
+except ImportError:
+    sys.path.insert(0, str(ROOT))
+    import src as hqf_de
+    sys.modules["hqf_de"] = hqf_de
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import argparse
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from .corpus import make_corpus, write_corpus
+from .stages import BM25_DIR, Skip
+
+CODECS = ["vbyte", "pfor"]
+REPEAT = 3
+
+
+def _compile(work):
+    if not shutil.which("g++"):
+        raise Skip("g++ not found")
+    for name in ("indexer", "merger", "query"):
+        subprocess.run(["g++", "-O2", "-std=c++17", "-pthread", "-o", str(work / name), str(BM25_DIR / f"{name}.cpp")], check=True)
+
+
+def _query_seconds(work, queries, repeat):
+    empty = work / "empty.tsv"
+    empty.write_text("")
+
+    def run(path):
+        start = time.perf_counter()
+        subprocess.run([str(work / "query"), str(path)], cwd=work, check=True, capture_output=True)
+        return time.perf_counter() - start
+    return max(min(run(queries) for _ in range(repeat)) - min(run(empty) for _ in range(repeat)), 1e-9)
+
+
+def _python_decode(work, repeat):
+    from hqf_de.bm25.reader import BM25Index
+    with BM25Index(work / "index") as ix:
+        blocks = len(ix.last_doc_ids)
+        postings = sum(len(ix.read_block(i)[0]) for i in range(blocks))
+        best = min(_timed(lambda: [ix.read_block(i) for i in range(blocks)]) for _ in range(repeat))
+    return postings, postings / best
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+# Index size and decode speed per posting codec on one collection: the C++ query binary (OR over the
+# queries, index load excluded) and the NumPy block decoders in hqf_de.bm25.reader
+def main():
+    parser = argparse.ArgumentParser(description="Posting codec benchmark: index size and decode speed")
+    parser.add_argument("--collection", type=Path, help="TSV collection (default: synthetic corpus)")
+    parser.add_argument("--queries", type=Path, help="TSV queries for the C++ timing")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        collection, queries = args.collection, args.queries
+        if not collection:
+            docs, qs, qrels = make_corpus(args.docs, args.num_queries)
+            data = write_corpus(work / "data", docs, qs, qrels)
+            collection, queries = data / "collection.tsv", queries or data / "queries.tsv"
+        _compile(work)
+        (work / "partial").mkdir()
+        (work / "index").mkdir()
+        subprocess.run([str(work / "indexer"), str(collection)], cwd=work, check=True, capture_output=True)
+        runs = len(list((work / "partial").glob("run_*.bin")))
+
+        print("| Codec | Index MB | Bytes/posting | C++ query s | NumPy decode Mpostings/s |")
+        print("|-------|----------|---------------|-------------|--------------------------|")
+        for codec in CODECS:
+            subprocess.run([str(work / "merger"), str(runs), "--codec", codec], cwd=work, check=True, capture_output=True)
+            size = (work / "index" / "inverted_index.bin").stat().st_size
+            postings, rate = _python_decode(work, args.repeat)
+            cpp = f"{_query_seconds(work, queries, args.repeat):.3f}" if queries else "-"
+            print(f"| {codec} | {size / 2**20:.1f} | {size / max(postings, 1):.2f} | {cpp} | {rate / 1e6:.2f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import random
+from pathlib import Path
+
+CONSONANTS = "bcdfghklmnprstvz"
+VOWELS = "aeiou"
+VOCAB_SIZE = 5000
+DOC_LENGTH = (40, 80)
+QUERY_LENGTH = (3, 8)
+
+
+def _vocab(rng, size):
+    words = set()
+    while len(words) < size:
+        n = rng.randint(2, 4)
+        words.add("".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(n)))
+    return sorted(words)
+
+
+def make_corpus(num_docs=1000, num_queries=100, seed=0):
+    rng = random.Random(seed)
+    vocab = _vocab(rng, VOCAB_SIZE)
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+
+    docs = []
+    for i in range(num_docs):
+        words = rng.choices(vocab, weights, k=rng.randint(*DOC_LENGTH))
+        text = " ".join(words).capitalize() + "."
+        docs.append((str(i), text))
+
+    queries, qrels = [], {}
+    for i in range(num_queries):
+        pid, text = docs[rng.randrange(num_docs)]
+        words = text.rstrip(".").lower().split()
+        qid = str(1000000 + i)
+        queries.append((qid, " ".join(rng.sample(words, min(len(words), rng.randint(*QUERY_LENGTH))))))
+        qrels[qid] = {pid: 1}
+    return docs, queries, qrels
+
+
+def write_corpus(out_dir, docs, queries, qrels):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / "collection.tsv", "w", encoding="utf-8") as f:
+        for pid, text in docs:
+            f.write(f"{pid}\t{text}\n")
+    with open(out_dir / "queries.tsv", "w", encoding="utf-8") as f:
+        for qid, text in queries:
+            f.write(f"{qid}\t{text}\n")
+    with open(out_dir / "qrels.tsv", "w", encoding="utf-8") as f:
+        for qid, rels in qrels.items():
+            for pid, rel in rels.items():
+                f.write(f"{qid}\t0\t{pid}\t{rel}\n")
+    return out_dir
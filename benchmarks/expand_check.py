@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from .corpus import make_corpus
+
+BATCH_SIZE = 8
+CPU_WORKERS = 4
+
+
+# Stand-in for a fast HF tokenizer: using it from two threads at once raises "Already borrowed",
+# like the Rust tokenizer does. Texts are interned, a row is [text id, filler...] with one slot per word.
+class _Tokenizer:
+    pad_token_id = 0
+
+    def __init__(self):
+        self.texts = ["", ""]
+        self.busy = threading.Lock()
+
+    @contextmanager
+    def _borrow(self):
+        if not self.busy.acquire(blocking=False):
+            raise RuntimeError("Already borrowed")
+        try:
+            time.sleep(0.0005)
+            yield
+        finally:
+            self.busy.release()
+
+    def rows(self, texts):
+        width = max([len(t.split()) for t in texts] + [1])
+        out = np.zeros((len(texts), width), dtype=np.int64)
+        for i, t in enumerate(texts):
+            self.texts.append(t)
+            out[i, :max(len(t.split()), 1)] = 1
+            out[i, 0] = len(self.texts) - 1
+        return out
+
+    def text(self, row):
+        return self.texts[int(row[0])]
+
+    def __call__(self, texts, pairs=None, **kwargs):
+        with self._borrow():
+            texts = [texts] if isinstance(texts, str) else texts
+            if pairs is not None:
+                texts = [f"{a}</s></s>{b}" for a, b in zip(texts, pairs)]
+            return {"input_ids": self.rows(texts)}
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        with self._borrow():
+            return [self.text(r) for r in outputs]
+
+    def decode(self, row, skip_special_tokens=True):
+        with self._borrow():
+            return self.text(row)
+
+    def encode(self, text, add_special_tokens=False):
+        with self._borrow():
+            return text.split()
+
+
+def _words(text, n, skip=0):
+    seen = []
+    for w in text.lower().replace(".", " ").split():
+        if len(w) > 4 and w.isalpha() and w not in seen:
+            seen.append(w)
+    return seen[skip:skip + n] or ["nothing"]
+
+
+# Deterministic replies: the same prompt always yields the same text, whichever path sends it
+def _reply(prompt):
+    if "Expansions:" in prompt:
+        return "\n".join(f"{i}. {w} is related to several well known {v} facts" + (" not" if i == 3 else "")
+                         for i, (w, v) in enumerate(zip(_words(prompt, 4), _words(prompt, 4, 4)), 1))
+    return "\n".join(f"- missing context about the {w} topic" for w in _words(prompt, 3))
+
+
+def _label(text):
+    return "contradiction" if text.endswith(" not") else "entailment"
+
+
+def _load_llm(llm):
+    llm.tokenizer = _Tokenizer()
+    llm.model = True
+    llm.pipe = lambda prompt, **kw: [{"generated_text": _reply(prompt)}]
+    return llm
+
+
+def _generate_llm(llm, inputs):
+    return llm.tokenizer.rows([_reply(llm.tokenizer.text(r)) for r in inputs["input_ids"]])
+
+
+class _Pipe:
+    def __init__(self):
+        self.tokenizer = _Tokenizer()
+
+    def __call__(self, text, **kwargs):
+        return [{"label": _label(text)}]
+
+
+def _load_nli(nli):
+    nli.pipe = _Pipe()
+    return nli
+
+
+def _classify_nli(nli, inputs):
+    return [] if inputs is None else [_label(nli.pipe.tokenizer.text(r)) for r in inputs["input_ids"]]
+
+
+def _load_d2q(d2q):
+    d2q.tokenizer = _Tokenizer()
+    d2q.model = True
+    return d2q
+
+
+def _generate_d2q(d2q, inputs, n=None):
+    n = n or d2q.num_queries
+    docs = [d2q.tokenizer.text(r) for r in inputs["input_ids"]]
+    return d2q.tokenizer.rows([f"what is {w} used for" for d in docs for w in (_words(d, n - 1) + _words(d, 1))])
+
+
+def _d2q_generate(d2q, doc, n=None):
+    return d2q.decode(d2q.generate_encoded(d2q.encode([doc]), n), n)[0]
+
+
+class _SentenceModel:
+    def __init__(self):
+        self.tokenizer = _Tokenizer()
+
+    def encode(self, texts, **kwargs):
+        with self.tokenizer._borrow():
+            out = np.zeros((len(texts), 64), dtype=np.float32)
+            for i, t in enumerate(texts):
+                for w in t.lower().split():
+                    out[i, zlib.crc32(w.encode()) % 64] += 1
+            return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-9)
+
+
+def _load_embedder(embedder):
+    embedder.model = _SentenceModel()
+    return embedder
+
+
+def _similarity(embedder, texts1, texts2=None):
+    e1 = embedder.encode(texts1)
+    return e1 @ (e1 if texts2 is None else embedder.encode(texts2)).T
+
+
+# The real model classes with only weights and device calls replaced, so their tokenizer locking,
+# batching and parsing are what the pipelined and serial paths exercise
+def fake_expander():
+    from hqf_de.models import LLM, NLI, Doc2Query, Embedder
+    from hqf_de.pipeline import Expander, Combiner
+
+    exp = Expander(device="cpu", server=False)
+    exp.llm = LLM(device="cpu", early_stop=False)
+    exp.llm.load = lambda: _load_llm(exp.llm)
+    exp.llm.generate_encoded = lambda inputs: _generate_llm(exp.llm, inputs)
+    exp.nli = NLI(device="cpu")
+    exp.nli.load = lambda: _load_nli(exp.nli)
+    exp.nli.classify_encoded = lambda inputs: _classify_nli(exp.nli, inputs)
+    exp.d2q = Doc2Query(device="cpu")
+    exp.d2q.load = lambda: _load_d2q(exp.d2q)
+    exp.d2q.generate_encoded = lambda inputs, n=None: _generate_d2q(exp.d2q, inputs, n)
+    exp.d2q.generate = lambda doc, n=None: _d2q_generate(exp.d2q, doc, n)
+    embedder = Embedder(device="cpu")
+    embedder.load = lambda: _load_embedder(embedder)
+    embedder.similarity = lambda a, b=None: _similarity(embedder, a, b)
+    exp.combiner = Combiner(embedder)
+    return exp.load()
+
+
+# Pipelined expand_many must return exactly what serial expand() does, field for field, and count
+# the same LLM tokens; a tokenizer shared unguarded between CPU stage threads fails this
+def main():
+    parser = argparse.ArgumentParser(description="Check pipelined Expander.expand_many against serial expand()")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--cpu-workers", type=int, default=CPU_WORKERS)
+    args = parser.parse_args()
+
+    docs, _, _ = make_corpus(args.docs, 0)
+    exp = fake_expander()
+    serial = [exp.expand(doc_id, doc) for doc_id, doc in docs]
+    serial_tokens, exp.llm.tokens = exp.llm.tokens, 0
+    piped = list(exp.expand_many(docs, batch_size=args.batch_size, cpu_workers=args.cpu_workers))
+
+    bad = [s["doc_id"] for s, p in zip(serial, piped) if s != p]
+    if len(piped) != len(serial):
+        bad.append(f"{len(piped)} results for {len(serial)} docs")
+    print(f"{len(docs)} docs, batch {args.batch_size}, {args.cpu_workers} CPU workers: "
+          f"{len(bad)} mismatched, LLM tokens serial {serial_tokens} pipelined {exp.llm.tokens}")
+    if sum(len(s["valid_expansions"]) for s in serial) == 0:
+        bad.append("no expansions survived, the check exercised nothing")
+    if bad or exp.llm.tokens != serial_tokens:
+        print(f"Mismatch: {', '.join(map(str, bad[:10])) or 'token counts'}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
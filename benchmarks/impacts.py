@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from .corpus import make_corpus, write_corpus
+from .stages import _build_bm25
+
+BUDGETS = [1000, 5000, 20000]
+REPEAT = 3
+
+
+def _run(work, queries, args):
+    start = time.perf_counter()
+    subprocess.run([str(work / "query"), str(queries)] + args, cwd=work, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def _mrr10(path, qrels):
+    ranked = {}
+    with open(path) as f:
+        for line in f:
+            qid, _, pid, rank = line.split()[:4]
+            ranked.setdefault(qid, []).append(pid)
+    total = 0.0
+    for qid, rels in qrels.items():
+        for rank, pid in enumerate(ranked.get(qid, [])[:10], 1):
+            if pid in rels:
+                total += 1.0 / rank
+                break
+    return total / len(qrels)
+
+
+# Exact BM25 (term-at-a-time over raw freqs) against score-at-a-time over quantized impacts,
+# exhaustive and under postings budgets. QPS excludes index load, measured with an empty query file.
+def main():
+    parser = argparse.ArgumentParser(description="Exact vs quantized-impact BM25: QPS and MRR@10")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--budgets", type=int, nargs="*", default=BUDGETS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    docs, queries, qrels = make_corpus(args.docs, args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ctx = SimpleNamespace(work_dir=tmp, data_dir=write_corpus(tmp / "data", docs, queries, qrels))
+        work = _build_bm25(ctx)
+        qfile, empty = ctx.data_dir / "queries.tsv", work / "empty.tsv"
+        empty.write_text("")
+        configs = [("exact", []), ("impacts", ["--impacts"])] + [(f"impacts@{b}", ["--impacts", "--budget", str(b)]) for b in args.budgets]
+        print("| Scorer | QPS | MRR@10 |")
+        print("|--------|-----|--------|")
+        for name, flags in configs:
+            load = min(_run(work, empty, flags) for _ in range(args.repeat))
+            wall = min(_run(work, qfile, flags) for _ in range(args.repeat))
+            qps = len(queries) / max(wall - load, 1e-9)
+            print(f"| {name} | {qps:.0f} | {_mrr10(work / 'queries_results.txt', qrels):.4f} |")
+
+
+if __name__ == "__main__":
+    main()
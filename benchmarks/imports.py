@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from . import ROOT
+
+BUDGET_S = 0.3
+REPEAT = 5
+
+# Modules that must stay cheap to import, and the heavy dependencies each must not pull in
+HEAVY = ["torch", "transformers", "sentence_transformers", "sklearn", "pyarrow", "faiss"]
+TARGETS = {
+    "hqf_de.cli": HEAVY + ["numpy", "requests"],
+    "hqf_de.models": HEAVY + ["numpy"],
+    "hqf_de.pipeline": HEAVY + ["numpy", "requests"],
+    "hqf_de.evaluation": HEAVY + ["numpy", "requests"],
+    "hqf_de.pipeline.expander": HEAVY,
+}
+
+PROBE = """
+import json, sys, time
+import benchmarks
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - start, "loaded": [m for m in {forbidden!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, forbidden, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+                             cwd=ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"median_s": statistics.median(r["seconds"] for r in runs), "loaded": runs[0]["loaded"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time budget check for the CLI path")
+    parser.add_argument("--budget", type=float, default=BUDGET_S, help="max median import seconds per module")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    failures = []
+    print("| Module | Median s | Heavy modules loaded |")
+    print("|--------|----------|----------------------|")
+    for module, forbidden in TARGETS.items():
+        r = measure(module, forbidden, args.repeat)
+        if "error" in r:
+            print(f"| {module} | error | {r['error']} |")
+            failures.append(module)
+            continue
+        print(f"| {module} | {r['median_s']:.3f} | {', '.join(r['loaded']) or '-'} |")
+        if r["median_s"] > args.budget or r["loaded"]:
+            failures.append(module)
+    if failures:
+        print(f"\nOver budget ({args.budget}s) or importing heavy dependencies: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .corpus import make_corpus, write_corpus
+from .stages import BENCHMARKS, TINY_MODELS, Skip
+
+RESULTS_FILE = "bench_results.json"
+TOLERANCE = 0.10
+
+
+@dataclass
+class Context:
+    docs: list
+    queries: list
+    qrels: dict
+    data_dir: Path
+    work_dir: Path
+    models: dict = field(default_factory=lambda: dict(TINY_MODELS))
+    device: str = "cpu"
+    model_docs: int = 16
+    dim: int = 384
+
+
+def run_one(b, ctx, repeat):
+    try:
+        items, work = b.setup(ctx)
+    except Skip as e:
+        return {"unit": b.unit, "skipped": str(e)}
+    except ImportError as e:
+        return {"unit": b.unit, "skipped": f"missing dependency: {e.name}"}
+    work()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {"unit": b.unit, "items": items, "seconds": times, "median_s": median, "throughput": items / median if median else 0.0}
+
+
+def run(names, num_docs, num_queries, repeat, device, model_docs):
+    docs, queries, qrels = make_corpus(num_docs, num_queries)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ctx = Context(docs, queries, qrels, write_corpus(tmp / "data", docs, queries, qrels), tmp, device=device, model_docs=model_docs)
+        for name in names:
+            print(f"{name:22s}", end=" ", flush=True)
+            try:
+                r = run_one(BENCHMARKS[name], ctx, repeat)
+            except Exception as e:
+                traceback.print_exc()
+                r = {"unit": BENCHMARKS[name].unit, "error": repr(e)}
+            results[name] = r
+            if "throughput" in r:
+                print(f"{r['throughput']:12.1f} {r['unit']}/s")
+            else:
+                print(f"  skipped: {r.get('skipped', r.get('error'))}")
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "docs": num_docs, "queries": num_queries, "repeat": repeat, "device": device}, "results": results}
+
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    print(f"\n| Benchmark | Baseline | Current | Change |")
+    print("|-----------|----------|---------|--------|")
+    for name, r in current["results"].items():
+        b = baseline["results"].get(name, {})
+        if "throughput" not in r or "throughput" not in b:
+            continue
+        change = r["throughput"] / b["throughput"] - 1 if b["throughput"] else 0.0
+        flag = " REGRESSION" if change < -tolerance else ""
+        print(f"| {name} | {b['throughput']:.1f} | {r['throughput']:.1f} | {change:+.1%}{flag} |")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HQF-DE performance benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--model-docs", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("-o", "--output", default=RESULTS_FILE)
+    parser.add_argument("--compare", type=Path, help="baseline results JSON")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    current = run(args.only, args.docs, args.queries, args.repeat, args.device, args.model_docs)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"\nSaved: {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(current, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions (>{args.tolerance:.0%} slower): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import random
+import shutil
+import subprocess
+import sys
+from collections import namedtuple
+
+from . import ROOT
+
+BM25_DIR = ROOT / "src" / "bm25"
+DENSE_DIR = ROOT / "src" / "dense"
+
+TINY_MODELS = {
+    "llm": "sshleifer/tiny-gpt2",
+    "nli": "hf-internal-testing/tiny-random-BartForSequenceClassification",
+    "nli_small": "hf-internal-testing/tiny-random-RobertaForSequenceClassification",
+    "d2q": "hf-internal-testing/tiny-random-t5",
+    "embedder": "sentence-transformers/paraphrase-MiniLM-L3-v2",
+}
+
+Bench = namedtuple("Bench", ["name", "unit", "setup"])
+BENCHMARKS = {}
+
+
+class Skip(Exception):
+    pass
+
+
+def bench(name, unit="items"):
+    def register(fn):
+        BENCHMARKS[name] = Bench(name, unit, fn)
+        return fn
+    return register
+
+
+def _texts(ctx, n):
+    return [text for _, text in ctx.docs[:n]]
+
+
+@bench("llm.run", "docs")
+def llm_run(ctx):
+    from hqf_de.models import LLM
+    llm = LLM(model=ctx.models["llm"], device=ctx.device).load()
+    docs = _texts(ctx, ctx.model_docs)
+    return len(docs), lambda: [llm.run(d) for d in docs]
+
+
+@bench("nli.validate", "pairs")
+def nli_validate(ctx):
+    from hqf_de.models import NLI
+    nli = NLI(model=ctx.models["nli"], device=ctx.device).load()
+    docs = _texts(ctx, ctx.model_docs)
+    expansions = [d.split(". ")[0][:80] for d in _texts(ctx, 5)]
+    return len(docs) * len(expansions), lambda: [nli.validate(d, expansions) for d in docs]
+
+
+@bench("nli.cascade", "pairs")
+def nli_cascade(ctx):
+    from hqf_de.models import CascadeNLI
+    nli = CascadeNLI(small=ctx.models["nli_small"], large=ctx.models["nli"], device=ctx.device).load()
+    docs = _texts(ctx, ctx.model_docs)
+    expansions = [d.split(". ")[0][:80] for d in _texts(ctx, 5)]
+    return len(docs) * len(expansions), lambda: nli.validate_batch([(d, expansions) for d in docs])
+
+
+@bench("doc2query.generate", "docs")
+def d2q_generate(ctx):
+    from hqf_de.models import Doc2Query
+    d2q = Doc2Query(model=ctx.models["d2q"], device=ctx.device).load()
+    docs = _texts(ctx, ctx.model_docs)
+    return len(docs), lambda: [d2q.generate(d) for d in docs]
+
+
+@bench("embedder.encode", "texts")
+def embedder_encode(ctx):
+    from hqf_de.models import Embedder
+    emb = Embedder(model=ctx.models["embedder"], device=ctx.device).load()
+    texts = _texts(ctx, len(ctx.docs))
+    return len(texts), lambda: emb.encode(texts)
+
+
+@bench("combiner.combine", "docs")
+def combiner_combine(ctx):
+    from hqf_de.models import Embedder
+    from hqf_de.pipeline.combiner import Combiner
+    comb = Combiner(Embedder(model=ctx.models["embedder"], device=ctx.device)).load()
+    docs = _texts(ctx, ctx.model_docs)
+    rng = random.Random(0)
+    inputs = [(d, [" ".join(rng.sample(d.split(), 6)) for _ in range(5)], [q for _, q in rng.sample(ctx.queries, 5)]) for d in docs]
+    return len(inputs), lambda: [comb.combine(*x) for x in inputs]
+
+
+@bench("collection.read", "docs")
+def collection_read(ctx):
+    from hqf_de.pipeline.collection import Collection
+    c = Collection(ctx.data_dir / "collection.tsv")
+    return len(c), lambda: sum(1 for _ in c)
+
+
+def _build_bm25(ctx):
+    if not shutil.which("g++"):
+        raise Skip("g++ not found")
+    work = ctx.work_dir / "bm25"
+    if not (work / "index" / "lexicon.txt").exists():
+        work.mkdir(parents=True, exist_ok=True)
+        for name in ("indexer", "merger", "query"):
+            subprocess.run(["g++", "-O2", "-std=c++17", "-pthread", "-o", str(work / name), str(BM25_DIR / f"{name}.cpp")], check=True)
+        subprocess.run([str(work / "indexer"), str(ctx.data_dir / "collection.tsv")], cwd=work, check=True, capture_output=True)
+        runs = len(list((work / "partial").glob("run_*.bin")))
+        subprocess.run([str(work / "merger"), str(runs), "--impacts"], cwd=work, check=True, capture_output=True)
+    return work
+
+
+@bench("bm25.query", "queries")
+def bm25_query(ctx):
+    work = _build_bm25(ctx)
+    queries = ctx.data_dir / "queries.tsv"
+    return len(ctx.queries), lambda: subprocess.run([str(work / "query"), str(queries)], cwd=work, check=True, capture_output=True)
+
+
+@bench("bm25.saat", "queries")
+def bm25_saat(ctx):
+    work = _build_bm25(ctx)
+    queries = ctx.data_dir / "queries.tsv"
+    return len(ctx.queries), lambda: subprocess.run([str(work / "query"), str(queries), "--impacts"], cwd=work, check=True, capture_output=True)
+
+
+def _dense(ctx):
+    try:
+        import numpy as np
+        import faiss
+    except ImportError as e:
+        raise Skip(f"missing dependency: {e.name}")
+    if str(DENSE_DIR) not in sys.path:
+        sys.path.insert(0, str(DENSE_DIR))
+    rng = np.random.default_rng(0)
+    docs = rng.standard_normal((len(ctx.docs), ctx.dim)).astype(np.float32)
+    queries = rng.standard_normal((len(ctx.queries), ctx.dim)).astype(np.float32)
+    faiss.normalize_L2(docs)
+    faiss.normalize_L2(queries)
+    return docs, queries
+
+
+@bench("hnsw.search", "queries")
+def hnsw_search(ctx):
+    docs, queries = _dense(ctx)
+    from indexes import build_index
+    index = build_index(docs, "hnsw_flat")
+    return len(queries), lambda: index.search(queries, 100)
+
+
+@bench("rrf.fuse", "queries")
+def rrf_fuse(ctx):
+    if str(DENSE_DIR) not in sys.path:
+        sys.path.insert(0, str(DENSE_DIR))
+    from run_hybrid import reciprocal_rank_fusion
+    rng = random.Random(0)
+    pids = [pid for pid, _ in ctx.docs]
+    runs = []
+    for name in ("bm25", "hnsw"):
+        path = ctx.work_dir / f"run_{name}.txt"
+        with open(path, "w") as f:
+            for qid, _ in ctx.queries:
+                for rank, pid in enumerate(rng.sample(pids, min(100, len(pids))), 1):
+                    f.write(f"{qid} Q0 {pid} {rank} {1.0 / rank:.6f} {name}\n")
+        runs.append(str(path))
+    return len(ctx.queries), lambda: reciprocal_rank_fusion(runs, k=60)
+
+
+@bench("metrics.all", "queries")
+def metrics_all(ctx):
+    from hqf_de.evaluation.metrics import Metrics
+    rng = random.Random(0)
+    pids = [pid for pid, _ in ctx.docs]
+    rankings = []
+    for qid, _ in ctx.queries:
+        retrieved = rng.sample(pids, min(1000, len(pids)))
+        relevant = set(ctx.qrels[qid])
+        rankings.append((retrieved, [float(p in relevant) for p in retrieved], relevant))
+    return len(rankings), lambda: Metrics.aggregate([Metrics.all(*r) for r in rankings])
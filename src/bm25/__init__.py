@@ -0,0 +1,21 @@
+import importlib
+
+# Python reader for the index built by indexer/merger; numpy is only imported on first use
+_LAZY = {
+    "BM25Index": ".reader",
+    "tokenize": ".reader",
+    "stem": ".reader",
+    "global_stats": ".reader",
+    "save_stats": ".reader",
+    "load_stats": ".reader",
+}
+
+__all__ = ["BM25Index", "tokenize", "stem", "global_stats", "save_stats", "load_stats"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -11,12 +11,16 @@
 #include <cctype>
 #include <cstring>
 #include <filesystem>
+#include <memory>
 #include <chrono>
+#include <atomic>
+#include <cstdint>
 
 using namespace std;
 namespace fs = std::filesystem;
 
 const double K1 = 1.2, B = 0.75;
+const int CODEC_VBYTE = 0, CODEC_PFOR = 1;
 const int BLOCK_SIZE = 128, RRF_K = 60, TOP_K = 1000, DIM = 384;
 
 const unordered_set<string> STOPWORDS = {
@@ -176,10 +180,15 @@ public:
 // Globals
 unordered_map<string, tuple<long long, int, int, int>> lexicon;
 vector<int> lastDocIDs, docIDSizes, freqSizes;
+vector<long long> blockOffsets;
+int codec = CODEC_VBYTE;
 unordered_map<int, int> docLengths;
 unordered_map<int, string> docIdMap;
 int totalDocs = 0;
 double avgLen = 0;
+bool conjunctive = false;
+int minResults = 10;
+atomic<int> orFallbacks(0);
 vector<vector<float>> docEmb, queryEmb;
 vector<string> queryIds, passageIds;
 
@@ -194,6 +203,38 @@ int vb_decode(const unsigned char* d, int& o) {
     return n;
 }
 
+// PForDelta-style block (merger --codec pfor): n, bit width b, exception count, n values packed
+// in b bits, then (position, varbyte high bits) per exception. Unpacked in one fixed-width pass
+// with 64-bit loads (the buffer carries 8 bytes of padding), then exceptions are patched.
+int pfor_decode(const unsigned char* d, int* out) {
+    int n = d[0], b = d[1], ne = d[2];
+    const unsigned char* p = d + 3;
+    uint64_t mask = (1ull << b) - 1;
+    for (int i = 0; i < n; i++) {
+        int bit = i * b;
+        uint64_t w;
+        memcpy(&w, p + (bit >> 3), 8);
+        out[i] = (w >> (bit & 7)) & mask;
+    }
+    int o = 3 + (n * b + 7) / 8;
+    for (int e = 0; e < ne; e++) {
+        int pos = d[o++];
+        out[pos] |= vb_decode(d, o) << b;
+    }
+    return n;
+}
+
+void decodeBlock(const vector<unsigned char>& d, int size, vector<int>& out) {
+    if (codec == CODEC_PFOR) {
+        out.resize(BLOCK_SIZE);
+        out.resize(pfor_decode(d.data(), out.data()));
+        return;
+    }
+    out.clear();
+    int p = 0;
+    while (p < size) out.push_back(vb_decode(d.data(), p));
+}
+
 vector<string> tokenize(const string& s) {
     vector<string> t;
     string w;
@@ -213,44 +254,32 @@ vector<string> tokenize(const string& s) {
 
 class InvList {
     ifstream f;
-    long long off;
-    int sb, np, bi, pi;
+    int bi = 0, eb = 0, cur = -1, pi = 0;
     vector<int> docs, freqs;
+    vector<unsigned char> buf;
     bool done = false;
 
+    // Decode block bi; its file offset comes from the block size prefix sums, so skipping is O(1)
     void load() {
-        docs.clear();
-        freqs.clear();
-        if (bi >= sb + (np + BLOCK_SIZE - 1) / BLOCK_SIZE) {
-            done = true;
-            return;
-        }
-
-        long long o = off;
-        for (int i = sb; i < bi; i++)
-            o += 4 + docIDSizes[i] + 4 + freqSizes[i];
-
-        f.seekg(o);
-        int ds;
+        f.seekg(blockOffsets[bi]);
+        int ds, fs;
         f.read((char*)&ds, 4);
-        vector<unsigned char> d(ds);
-        f.read((char*)d.data(), ds);
-
-        int fs;
-        f.read((char*)&fs, 4);
-        vector<unsigned char> fr(fs);
-        f.read((char*)fr.data(), fs);
-
-        int p = 0;
-        while (p < ds) docs.push_back(vb_decode(d.data(), p));
+        buf.assign(ds + 8, 0);
+        f.read((char*)buf.data(), ds);
+        decodeBlock(buf, ds, docs);
         for (size_t i = 1; i < docs.size(); i++) docs[i] += docs[i-1];
 
-        p = 0;
-        while (p < fs) freqs.push_back(vb_decode(fr.data(), p));
+        f.read((char*)&fs, 4);
+        buf.assign(fs + 8, 0);
+        f.read((char*)buf.data(), fs);
+        decodeBlock(buf, fs, freqs);
+        cur = bi;
         pi = 0;
     }
 
 public:
+    int df = 0;
+
     InvList(const string& t) {
         auto it = lexicon.find(t);
         if (it == lexicon.end()) {
@@ -258,36 +287,36 @@ public:
             return;
         }
         f.open("index/inverted_index.bin", ios::binary);
-        off = get<0>(it->second);
-        sb = get<1>(it->second);
-        np = get<2>(it->second);
-        bi = sb;
-        load();
+        bi = get<1>(it->second);
+        eb = bi + (get<2>(it->second) + BLOCK_SIZE - 1) / BLOCK_SIZE;
+        df = get<3>(it->second);
+        done = bi >= eb;
     }
 
+    // First posting with doc >= tgt; blocks whose last doc is below tgt are skipped without decoding
     bool nextGEQ(int tgt) {
         if (done) return false;
-        while (bi < sb + (np + BLOCK_SIZE - 1) / BLOCK_SIZE) {
-            if (lastDocIDs[bi] >= tgt) {
-                if (docs.empty() || pi >= (int)docs.size()) load();
-                break;
-            }
-            bi++;
-        }
-        if (done) return false;
-        while (pi < (int)docs.size()) {
-            if (docs[pi] >= tgt) return true;
-            pi++;
+        while (bi < eb && lastDocIDs[bi] < tgt) bi++;
+        if (bi >= eb) {
+            done = true;
+            return false;
         }
-        bi++;
-        load();
-        return nextGEQ(tgt);
+        if (cur != bi) load();
+        while (docs[pi] < tgt) pi++;
+        return true;
     }
 
-    bool has() { return !done && pi < (int)docs.size(); }
+    bool has() {
+        if (done) return false;
+        if (cur != bi) load();
+        return true;
+    }
     int doc() { return docs[pi]; }
     int freq() { return freqs[pi]; }
-    void next() { pi++; }
+    void next() {
+        if (++pi < (int)docs.size()) return;
+        if (++bi >= eb) done = true;
+    }
 };
 
 double bm25(int tf, int dl, int df) {
@@ -304,7 +333,6 @@ vector<pair<int, double>> queryBM25(const vector<string>& terms) {
         if (it == lexicon.end()) continue;
         int df = get<3>(it->second);
         InvList l(t);
-        l.nextGEQ(0);
         while (l.has()) {
             int d = l.doc(), f = l.freq();
             if (sc[d] == 0) touched.push_back(d);
@@ -323,6 +351,62 @@ vector<pair<int, double>> queryBM25(const vector<string>& terms) {
     return r;
 }
 
+// Conjunctive DAAT: the list with the smallest df proposes candidates and the others skip to them
+// with nextGEQ, so most blocks of the longer lists are never decoded
+vector<pair<int, double>> queryAnd(const vector<string>& terms) {
+    unordered_map<string, int> qtf;
+    for (auto& t : terms) qtf[t]++;
+    vector<pair<int, string>> order;
+    for (auto& [t, n] : qtf) {
+        auto it = lexicon.find(t);
+        if (it == lexicon.end()) return {};
+        order.emplace_back(get<3>(it->second), t);
+    }
+    if (order.empty()) return {};
+    sort(order.begin(), order.end());
+
+    vector<unique_ptr<InvList>> lists;
+    vector<int> mult;
+    for (auto& [df, t] : order) {
+        lists.push_back(make_unique<InvList>(t));
+        mult.push_back(qtf[t]);
+    }
+
+    vector<pair<int, double>> r;
+    size_t n = lists.size();
+    int d = 0;
+    while (lists[0]->nextGEQ(d)) {
+        d = lists[0]->doc();
+        size_t i = 1;
+        while (i < n && lists[i]->nextGEQ(d) && lists[i]->doc() == d) i++;
+        if (i < n) {
+            if (!lists[i]->has()) break;
+            d = lists[i]->doc();
+            continue;
+        }
+        double s = 0;
+        int dl = docLengths[d];
+        for (size_t j = 0; j < n; j++) s += mult[j] * bm25(lists[j]->freq(), dl, lists[j]->df);
+        r.emplace_back(d, s);
+        d++;
+    }
+
+    size_t k = min(r.size(), (size_t)TOP_K);
+    partial_sort(r.begin(), r.begin() + k, r.end(), [](auto& a, auto& b) { return a.second > b.second; });
+    r.resize(k);
+    return r;
+}
+
+// AND when requested, falling back to OR when it finds fewer than minResults documents
+vector<pair<int, double>> search(const vector<string>& terms) {
+    if (conjunctive) {
+        auto r = queryAnd(terms);
+        if ((int)r.size() >= minResults) return r;
+        orFallbacks++;
+    }
+    return queryBM25(terms);
+}
+
 vector<pair<int, float>> queryDense(int qi) {
     auto& q = queryEmb[qi];
     vector<pair<int, float>> r;
@@ -367,6 +451,10 @@ bool loadBM25() {
     ifstream m("index/metadata.bin", ios::binary);
     int n;
     m.read((char*)&n, 4);
+    if (n < 0) {  // codec header written by merger --codec
+        codec = -n;
+        m.read((char*)&n, 4);
+    }
     lastDocIDs.resize(n);
     docIDSizes.resize(n);
     freqSizes.resize(n);
@@ -375,6 +463,13 @@ bool loadBM25() {
     m.read((char*)freqSizes.data(), n * 4);
     m.close();
 
+    blockOffsets.resize(n);
+    long long pos = 0;
+    for (int i = 0; i < n; i++) {
+        blockOffsets[i] = pos;
+        pos += 8 + docIDSizes[i] + freqSizes[i];
+    }
+
     ifstream d("index/doc_lengths.txt");
     int id, l;
     while (d >> id >> l) {
@@ -422,10 +517,19 @@ bool loadEmb(const string& dir, const string& var) {
 }
 
 int main(int argc, char* argv[]) {
-    if (argc != 4) {
-        cerr << "Usage: " << argv[0] << " <queries.tsv> <emb_dir> <variant>\n";
+    if (argc < 4) {
+        cerr << "Usage: " << argv[0] << " <queries.tsv> <emb_dir> <variant> [--and] [--min-results N]\n";
         return 1;
     }
+    for (int i = 4; i < argc; i++) {
+        string a = argv[i];
+        if (a == "--and") conjunctive = true;
+        else if (a == "--min-results" && i + 1 < argc) minResults = stoi(argv[++i]);
+        else {
+            cerr << "Unknown option " << a << "\n";
+            return 1;
+        }
+    }
 
     string qf = argv[1], dir = argv[2], var = argv[3];
     cerr << "Hybrid Query: " << var << ", RRF k=" << RRF_K << "\n";
@@ -454,11 +558,13 @@ int main(int argc, char* argv[]) {
     ofstream out("hybrid_" + var + "_results.txt");
     auto t0 = chrono::high_resolution_clock::now();
 
+    int bm25Only = 0;
     for (auto& [id, txt] : queries) {
-        auto bm = queryBM25(tokenize(txt));
+        auto bm = search(tokenize(txt));
         vector<pair<int, float>> dn;
         auto it = qidx.find(id);
         if (it != qidx.end()) dn = queryDense(it->second);
+        else bm25Only++;
         auto r = fuse(bm, dn);
         int rk = 1;
         for (auto& [d, s] : r)
@@ -468,5 +574,10 @@ int main(int argc, char* argv[]) {
     auto t1 = chrono::high_resolution_clock::now();
     cerr << "Done: " << queries.size() << " queries in "
          << chrono::duration_cast<chrono::seconds>(t1 - t0).count() << "s\n";
+    if (conjunctive)
+        cerr << "AND: " << orFallbacks << "/" << queries.size() << " queries fell back to OR\n";
+    if (bm25Only)
+        cerr << "Warning: " << bm25Only << " queries have no embedding in query_embeddings.bin and used BM25 only; "
+             << "run prepare_hybrid_data.py --queries " << qf << "\n";
     return 0;
 }
@@ -9,6 +9,8 @@
 #include <algorithm>
 #include <cctype>
 #include <cstring>
+#include <cstdint>
+#include <cstdio>
 
 using namespace std;
 
@@ -195,9 +197,39 @@ void writePartial(const vector<tuple<string, int, int>>& p, int run) {
     cerr << "Saved run_" << run << ".bin (" << p.size() << " postings)\n";
 }
 
+// --termids: postings are packed (termID, doc, freq) triples against one in-memory dictionary,
+// 12 bytes each instead of a string copy per posting, and sort on integers. Each run writes the
+// triples plus partial/dict_N.txt with only the terms first seen in that run (in ID order).
+struct IdPosting {
+    uint32_t term, doc, freq;
+    bool operator<(const IdPosting& o) const { return term != o.term ? term < o.term : doc < o.doc; }
+};
+
+vector<string> dict;
+unordered_map<string, uint32_t> termIds;
+size_t dictWritten = 0;
+
+uint32_t termId(const string& t) {
+    auto it = termIds.find(t);
+    if (it != termIds.end()) return it->second;
+    termIds.emplace(t, dict.size());
+    dict.push_back(t);
+    return dict.size() - 1;
+}
+
+void writePartialIds(vector<IdPosting>& p, int run) {
+    sort(p.begin(), p.end());
+    ofstream out("partial/run_" + to_string(run) + ".bin", ios::binary);
+    out.write((char*)p.data(), p.size() * sizeof(IdPosting));
+    ofstream d("partial/dict_" + to_string(run) + ".txt");
+    for (; dictWritten < dict.size(); dictWritten++) d << dict[dictWritten] << "\n";
+    cerr << "Saved run_" << run << ".bin (" << p.size() << " postings, " << dict.size() << " terms)\n";
+}
+
 int main(int argc, char* argv[]) {
-    if (argc != 2) {
-        cerr << "Usage: " << argv[0] << " <input.tsv>\n";
+    bool ids = argc == 3 && strcmp(argv[2], "--termids") == 0;
+    if (argc != 2 && !ids) {
+        cerr << "Usage: " << argv[0] << " <input.tsv> [--termids]\n";
         return 1;
     }
 
@@ -223,8 +255,11 @@ int main(int argc, char* argv[]) {
     }
 
     vector<tuple<string, int, int>> buf;
-    const size_t MAX_BUF = 10000000;
+    vector<IdPosting> idBuf;
+    // Same memory budget either way: a 12-byte triple against ~40 bytes for tuple<string, int, int>
+    const size_t MAX_BUF = 10000000, MAX_ID_BUF = 3 * MAX_BUF;
     int docID = 0, run = 0;
+    for (int i = 0; remove(("partial/dict_" + to_string(i) + ".txt").c_str()) == 0; i++);
 
     ofstream pageTable("index/page_table.txt");
     ofstream docLen("index/doc_lengths.txt");
@@ -252,8 +287,13 @@ int main(int argc, char* argv[]) {
 
         unordered_map<string, int> tf;
         for (auto& t : tokens) tf[t]++;
-        for (auto& [term, freq] : tf)
-            buf.emplace_back(term, docID, freq);
+        if (ids) {
+            for (auto& [term, freq] : tf)
+                idBuf.push_back({termId(term), (uint32_t)docID, (uint32_t)freq});
+        } else {
+            for (auto& [term, freq] : tf)
+                buf.emplace_back(term, docID, freq);
+        }
 
         docID++;
         if (docID % 100000 == 0)
@@ -264,16 +304,23 @@ int main(int argc, char* argv[]) {
             writePartial(buf, run++);
             buf.clear();
         }
+        if (idBuf.size() >= MAX_ID_BUF) {
+            writePartialIds(idBuf, run++);
+            idBuf.clear();
+        }
     }
 
     if (!buf.empty()) {
         sort(buf.begin(), buf.end());
         writePartial(buf, run++);
     }
+    if (!idBuf.empty())
+        writePartialIds(idBuf, run++);
 
     ofstream meta("index/indexer_meta.txt");
     meta << "total_documents\t" << docID << "\n";
     meta << "total_runs\t" << run << "\n";
+    meta << "term_ids\t" << (ids ? 1 : 0) << "\n";
 
     cerr << "Done: " << docID << " docs, " << run << " runs\n";
     return 0;
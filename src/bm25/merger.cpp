@@ -5,20 +5,56 @@
 #include <vector>
 #include <queue>
 #include <unordered_map>
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <iomanip>
 
 using namespace std;
 
 const int BLOCK_SIZE = 128;
+const int CODEC_VBYTE = 0, CODEC_PFOR = 1;
+int codec = CODEC_VBYTE;
+const double K1 = 1.2, B = 0.75;
+const int IMPACT_LEVELS = 255;
 
+// Collection stats for --impacts, read from the indexer's doc_lengths.txt
+vector<int> docLengths;
+int totalDocs = 0;
+double avgLen = 0, impactScale = 0;
+
+// key is the term ID for indexer --termids runs (term stays empty), 0 otherwise
 struct Entry {
     string term;
-    int doc, freq, file;
+    int key, doc, freq, file;
 
     bool operator>(const Entry& o) const {
+        if (key != o.key) return key > o.key;
         return term != o.term ? term > o.term : doc > o.doc;
     }
 };
 
+bool termIds = false;
+vector<string> dict;
+
+// Term-ID merges finish terms in ID order, so their lexicon lines are sorted by term before writing
+struct LexWriter {
+    ofstream out;
+    vector<pair<string, string>> lines;
+
+    void add(const string& term, const string& line) {
+        if (termIds) lines.emplace_back(term, line);
+        else out << line;
+    }
+
+    void close() {
+        sort(lines.begin(), lines.end());
+        for (auto& l : lines) out << l.second;
+        out.close();
+    }
+};
+
 void vb_encode(int n, vector<unsigned char>& out) {
     while (n >= 128) {
         out.push_back((n & 0x7F) | 0x80);
@@ -27,6 +63,53 @@ void vb_encode(int n, vector<unsigned char>& out) {
     out.push_back(n & 0x7F);
 }
 
+int vb_size(unsigned n) {
+    int s = 1;
+    while (n >= 128) {
+        n >>= 7;
+        s++;
+    }
+    return s;
+}
+
+// PForDelta-style block: the bit width b that minimises the block size; values that do not fit
+// keep their low b bits in the packed array and store (position, varbyte high bits) as exceptions
+void pfor_encode(const vector<int>& v, vector<unsigned char>& out) {
+    int n = v.size(), best = 0;
+    size_t bestSize = SIZE_MAX;
+    for (int b = 0; b <= 32; b++) {
+        size_t sz = (n * b + 7) / 8;
+        if (b < 32)
+            for (int x : v)
+                if ((unsigned)x >> b) sz += 1 + vb_size((unsigned)x >> b);
+        if (sz < bestSize) {
+            bestSize = sz;
+            best = b;
+        }
+    }
+
+    uint64_t mask = (1ull << best) - 1;
+    vector<unsigned char> packed((n * best + 7) / 8, 0), exc;
+    int ne = 0;
+    for (int i = 0; i < n; i++) {
+        uint64_t x = (unsigned)v[i];
+        int bit = i * best;
+        uint64_t low = x & mask;
+        for (int k = 0; k < best; k += 8 - ((bit + k) & 7))
+            packed[(bit + k) >> 3] |= (unsigned char)((low >> k) << ((bit + k) & 7));
+        if (best < 32 && (x >> best)) {
+            exc.push_back(i);
+            vb_encode(x >> best, exc);
+            ne++;
+        }
+    }
+    out.push_back(n);
+    out.push_back(best);
+    out.push_back(ne);
+    out.insert(out.end(), packed.begin(), packed.end());
+    out.insert(out.end(), exc.begin(), exc.end());
+}
+
 void writeBlock(ofstream& f, const vector<int>& docs, const vector<int>& freqs,
                 vector<int>& last, vector<int>& dsz, vector<int>& fsz) {
     // Delta encode
@@ -35,10 +118,14 @@ void writeBlock(ofstream& f, const vector<int>& docs, const vector<int>& freqs,
     for (size_t i = 1; i < docs.size(); i++)
         deltas.push_back(docs[i] - docs[i-1]);
 
-    // VarByte encode
     vector<unsigned char> ed, ef;
-    for (int d : deltas) vb_encode(d, ed);
-    for (int fr : freqs) vb_encode(fr, ef);
+    if (codec == CODEC_PFOR) {
+        pfor_encode(deltas, ed);
+        pfor_encode(freqs, ef);
+    } else {
+        for (int d : deltas) vb_encode(d, ed);
+        for (int fr : freqs) vb_encode(fr, ef);
+    }
 
     int ds = ed.size(), fs = ef.size();
     f.write((char*)&ds, 4);
@@ -51,23 +138,122 @@ void writeBlock(ofstream& f, const vector<int>& docs, const vector<int>& freqs,
     fsz.push_back(fs);
 }
 
-bool readNext(ifstream& f, string& term, int& doc, int& freq) {
+bool loadDocLengths() {
+    ifstream d("index/doc_lengths.txt");
+    if (!d) return false;
+    int id, l;
+    while (d >> id >> l) {
+        if (id >= (int)docLengths.size()) docLengths.resize(id + 1, 0);
+        docLengths[id] = l;
+        avgLen += l;
+        totalDocs++;
+    }
+    avgLen /= max(totalDocs, 1);
+    // Uniform quantization against the largest score any posting can reach (df = 1, tf -> inf).
+    // Postings with IDF <= 0 (df >= N/2) quantize to 0 and are dropped, unlike in the exact scorer;
+    // below 3 documents that is every posting, so the scale is left at 0 and query uses exact scoring
+    double maxIdf = log((totalDocs - 0.5) / 1.5);
+    impactScale = maxIdf > 0 ? IMPACT_LEVELS / (maxIdf * (K1 + 1)) : 0;
+    return totalDocs > 0;
+}
+
+// Impact-ordered copy of one posting list for score-at-a-time evaluation: BM25 scores quantized to
+// 1..255, grouped into segments of equal impact in decreasing order, each segment a varbyte d-gap
+// list of ascending doc IDs. Segment: uint8 impact, int32 count, int32 bytes, data.
+void writeImpacts(ofstream& f, LexWriter& lex, const string& term, const vector<int>& docs, const vector<int>& freqs) {
+    int df = docs.size();
+    double idf = log((totalDocs - df + 0.5) / (df + 0.5));
+    vector<pair<int, int>> post;
+    for (size_t i = 0; i < docs.size(); i++) {
+        int tf = freqs[i];
+        double s = idf * (tf * (K1 + 1)) / (tf + K1 * (1 - B + B * (docLengths[docs[i]] / avgLen)));
+        int q = min(IMPACT_LEVELS, (int)lround(s * impactScale));
+        if (q > 0) post.emplace_back(-q, docs[i]);
+    }
+    sort(post.begin(), post.end());
+
+    long long off = f.tellp();
+    int nseg = 0;
+    size_t i = 0;
+    while (i < post.size()) {
+        size_t j = i;
+        vector<unsigned char> enc;
+        int prev = 0;
+        while (j < post.size() && post[j].first == post[i].first) {
+            vb_encode(post[j].second - prev, enc);
+            prev = post[j].second;
+            j++;
+        }
+        uint8_t q = -post[i].first;
+        int n = j - i, sz = enc.size();
+        f.write((char*)&q, 1);
+        f.write((char*)&n, 4);
+        f.write((char*)&sz, 4);
+        f.write((char*)enc.data(), sz);
+        nseg++;
+        i = j;
+    }
+    lex.add(term, term + "\t" + to_string(off) + "\t" + to_string(nseg) + "\t" + to_string(post.size()) + "\n");
+}
+
+// Term-ID runs: the per-run delta dictionaries concatenate into the global ID -> term table
+bool loadDicts(int numRuns) {
+    ifstream meta("index/indexer_meta.txt");
+    string key;
+    int v;
+    while (meta >> key >> v)
+        if (key == "term_ids") termIds = v == 1;
+    if (!termIds) return true;
+
+    for (int i = 0; i < numRuns; i++) {
+        ifstream d("partial/dict_" + to_string(i) + ".txt");
+        if (!d) return false;
+        string t;
+        while (getline(d, t)) dict.push_back(t);
+    }
+    return true;
+}
+
+bool readNext(ifstream& f, Entry& e) {
+    if (termIds) {
+        uint32_t rec[3];
+        if (!f.read((char*)rec, 12)) return false;
+        e.key = rec[0];
+        e.doc = rec[1];
+        e.freq = rec[2];
+        return true;
+    }
     int len;
     if (!f.read((char*)&len, 4)) return false;
-    term.resize(len);
-    f.read(&term[0], len);
-    f.read((char*)&doc, 4);
-    f.read((char*)&freq, 4);
+    e.term.resize(len);
+    f.read(&e.term[0], len);
+    f.read((char*)&e.doc, 4);
+    f.read((char*)&e.freq, 4);
     return true;
 }
 
 int main(int argc, char* argv[]) {
-    if (argc != 2) {
-        cerr << "Usage: " << argv[0] << " <num_runs>\n";
+    if (argc < 2) {
+        cerr << "Usage: " << argv[0] << " <num_runs> [--impacts] [--codec vbyte|pfor]\n";
         return 1;
     }
 
     int numRuns = stoi(argv[1]);
+    bool impacts = false;
+    for (int i = 2; i < argc; i++) {
+        string a = argv[i];
+        if (a == "--impacts") impacts = true;
+        else if (a == "--codec" && i + 1 < argc && string(argv[i + 1]) == "pfor") codec = CODEC_PFOR, i++;
+        else if (a == "--codec" && i + 1 < argc && string(argv[i + 1]) == "vbyte") codec = CODEC_VBYTE, i++;
+        else {
+            cerr << "Unknown option " << a << "\n";
+            return 1;
+        }
+    }
+    if (impacts && !loadDocLengths()) {
+        cerr << "--impacts needs index/doc_lengths.txt\n";
+        return 1;
+    }
 
     vector<ifstream> runs(numRuns);
     for (int i = 0; i < numRuns; i++) {
@@ -77,23 +263,32 @@ int main(int argc, char* argv[]) {
             return 1;
         }
     }
+    if (!loadDicts(numRuns)) {
+        cerr << "Missing partial/dict_*.txt for term-ID runs\n";
+        return 1;
+    }
 
     ofstream inv("index/inverted_index.bin", ios::binary);
-    ofstream lex("index/lexicon.txt");
+    LexWriter lex, impLex;
+    lex.out.open("index/lexicon.txt");
+    ofstream imp;
+    if (impacts) {
+        imp.open("index/impacts.bin", ios::binary);
+        impLex.out.open("index/impact_lexicon.txt");
+        ofstream("index/impact_meta.txt") << setprecision(17) << "scale\t" << impactScale << "\nlevels\t" << IMPACT_LEVELS << "\n";
+    }
 
     priority_queue<Entry, vector<Entry>, greater<Entry>> pq;
 
-    vector<string> terms(numRuns);
-    vector<int> docs(numRuns), freqs(numRuns);
     for (int i = 0; i < numRuns; i++) {
-        if (readNext(runs[i], terms[i], docs[i], freqs[i]))
-            pq.push({terms[i], docs[i], freqs[i], i});
+        Entry e{"", 0, 0, 0, i};
+        if (readNext(runs[i], e)) pq.push(e);
     }
 
     vector<int> allLast, allDocSz, allFreqSz;
     unordered_map<string, int> df;
     string curTerm;
-    vector<int> tDocs, tFreqs;
+    vector<int> tDocs, tFreqs, allDocs, allFreqs;
     long long startOff = 0;
     int startBlk = 0, nTerms = 0;
     long long np = 0;
@@ -101,15 +296,19 @@ int main(int argc, char* argv[]) {
     while (!pq.empty()) {
         auto e = pq.top();
         pq.pop();
+        const string& term = termIds ? dict[e.key] : e.term;
 
         // New term - finish previous
-        if (!curTerm.empty() && e.term != curTerm) {
+        if (!curTerm.empty() && term != curTerm) {
             if (!tDocs.empty())
                 writeBlock(inv, tDocs, tFreqs, allLast, allDocSz, allFreqSz);
 
-            lex << curTerm << "\t" << startOff << "\t" << startBlk
-                << "\t" << np << "\t" << df[curTerm] << "\n";
+            lex.add(curTerm, curTerm + "\t" + to_string(startOff) + "\t" + to_string(startBlk)
+                    + "\t" + to_string(np) + "\t" + to_string(df[curTerm]) + "\n");
+            if (impacts) writeImpacts(imp, impLex, curTerm, allDocs, allFreqs);
 
+            allDocs.clear();
+            allFreqs.clear();
             tDocs.clear();
             tFreqs.clear();
             startOff = inv.tellp();
@@ -120,14 +319,18 @@ int main(int argc, char* argv[]) {
                 cerr << "Merged " << nTerms << " terms\r" << flush;
         }
 
-        if (e.term != curTerm) {
-            curTerm = e.term;
+        if (term != curTerm) {
+            curTerm = term;
             df[curTerm] = 0;
             np = 0;
         }
 
         tDocs.push_back(e.doc);
         tFreqs.push_back(e.freq);
+        if (impacts) {
+            allDocs.push_back(e.doc);
+            allFreqs.push_back(e.freq);
+        }
         df[curTerm]++;
         np++;
 
@@ -138,27 +341,32 @@ int main(int argc, char* argv[]) {
         }
 
         // Read next from same file
-        int i = e.file;
-        if (readNext(runs[i], terms[i], docs[i], freqs[i]))
-            pq.push({terms[i], docs[i], freqs[i], i});
+        if (readNext(runs[e.file], e)) pq.push(move(e));
     }
 
     // Process last term
     if (!curTerm.empty()) {
         if (!tDocs.empty())
             writeBlock(inv, tDocs, tFreqs, allLast, allDocSz, allFreqSz);
-        lex << curTerm << "\t" << startOff << "\t" << startBlk
-            << "\t" << np << "\t" << df[curTerm] << "\n";
+        lex.add(curTerm, curTerm + "\t" + to_string(startOff) + "\t" + to_string(startBlk)
+                + "\t" + to_string(np) + "\t" + to_string(df[curTerm]) + "\n");
+        if (impacts) writeImpacts(imp, impLex, curTerm, allDocs, allFreqs);
         nTerms++;
     }
 
     for (auto& f : runs) f.close();
     inv.close();
     lex.close();
+    impLex.close();
 
     // Write metadata
     ofstream meta("index/metadata.bin", ios::binary);
     int nb = allLast.size();
+    if (codec != CODEC_VBYTE) {
+        // Negative leading int marks a codec header; plain varbyte indexes keep the old layout
+        int tag = -codec;
+        meta.write((char*)&tag, 4);
+    }
     meta.write((char*)&nb, 4);
     meta.write((char*)allLast.data(), nb * 4);
     meta.write((char*)allDocSz.data(), nb * 4);
@@ -5,6 +5,7 @@
 #include <string>
 #include <vector>
 #include <unordered_map>
+#include <map>
 #include <unordered_set>
 #include <algorithm>
 #include <cmath>
@@ -14,11 +15,14 @@
 #include <mutex>
 #include <atomic>
 #include <filesystem>
+#include <memory>
+#include <cstdint>
 
 using namespace std;
 namespace fs = std::filesystem;
 
 const double K1 = 1.2, B = 0.75;
+const int CODEC_VBYTE = 0, CODEC_PFOR = 1;
 const int BLOCK_SIZE = 128;
 
 const unordered_set<string> STOPWORDS = {
@@ -178,10 +182,22 @@ public:
 // Globals
 unordered_map<string, tuple<long long, int, int, int>> lexicon;
 vector<int> lastDocIDs, docIDSizes, freqSizes;
+vector<long long> blockOffsets;
+int codec = CODEC_VBYTE;
 unordered_map<int, int> docLengths;
 unordered_map<int, string> docIdMap;
 int totalDocs = 0;
 double avgLen = 0;
+bool conjunctive = false;
+int minResults = 10;
+atomic<int> orFallbacks(0);
+
+// Impact index (merger --impacts): term -> (offset, segments, postings)
+unordered_map<string, tuple<long long, int, int>> impactLexicon;
+double impactScale = 0;
+bool useImpacts = false;
+long long budget = 0;
+atomic<long long> earlyStops(0);
 mutex outMutex;
 
 int vb_decode(const unsigned char* d, int& o) {
@@ -195,6 +211,38 @@ int vb_decode(const unsigned char* d, int& o) {
     return n;
 }
 
+// PForDelta-style block (merger --codec pfor): n, bit width b, exception count, n values packed
+// in b bits, then (position, varbyte high bits) per exception. Unpacked in one fixed-width pass
+// with 64-bit loads (the buffer carries 8 bytes of padding), then exceptions are patched.
+int pfor_decode(const unsigned char* d, int* out) {
+    int n = d[0], b = d[1], ne = d[2];
+    const unsigned char* p = d + 3;
+    uint64_t mask = (1ull << b) - 1;
+    for (int i = 0; i < n; i++) {
+        int bit = i * b;
+        uint64_t w;
+        memcpy(&w, p + (bit >> 3), 8);
+        out[i] = (w >> (bit & 7)) & mask;
+    }
+    int o = 3 + (n * b + 7) / 8;
+    for (int e = 0; e < ne; e++) {
+        int pos = d[o++];
+        out[pos] |= vb_decode(d, o) << b;
+    }
+    return n;
+}
+
+void decodeBlock(const vector<unsigned char>& d, int size, vector<int>& out) {
+    if (codec == CODEC_PFOR) {
+        out.resize(BLOCK_SIZE);
+        out.resize(pfor_decode(d.data(), out.data()));
+        return;
+    }
+    out.clear();
+    int p = 0;
+    while (p < size) out.push_back(vb_decode(d.data(), p));
+}
+
 vector<string> tokenize(const string& s) {
     vector<string> t;
     string w;
@@ -214,44 +262,32 @@ vector<string> tokenize(const string& s) {
 
 class InvList {
     ifstream f;
-    long long off;
-    int sb, np, bi, pi;
+    int bi = 0, eb = 0, cur = -1, pi = 0;
     vector<int> docs, freqs;
+    vector<unsigned char> buf;
     bool done = false;
 
+    // Decode block bi; its file offset comes from the block size prefix sums, so skipping is O(1)
     void load() {
-        docs.clear();
-        freqs.clear();
-        if (bi >= sb + (np + BLOCK_SIZE - 1) / BLOCK_SIZE) {
-            done = true;
-            return;
-        }
-
-        long long o = off;
-        for (int i = sb; i < bi; i++)
-            o += 4 + docIDSizes[i] + 4 + freqSizes[i];
-
-        f.seekg(o);
-        int ds;
+        f.seekg(blockOffsets[bi]);
+        int ds, fs;
         f.read((char*)&ds, 4);
-        vector<unsigned char> d(ds);
-        f.read((char*)d.data(), ds);
-
-        int fs;
-        f.read((char*)&fs, 4);
-        vector<unsigned char> fr(fs);
-        f.read((char*)fr.data(), fs);
-
-        int p = 0;
-        while (p < ds) docs.push_back(vb_decode(d.data(), p));
+        buf.assign(ds + 8, 0);
+        f.read((char*)buf.data(), ds);
+        decodeBlock(buf, ds, docs);
         for (size_t i = 1; i < docs.size(); i++) docs[i] += docs[i-1];
 
-        p = 0;
-        while (p < fs) freqs.push_back(vb_decode(fr.data(), p));
+        f.read((char*)&fs, 4);
+        buf.assign(fs + 8, 0);
+        f.read((char*)buf.data(), fs);
+        decodeBlock(buf, fs, freqs);
+        cur = bi;
         pi = 0;
     }
 
 public:
+    int df = 0;
+
     InvList(const string& t) {
         auto it = lexicon.find(t);
         if (it == lexicon.end()) {
@@ -259,36 +295,36 @@ public:
             return;
         }
         f.open("index/inverted_index.bin", ios::binary);
-        off = get<0>(it->second);
-        sb = get<1>(it->second);
-        np = get<2>(it->second);
-        bi = sb;
-        load();
+        bi = get<1>(it->second);
+        eb = bi + (get<2>(it->second) + BLOCK_SIZE - 1) / BLOCK_SIZE;
+        df = get<3>(it->second);
+        done = bi >= eb;
     }
 
+    // First posting with doc >= tgt; blocks whose last doc is below tgt are skipped without decoding
     bool nextGEQ(int tgt) {
         if (done) return false;
-        while (bi < sb + (np + BLOCK_SIZE - 1) / BLOCK_SIZE) {
-            if (lastDocIDs[bi] >= tgt) {
-                if (docs.empty() || pi >= (int)docs.size()) load();
-                break;
-            }
-            bi++;
-        }
-        if (done) return false;
-        while (pi < (int)docs.size()) {
-            if (docs[pi] >= tgt) return true;
-            pi++;
+        while (bi < eb && lastDocIDs[bi] < tgt) bi++;
+        if (bi >= eb) {
+            done = true;
+            return false;
         }
-        bi++;
-        load();
-        return nextGEQ(tgt);
+        if (cur != bi) load();
+        while (docs[pi] < tgt) pi++;
+        return true;
     }
 
-    bool has() { return !done && pi < (int)docs.size(); }
+    bool has() {
+        if (done) return false;
+        if (cur != bi) load();
+        return true;
+    }
     int doc() { return docs[pi]; }
     int freq() { return freqs[pi]; }
-    void next() { pi++; }
+    void next() {
+        if (++pi < (int)docs.size()) return;
+        if (++bi >= eb) done = true;
+    }
 };
 
 double bm25(int tf, int dl, int df) {
@@ -305,7 +341,6 @@ vector<pair<int, double>> query(const vector<string>& terms) {
         if (it == lexicon.end()) continue;
         int df = get<3>(it->second);
         InvList l(t);
-        l.nextGEQ(0);
         while (l.has()) {
             int d = l.doc(), f = l.freq();
             if (sc[d] == 0) touched.push_back(d);
@@ -324,6 +359,142 @@ vector<pair<int, double>> query(const vector<string>& terms) {
     return r;
 }
 
+// Conjunctive DAAT: the list with the smallest df proposes candidates and the others skip to them
+// with nextGEQ, so most blocks of the longer lists are never decoded
+vector<pair<int, double>> queryAnd(const vector<string>& terms) {
+    unordered_map<string, int> qtf;
+    for (auto& t : terms) qtf[t]++;
+    vector<pair<int, string>> order;
+    for (auto& [t, n] : qtf) {
+        auto it = lexicon.find(t);
+        if (it == lexicon.end()) return {};
+        order.emplace_back(get<3>(it->second), t);
+    }
+    if (order.empty()) return {};
+    sort(order.begin(), order.end());
+
+    vector<unique_ptr<InvList>> lists;
+    vector<int> mult;
+    for (auto& [df, t] : order) {
+        lists.push_back(make_unique<InvList>(t));
+        mult.push_back(qtf[t]);
+    }
+
+    vector<pair<int, double>> r;
+    size_t n = lists.size();
+    int d = 0;
+    while (lists[0]->nextGEQ(d)) {
+        d = lists[0]->doc();
+        size_t i = 1;
+        while (i < n && lists[i]->nextGEQ(d) && lists[i]->doc() == d) i++;
+        if (i < n) {
+            if (!lists[i]->has()) break;
+            d = lists[i]->doc();
+            continue;
+        }
+        double s = 0;
+        int dl = docLengths[d];
+        for (size_t j = 0; j < n; j++) s += mult[j] * bm25(lists[j]->freq(), dl, lists[j]->df);
+        r.emplace_back(d, s);
+        d++;
+    }
+
+    size_t k = min(r.size(), (size_t)1000);
+    partial_sort(r.begin(), r.begin() + k, r.end(), [](auto& a, auto& b) { return a.second > b.second; });
+    r.resize(k);
+    return r;
+}
+
+struct Segment {
+    long long off;
+    int impact, count, size;
+};
+
+// Score-at-a-time over the impact index: segments of all query terms are processed in decreasing
+// impact order, adding small integers into the accumulators. With a budget, evaluation stops after
+// that many postings, which drops only the lowest-impact contributions.
+vector<pair<int, double>> queryImpacts(const vector<string>& terms) {
+    static thread_local vector<int> acc(totalDocs, 0);
+    static thread_local vector<int> touched;
+
+    map<string, int> qtf;  // ordered, so equal-impact segments are taken in the same order as the Python reader
+    for (auto& t : terms) qtf[t]++;
+    ifstream f("index/impacts.bin", ios::binary);
+    vector<Segment> segs;
+    for (auto& [t, n] : qtf) {
+        auto it = impactLexicon.find(t);
+        if (it == impactLexicon.end()) continue;
+        long long o = get<0>(it->second);
+        for (int s = 0; s < get<1>(it->second); s++) {
+            uint8_t q;
+            int cnt, sz;
+            f.seekg(o);
+            f.read((char*)&q, 1);
+            f.read((char*)&cnt, 4);
+            f.read((char*)&sz, 4);
+            segs.push_back({o + 9, q * n, cnt, sz});
+            o += 9 + sz;
+        }
+    }
+    stable_sort(segs.begin(), segs.end(), [](auto& a, auto& b) { return a.impact > b.impact; });
+
+    long long done = 0;
+    vector<unsigned char> buf;
+    for (auto& s : segs) {
+        if (budget && done >= budget) {
+            earlyStops++;
+            break;
+        }
+        buf.resize(s.size);
+        f.seekg(s.off);
+        f.read((char*)buf.data(), s.size);
+        int p = 0, d = 0;
+        while (p < s.size) {
+            d += vb_decode(buf.data(), p);
+            if (acc[d] == 0) touched.push_back(d);
+            acc[d] += s.impact;
+        }
+        done += s.count;
+    }
+
+    vector<pair<int, double>> r;
+    for (int d : touched) r.emplace_back(d, acc[d] / impactScale);
+    touched.clear();
+    for (auto& p : r) acc[p.first] = 0;
+
+    size_t k = min(r.size(), (size_t)1000);
+    partial_sort(r.begin(), r.begin() + k, r.end(), [](auto& a, auto& b) { return a.second > b.second; });
+    r.resize(k);
+    return r;
+}
+
+bool loadImpacts() {
+    ifstream m("index/impact_meta.txt");
+    string key;
+    double v;
+    while (m >> key >> v)
+        if (key == "scale") impactScale = v;
+    ifstream f("index/impact_lexicon.txt");
+    if (!f) return false;
+    string t;
+    long long o;
+    int ns, np;
+    while (f >> t >> o >> ns >> np)
+        impactLexicon[t] = {o, ns, np};
+    return true;
+}
+
+// AND when requested, falling back to OR when it finds fewer than minResults documents
+vector<pair<int, double>> search(const vector<string>& terms) {
+    if (useImpacts) return queryImpacts(terms);
+    if (conjunctive) {
+        auto r = queryAnd(terms);
+        if ((int)r.size() >= minResults) return r;
+        orFallbacks++;
+    }
+    return query(terms);
+}
+
 bool loadIndex() {
     ifstream f("index/lexicon.txt");
     if (!f) return false;
@@ -337,6 +508,10 @@ bool loadIndex() {
     ifstream m("index/metadata.bin", ios::binary);
     int n;
     m.read((char*)&n, 4);
+    if (n < 0) {  // codec header written by merger --codec
+        codec = -n;
+        m.read((char*)&n, 4);
+    }
     lastDocIDs.resize(n);
     docIDSizes.resize(n);
     freqSizes.resize(n);
@@ -345,6 +520,13 @@ bool loadIndex() {
     m.read((char*)freqSizes.data(), n * 4);
     m.close();
 
+    blockOffsets.resize(n);
+    long long pos = 0;
+    for (int i = 0; i < n; i++) {
+        blockOffsets[i] = pos;
+        pos += 8 + docIDSizes[i] + freqSizes[i];
+    }
+
     ifstream d("index/doc_lengths.txt");
     int id, l;
     while (d >> id >> l) {
@@ -361,15 +543,34 @@ bool loadIndex() {
 }
 
 int main(int argc, char* argv[]) {
-    if (argc != 2) {
-        cerr << "Usage: " << argv[0] << " <queries.tsv>\n";
+    if (argc < 2) {
+        cerr << "Usage: " << argv[0] << " <queries.tsv> [--and] [--min-results N] [--impacts] [--budget postings]\n";
         return 1;
     }
+    for (int i = 2; i < argc; i++) {
+        string a = argv[i];
+        if (a == "--and") conjunctive = true;
+        else if (a == "--min-results" && i + 1 < argc) minResults = stoi(argv[++i]);
+        else if (a == "--impacts") useImpacts = true;
+        else if (a == "--budget" && i + 1 < argc) budget = stoll(argv[++i]);
+        else {
+            cerr << "Unknown option " << a << "\n";
+            return 1;
+        }
+    }
 
     if (!loadIndex()) {
         cerr << "Index load failed\n";
         return 1;
     }
+    if (useImpacts && !loadImpacts()) {
+        cerr << "Impact index missing, rebuild with merger --impacts\n";
+        return 1;
+    }
+    if (useImpacts && impactScale <= 0) {
+        cerr << "Impact index is empty (no term has positive IDF over " << totalDocs << " docs), using exact scoring\n";
+        useImpacts = false;
+    }
 
     ifstream q(argv[1]);
     vector<string> lines;
@@ -394,7 +595,7 @@ int main(int argc, char* argv[]) {
             getline(ss, id, '\t');
             getline(ss, text);
 
-            auto res = query(tokenize(text));
+            auto res = search(tokenize(text));
             int rk = 1;
             for (auto& p : res)
                 local.push_back(id + " Q0 " + docIdMap[p.first] + " " +
@@ -409,6 +610,10 @@ int main(int argc, char* argv[]) {
         threads.emplace_back(worker);
     for (auto& t : threads) t.join();
 
+    if (useImpacts && budget)
+        cout << "Impacts: " << earlyStops << "/" << lines.size() << " queries stopped at the budget\n";
+    if (conjunctive)
+        cout << "AND: " << orFallbacks << "/" << lines.size() << " queries fell back to OR\n";
     cout << "Done. Results: " << outFile << "\n";
     return 0;
 }
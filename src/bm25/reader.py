@@ -0,0 +1,399 @@
+import mmap
+import re
+from pathlib import Path
+
+import numpy as np
+
+K1, B = 1.2, 0.75
+BLOCK_SIZE = 128
+CODEC_VBYTE, CODEC_PFOR = 0, 1
+TOP_K = 1000
+MIN_RESULTS = 10
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "in", "on", "at", "to", "for",
+    "of", "with", "by", "from", "as", "is", "was", "are", "were", "been",
+    "be", "have", "has", "had", "do", "does", "did", "will", "would", "could",
+    "should", "may", "might", "must", "shall", "can", "need", "it", "its",
+    "this", "that", "these", "those", "i", "you", "he", "she", "we", "they",
+    "what", "which", "who", "whom", "when", "where", "why", "how", "all",
+    "each", "every", "both", "few", "more", "most", "other", "some", "such",
+    "no", "nor", "not", "only", "own", "same", "so", "than", "too", "very",
+    "just", "also", "now",
+}
+
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+STEP2 = [("ational", "ate"), ("tional", "tion"), ("enci", "ence"), ("anci", "ance"), ("izer", "ize"), ("abli", "able"),
+         ("alli", "al"), ("entli", "ent"), ("eli", "e"), ("ousli", "ous"), ("ization", "ize"), ("ation", "ate"), ("ator", "ate"),
+         ("alism", "al"), ("iveness", "ive"), ("fulness", "ful"), ("ousness", "ous"), ("aliti", "al"), ("iviti", "ive"), ("biliti", "ble")]
+STEP3 = [("icate", "ic"), ("ative", ""), ("alize", "al"), ("iciti", "ic"), ("ical", "ic"), ("ful", ""), ("ness", "")]
+STEP4 = ["al", "ance", "ence", "er", "ic", "able", "ible", "ant", "ement", "ment", "ent", "ion", "ou", "ism", "ate", "iti",
+         "ous", "ive", "ize"]
+
+
+# Port of the PorterStemmer in the C++ query tools, quirks included, so Python lookups hit the same lexicon terms
+def _cons(w, i):
+    c = w[i]
+    return c not in "aeiou" and (c != "y" or i == 0 or not _cons(w, i - 1))
+
+
+def _m(w):
+    m, i, n = 0, 0, len(w)
+    while i < n and _cons(w, i):
+        i += 1
+    while i < n:
+        while i < n and not _cons(w, i):
+            i += 1
+        if i >= n:
+            break
+        m += 1
+        while i < n and _cons(w, i):
+            i += 1
+    return m
+
+
+def _has_vowel(w):
+    return any(not _cons(w, i) for i in range(len(w)))
+
+
+def _double_cons(w):
+    return len(w) >= 2 and w[-1] == w[-2] and _cons(w, len(w) - 1)
+
+
+def _cvc(w):
+    n = len(w)
+    return n >= 3 and _cons(w, n - 1) and not _cons(w, n - 2) and _cons(w, n - 3) and w[-1] not in "wxy"
+
+
+def _replace(s, table):
+    for suffix, rep in table:
+        if s.endswith(suffix):
+            t = s[:-len(suffix)]
+            return t + rep if _m(t) > 0 else s
+    return s
+
+
+def stem(w):
+    if len(w) <= 2:
+        return w
+    s = w
+    if s.endswith("sses"):
+        s = s[:-2]
+    elif s.endswith("ies"):
+        s = s[:-2]
+    elif not s.endswith("ss") and s.endswith("s"):
+        s = s[:-1]
+
+    f = False
+    if s.endswith("eed"):
+        if _m(s[:-3]) > 0:
+            s = s[:-1]
+    elif s.endswith("ed"):
+        if _has_vowel(s[:-2]):
+            s, f = s[:-2], True
+    elif s.endswith("ing"):
+        if _has_vowel(s[:-3]):
+            s, f = s[:-3], True
+    if f:
+        if s.endswith(("at", "bl", "iz")):
+            s += "e"
+        elif _double_cons(s) and s[-1] not in "lsz":
+            s = s[:-1]
+        elif _m(s) == 1 and _cvc(s):
+            s += "e"
+
+    if s.endswith("y") and _has_vowel(s[:-1]):
+        s = s[:-1] + "i"
+
+    s = _replace(s, STEP2)
+    s = _replace(s, STEP3)
+
+    for suffix in STEP4:
+        if s.endswith(suffix):
+            t = s[:-len(suffix)]
+            if _m(t) > 1 and (suffix != "ion" or t[-1:] in ("s", "t")):
+                s = t
+            break
+
+    if s.endswith("e"):
+        t = s[:-1]
+        m = _m(t)
+        if m > 1 or (m == 1 and not _cvc(t)):
+            s = t
+    if _m(s) > 1 and _double_cons(s) and s[-1] == "l":
+        s = s[:-1]
+    return s
+
+
+def tokenize(text):
+    return [stem(w) for w in (w.lower() for w in _WORD.findall(text)) if len(w) > 1 and w not in STOPWORDS]
+
+
+def vb_decode(data):
+    b = np.frombuffer(data, dtype=np.uint8)
+    if not len(b):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = 7 * (np.arange(len(b)) - np.repeat(starts, ends - starts + 1))
+    return np.add.reduceat((b & 0x7F).astype(np.int64) << shift, starts)
+
+
+# PForDelta-style block written by merger --codec pfor: n, bit width, exception count, packed values,
+# then (position, varbyte high bits) per exception
+def pfor_decode(data):
+    b = np.frombuffer(data, dtype=np.uint8)
+    n, width, ne = int(b[0]), int(b[1]), int(b[2])
+    end = 3 + (n * width + 7) // 8
+    if width:
+        bits = np.unpackbits(b[3:end], bitorder="little")[:n * width].reshape(n, width).astype(np.int64)
+        out = bits @ (np.int64(1) << np.arange(width, dtype=np.int64))
+    else:
+        out = np.zeros(n, dtype=np.int64)
+    o = end
+    for _ in range(ne):
+        pos, o = b[o], o + 1
+        high = shift = 0
+        while True:
+            x, o = int(b[o]), o + 1
+            high |= (x & 0x7F) << shift
+            shift += 7
+            if x < 0x80:
+                break
+        out[pos] |= high << width
+    return out
+
+
+# One term's posting list; blocks are decoded on demand and cached for the life of the cursor
+class Postings:
+    def __init__(self, index, term):
+        self.index = index
+        _, self.start, n, self.df = index.lexicon[term]
+        self.end = self.start + (n + BLOCK_SIZE - 1) // BLOCK_SIZE
+        self.blocks = {}
+
+    def block(self, i):
+        if i not in self.blocks:
+            self.blocks[i] = self.index.read_block(i)
+        return self.blocks[i]
+
+    def all(self):
+        docs, freqs = zip(*(self.block(i) for i in range(self.start, self.end)))
+        return np.concatenate(docs), np.concatenate(freqs)
+
+    # Vectorised nextGEQ: for each target, the first posting with doc >= target. Blocks are picked
+    # from lastDocIDs and only those are decoded. Returns (docs, freqs), doc -1 past the end of the list.
+    def next_geq(self, targets):
+        last = self.index.last_doc_ids[self.start:self.end]
+        blocks = np.searchsorted(last, targets)
+        docs = np.full(len(targets), -1, dtype=np.int64)
+        freqs = np.zeros(len(targets), dtype=np.int64)
+        for b in np.unique(blocks[blocks < len(last)]):
+            sel = np.flatnonzero(blocks == b)
+            bd, bf = self.block(self.start + b)
+            pos = np.searchsorted(bd, targets[sel])
+            docs[sel], freqs[sel] = bd[pos], bf[pos]
+        return docs, freqs
+
+
+def _doc_lengths(index_dir):
+    return np.fromfile(Path(index_dir) / "doc_lengths.txt", dtype=np.int64, sep=" ").reshape(-1, 2)
+
+
+# Collection-wide N, avgdl and df summed over the shards of a document-partitioned index, so every
+# shard scores with the statistics the unsharded index would use
+def global_stats(index_dirs):
+    docs, total_len, df = 0, 0, {}
+    for d in index_dirs:
+        lengths = _doc_lengths(d)
+        docs += len(lengths)
+        total_len += int(lengths[:, 1].sum())
+        with open(Path(d) / "lexicon.txt", encoding="utf-8") as f:
+            for line in f:
+                t, n = line.split()[0::4]
+                df[t] = df.get(t, 0) + int(n)
+    return {"docs": docs, "avg_len": total_len / docs if docs else 0.0, "df": df}
+
+
+# First line: docs and avg_len, then one "term df" line per term
+def save_stats(stats, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{stats['docs']} {stats['avg_len']!r}\n")
+        for t, n in sorted(stats["df"].items()):
+            f.write(f"{t} {n}\n")
+
+
+def load_stats(path):
+    with open(path, encoding="utf-8") as f:
+        docs, avg_len = f.readline().split()
+        df = {t: int(n) for t, n in (line.split() for line in f)}
+    return {"docs": int(docs), "avg_len": float(avg_len), "df": df}
+
+
+# Read-only view of the index written by merger (lexicon.txt, metadata.bin, inverted_index.bin,
+# doc_lengths.txt, page_table.txt), scoring exactly like the C++ query tools. `stats` (from
+# global_stats/load_stats) replaces the local N, avgdl and df when the index is one shard of many.
+class BM25Index:
+    def __init__(self, index_dir="index", stats=None):
+        self.dir = Path(index_dir)
+        self.lexicon = {}
+        df = stats["df"] if stats else {}
+        with open(self.dir / "lexicon.txt", encoding="utf-8") as f:
+            for line in f:
+                t, off, sb, n, local_df = line.split()
+                self.lexicon[t] = (int(off), int(sb), int(n), df.get(t, int(local_df)))
+        meta = np.fromfile(self.dir / "metadata.bin", dtype=np.int32)
+        # A negative leading int is the codec header written by merger --codec
+        self.codec = CODEC_VBYTE
+        if len(meta) and meta[0] < 0:
+            self.codec, meta = -int(meta[0]), meta[1:]
+        self.decode = pfor_decode if self.codec == CODEC_PFOR else vb_decode
+        n = int(meta[0])
+        self.last_doc_ids, doc_sizes, freq_sizes = meta[1:1 + n], meta[1 + n:1 + 2 * n], meta[1 + 2 * n:1 + 3 * n]
+        self.block_offsets = np.concatenate(([0], np.cumsum(8 + doc_sizes.astype(np.int64) + freq_sizes)))
+        lengths = _doc_lengths(self.dir)
+        self.doc_lengths = np.zeros(int(lengths[:, 0].max()) + 1 if len(lengths) else 0, dtype=np.float64)
+        self.doc_lengths[lengths[:, 0]] = lengths[:, 1]
+        self.total_docs = stats["docs"] if stats else len(lengths)
+        self.avg_len = stats["avg_len"] if stats else (lengths[:, 1].mean() if len(lengths) else 0.0)
+        self.doc_ids = {}
+        with open(self.dir / "page_table.txt", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2:
+                    self.doc_ids[int(parts[0])] = parts[1]
+        self._file = open(self.dir / "inverted_index.bin", "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._impacts = None
+        self.or_fallbacks = self.early_stops = 0
+
+    # merger --impacts output, loaded on first score-at-a-time query
+    def impact_index(self):
+        if self._impacts is None:
+            if not (self.dir / "impact_lexicon.txt").exists():
+                raise FileNotFoundError(f"No impact index in {self.dir}, rebuild with merger --impacts")
+            with open(self.dir / "impact_meta.txt") as f:
+                meta = dict(line.split() for line in f if line.strip())
+            lexicon = {}
+            with open(self.dir / "impact_lexicon.txt", encoding="utf-8") as f:
+                for line in f:
+                    t, off, nseg, n = line.split()
+                    lexicon[t] = (int(off), int(nseg))
+            fh = open(self.dir / "impacts.bin", "rb")
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if lexicon else b""
+            self._impacts = (lexicon, float(meta["scale"]), fh, mm)
+        return self._impacts
+
+    # (impact, count, offset, size) of each segment of a term, highest impact first
+    def impact_segments(self, term):
+        lexicon, _, _, mm = self.impact_index()
+        if term not in lexicon:
+            return []
+        o, nseg = lexicon[term]
+        segs = []
+        for _ in range(nseg):
+            count, size = np.frombuffer(mm, dtype="<i4", count=2, offset=o + 1)
+            segs.append((mm[o], int(count), o + 9, int(size)))
+            o += 9 + int(size)
+        return segs
+
+    def read_block(self, i):
+        o = int(self.block_offsets[i])
+        ds = int.from_bytes(self._mm[o:o + 4], "little")
+        docs = np.cumsum(self.decode(self._mm[o + 4:o + 4 + ds]))
+        o += 4 + ds
+        fs = int.from_bytes(self._mm[o:o + 4], "little")
+        return docs, self.decode(self._mm[o + 4:o + 4 + fs])
+
+    def bm25(self, tf, docs, df):
+        idf = np.log((self.total_docs - df + 0.5) / (df + 0.5))
+        return idf * (tf * (K1 + 1)) / (tf + K1 * (1 - B + B * self.doc_lengths[docs] / self.avg_len))
+
+    def _top(self, docs, scores, k):
+        if len(docs) > k:
+            keep = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")
+        return [(self.doc_ids.get(int(d), str(d)), float(s)) for d, s in zip(docs[order], scores[order])]
+
+    def query_or(self, terms, k=TOP_K):
+        docs, scores = [], []
+        for t in terms:
+            if t in self.lexicon:
+                p = Postings(self, t)
+                d, f = p.all()
+                docs.append(d)
+                scores.append(self.bm25(f, d, p.df))
+        if not docs:
+            return []
+        uniq, inv = np.unique(np.concatenate(docs), return_inverse=True)
+        return self._top(uniq, np.bincount(inv, weights=np.concatenate(scores)), k)
+
+    # Conjunctive DAAT: candidates come from the shortest list and each longer list is probed with nextGEQ
+    def query_and(self, terms, k=TOP_K):
+        qtf = {}
+        for t in terms:
+            qtf[t] = qtf.get(t, 0) + 1
+        if not qtf or any(t not in self.lexicon for t in qtf):
+            return []
+        terms = sorted(qtf, key=lambda t: self.lexicon[t][3])
+        lists = [Postings(self, t) for t in terms]
+        docs, freqs = lists[0].all()
+        scores = qtf[terms[0]] * self.bm25(freqs, docs, lists[0].df)
+        for t, p in zip(terms[1:], lists[1:]):
+            found, f = p.next_geq(docs)
+            hit = found == docs
+            docs, scores = docs[hit], scores[hit] + qtf[t] * self.bm25(f[hit], docs[hit], p.df)
+            if not len(docs):
+                return []
+        return self._top(docs, scores, k)
+
+    # Score-at-a-time over the impact index: segments in decreasing impact order, stopping once
+    # `budget` postings have been added (None scores every posting)
+    def query_saat(self, terms, k=TOP_K, budget=None):
+        _, scale, _, mm = self.impact_index()
+        qtf = {}
+        for t in terms:
+            qtf[t] = qtf.get(t, 0) + 1
+        segs = sorted(((q * n, count, off, size) for t, n in sorted(qtf.items()) for q, count, off, size in self.impact_segments(t)),
+                      key=lambda s: -s[0])
+        docs, impacts, done = [], [], 0
+        for impact, count, off, size in segs:
+            if budget and done >= budget:
+                self.early_stops += 1
+                break
+            docs.append(np.cumsum(vb_decode(mm[off:off + size])))
+            impacts.append(np.full(count, impact, dtype=np.int64))
+            done += count
+        if not docs:
+            return []
+        uniq, inv = np.unique(np.concatenate(docs), return_inverse=True)
+        return self._top(uniq, np.bincount(inv, weights=np.concatenate(impacts)) / scale, k)
+
+    # mode "and" falls back to OR when fewer than min_results documents contain every term;
+    # mode "saat" uses the quantized impact index with an optional postings budget
+    def search(self, query, mode="or", k=TOP_K, min_results=MIN_RESULTS, budget=None):
+        terms = tokenize(query) if isinstance(query, str) else list(query)
+        if mode == "saat":
+            return self.query_saat(terms, k, budget)
+        if mode == "and":
+            r = self.query_and(terms, k)
+            if len(r) >= min_results:
+                return r
+            self.or_fallbacks += 1
+        return self.query_or(terms, k)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+        if self._impacts:
+            if self._impacts[3]:
+                self._impacts[3].close()
+            self._impacts[2].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
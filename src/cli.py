@@ -1,3 +1,5 @@
+import time
+from typing import List
 import typer
 from pathlib import Path
 from rich.console import Console
@@ -5,9 +7,11 @@ from rich.table import Table
 from rich.progress import Progress, SpinnerColumn, TextColumn
 
 from .config import config
-from .pipeline.expander import Expander
-from .pipeline.indexer_bridge import Bridge
-from .evaluation.evaluator import Evaluator
+from .pipeline.triage import FULL_SHARE
+from .pipeline.results_store import VARIANTS
+
+# Pipeline, model and evaluation modules are imported inside the commands that use them,
+# so --help, info and project start without loading numpy, requests or the model stack
 
 app = typer.Typer(name="hqf-de", help="HQF-DE Document Expansion")
 console = Console()
@@ -21,7 +25,22 @@ def expand(
     use_llm: bool = typer.Option(True, "--llm/--no-llm"),
     use_nli: bool = typer.Option(True, "--nli/--no-nli"),
     use_d2q: bool = typer.Option(True, "--d2q/--no-d2q"),
-    d2q_only: bool = typer.Option(False, "--d2q-only")
+    d2q_only: bool = typer.Option(False, "--d2q-only"),
+    stage_major: bool = typer.Option(False, "--stage-major"),
+    workers: int = typer.Option(1, "--workers"),
+    pipelined: bool = typer.Option(False, "--pipelined"),
+    batch_size: int = typer.Option(8, "--batch-size"),
+    work_dir: Path = typer.Option(None, "--work-dir"),
+    triage: bool = typer.Option(False, "--triage"),
+    full_share: float = typer.Option(FULL_SHARE, "--full-share"),
+    lexicon_dir: Path = typer.Option(None, "--lexicon-dir"),
+    dedup: bool = typer.Option(False, "--dedup"),
+    nli_cascade: bool = typer.Option(False, "--nli-cascade"),
+    nli_audit: float = typer.Option(0.0, "--nli-audit"),
+    store: bool = typer.Option(True, "--store/--no-store"),
+    server: bool = typer.Option(False, "--server/--no-server"),
+    metrics_dir: Path = typer.Option(None, "--metrics"),
+    trace: bool = typer.Option(False, "--trace")
 ):
     input_path = input_file or config.data_dir / config.input_tsv
     output_path = output_file or config.output_dir / config.output_tsv
@@ -33,26 +52,122 @@ def expand(
     console.print(f"[bold]HQF-DE[/bold] {input_path} -> {output_path}")
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    from .pipeline.expander import Expander
+    from .pipeline.indexer_bridge import Bridge
+    from .pipeline.parallel import expand_parallel
+    from .pipeline.triage import Triage
+    from .pipeline.dedup import Deduper
+    from .pipeline.results_store import ResultStore, default_path
+    from .telemetry import Recorder
+
     bridge = Bridge()
-    exp = Expander(use_llm=False if d2q_only else use_llm, use_nli=False if d2q_only else use_nli, use_d2q=use_d2q)
+    rec = Recorder(enabled=metrics_dir is not None, trace=trace)
     docs = list(bridge.read(limit=limit))
+    deduper = None
+    if dedup:
+        deduper = Deduper().fit(docs)
+        docs = deduper.representatives()
+    tri = None
+    if triage and not d2q_only:
+        tri = Triage(full_share)
+        if lexicon_dir:
+            tri.load_lexicon(lexicon_dir)
+        tri.fit(docs)
+        if workers > 1:
+            console.print("[yellow]--triage is ignored with --workers[/yellow]")
+    exp = Expander(use_llm=False if d2q_only else use_llm, use_nli=False if d2q_only else use_nli, use_d2q=use_d2q, recorder=rec, triage=tri,
+                   server=server, nli_cascade=nli_cascade, nli_audit=nli_audit)
 
     with Progress(SpinnerColumn(), TextColumn("{task.description}"), console=console) as progress:
         progress.add_task("Expanding...", total=None)
-        with exp:
-            results = [exp.d2q_only(doc_id, text) if d2q_only else exp.expand(doc_id, text) for doc_id, text in docs]
-
+        start = time.perf_counter()
+        if workers > 1:
+            results = expand_parallel(docs, work_dir or output_path.parent / f"{output_path.stem}_shards", workers, d2q_only=d2q_only,
+                                      use_llm=exp.llm is not None, use_nli=exp.nli is not None, use_d2q=use_d2q,
+                                      nli_cascade=nli_cascade, nli_audit=nli_audit)
+        elif stage_major and not d2q_only:
+            results = exp.expand_stagewise(docs, work_dir or output_path.parent / f"{output_path.stem}_stages")
+        elif pipelined and not d2q_only:
+            with exp:
+                results = list(exp.expand_many(docs, batch_size=batch_size))
+        else:
+            with exp:
+                results = [exp.d2q_only(doc_id, text) if d2q_only else exp.expand(doc_id, text) for doc_id, text in docs]
+        elapsed = time.perf_counter() - start
+
+    if deduper:
+        results = list(deduper.fan_out(results))
+        console.print(f"Dedup: {deduper.report(elapsed)}")
     n, path = bridge.write(iter(results), filename=output_path.name)
     console.print(f"[green]Done![/green] {n} docs -> {path}")
+    if store:
+        n, store_path = ResultStore(default_path(path)).write(results)
+        console.print(f"All fields -> {store_path}")
+    if tri and workers == 1:
+        console.print(f"Routes: {tri.report()}")
+    if hasattr(exp.nli, "report") and workers == 1:
+        console.print(f"NLI cascade: {exp.nli.report()}")
+    tokens = [r["llm_tokens"] for r in results if "llm_tokens" in r]
+    if tokens:
+        console.print(f"LLM tokens/doc: {sum(tokens) / len(tokens):.1f}")
+
+    if metrics_dir:
+        console.print(rec.report())
+        console.print(f"Metrics -> {', '.join(str(p) for p in rec.export(metrics_dir))}")
+
+
+@app.command()
+def project(
+    store_file: Path = typer.Argument(...),
+    variants: List[str] = typer.Option(list(VARIANTS), "--variant"),
+    out_dir: Path = typer.Option(None, "-o"),
+    pattern: str = typer.Option("{variant}.tsv", "--pattern")
+):
+    if not store_file.exists():
+        console.print(f"[red]Error: {store_file}[/red]")
+        raise typer.Exit(1)
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        console.print(f"[red]Unknown variants: {', '.join(sorted(unknown))}[/red]")
+        raise typer.Exit(1)
+    from .pipeline.results_store import ResultStore
+    for variant, (n, path) in ResultStore(store_file).project_all(out_dir or store_file.parent, variants, pattern).items():
+        console.print(f"{variant}: {n} docs -> {path}")
+
+
+@app.command()
+def serve(
+    use_llm: bool = typer.Option(True, "--llm/--no-llm"),
+    use_nli: bool = typer.Option(True, "--nli/--no-nli"),
+    use_d2q: bool = typer.Option(True, "--d2q/--no-d2q"),
+    nli_cascade: bool = typer.Option(False, "--nli-cascade"),
+    socket_path: Path = typer.Option(config.server_socket, "--socket"),
+    window_ms: float = typer.Option(5.0, "--window-ms"),
+    max_batch: int = typer.Option(32, "--max-batch")
+):
+    from .models import LLM, NLI, CascadeNLI, Doc2Query, Embedder
+    from .models.server import ModelServer
+
+    d = config.device
+    nli = CascadeNLI(config.nli_small_model_name, config.nli_model_name, device=d) if nli_cascade else NLI(config.nli_model_name, device=d)
+    models = {"llm": LLM(config.llm_model_name, device=d) if use_llm else None,
+              "nli": nli if use_nli else None,
+              "d2q": Doc2Query(config.d2q_model_name, device=d) if use_d2q else None,
+              "embedder": Embedder(config.embedding_model_name, device=d)}
+    try:
+        ModelServer(models, socket_path, window_ms, max_batch).serve_forever()
+    except KeyboardInterrupt:
+        console.print("Stopped")
 
 
 @app.command()
-def demo(text: str = typer.Argument(...)):
+def demo(text: str = typer.Argument(...), server: bool = typer.Option(False, "--server/--no-server")):
     console.print(f"[bold]Input:[/bold] {text[:200]}{'...' if len(text) > 200 else ''}")
+    from .pipeline.expander import Expander
 
     with Progress(SpinnerColumn(), TextColumn("{task.description}"), console=console) as progress:
         progress.add_task("Expanding...", total=None)
-        exp = Expander()
+        exp = Expander(server=server)
         exp.load()
         result = exp.expand("demo", text)
         exp.unload()
@@ -63,8 +178,11 @@ def demo(text: str = typer.Argument(...)):
 
 
 @app.command()
-def evaluate(num_queries: int = typer.Option(100, "-q"), num_docs: int = typer.Option(1000, "-d")):
+def evaluate(num_queries: int = typer.Option(100, "-q"), num_docs: int = typer.Option(1000, "-d"), jobs: int = typer.Option(None, "-j")):
     console.print(f"[bold]Evaluating[/bold] {num_docs} docs, {num_queries} queries")
+    from .pipeline.expander import Expander
+    from .pipeline.indexer_bridge import Bridge
+    from .evaluation.evaluator import Evaluator
 
     bridge = Bridge()
     docs = list(bridge.read(limit=num_docs))
@@ -74,7 +192,7 @@ def evaluate(num_queries: int = typer.Option(100, "-q"), num_docs: int = typer.O
         results = [exp.expand(doc_id, text) for doc_id, text in docs]
 
     ev = Evaluator()
-    eval_results = ev.compare(results, num_queries=num_queries)
+    eval_results = ev.compare(results, num_queries=num_queries, jobs=jobs)
     ev.save(eval_results)
     console.print(ev.report(eval_results))
 
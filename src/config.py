@@ -1,4 +1,6 @@
+import os
 from pathlib import Path
+from dataclasses import dataclass
 
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
@@ -7,6 +9,7 @@ OUTPUT_DIR = Path(__file__).parent / "output"
 LLM_MODEL = "meta-llama/Meta-Llama-3-8B-Instruct"
 DOC2QUERY_MODEL = "castorini/doc2query-t5-base-msmarco"
 NLI_MODEL = "facebook/bart-large-mnli"
+NLI_SMALL_MODEL = "cross-encoder/nli-distilroberta-base"
 EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
 LLM_MAX_TOKENS = 256
@@ -17,3 +20,24 @@ MAX_DOC_LENGTH = 512
 NLI_THRESHOLD = 0.9
 DEDUP_THRESHOLD = 0.85
 DEVICE = "cuda"
+SERVER_SOCKET = os.environ.get("HQFDE_SOCKET", "/tmp/hqf_de.sock")
+
+
+@dataclass
+class Config:
+    project_root: Path = PROJECT_ROOT
+    data_dir: Path = DATA_DIR
+    output_dir: Path = OUTPUT_DIR
+    input_tsv: str = "collection.tsv"
+    output_tsv: str = "expanded.tsv"
+    indexer_api_url: str = "http://localhost:8080"
+    llm_model_name: str = LLM_MODEL
+    d2q_model_name: str = DOC2QUERY_MODEL
+    nli_model_name: str = NLI_MODEL
+    nli_small_model_name: str = NLI_SMALL_MODEL
+    embedding_model_name: str = EMBEDDING_MODEL
+    device: str = DEVICE
+    server_socket: str = SERVER_SOCKET
+
+
+config = Config()
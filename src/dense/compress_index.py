@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import argparse
+import faiss
+from indexes import INDEX_TYPES, build_index, index_memory
+from run_hnsw import DATA_DIR, RESULTS_DIR, VARIANTS, QUERY_FILE, QRELS, load_passages, load_h5_embeddings
+
+K = 100
+BATCH_SIZE = 100
+
+def load_qrels(qrels_file):
+    qrels = {}
+    with open(qrels_file) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 4 and int(parts[3]) > 0:
+                qrels.setdefault(parts[0], set()).add(parts[2])
+    return qrels
+
+def mrr_at_10(labels, query_ids, passage_ids, qrels):
+    total, n = 0.0, 0
+    for qid, row in zip(query_ids, labels):
+        relevant = qrels.get(str(qid).strip())
+        if not relevant:
+            continue
+        n += 1
+        for rank, idx in enumerate(row[:10]):
+            if idx >= 0 and passage_ids[idx] in relevant:
+                total += 1.0 / (rank + 1)
+                break
+    return total / n if n else 0.0
+
+def search_all(index, queries):
+    labels = []
+    start = time.time()
+    for i in range(0, len(queries), BATCH_SIZE):
+        labels.extend(index.search(queries[i:i+BATCH_SIZE], K)[1])
+    return labels, len(queries) / (time.time() - start)
+
+def evaluate_variant(variant_name, emb_file, kinds, query_ids, queries, qrels):
+    passage_ids, embeddings = load_passages(os.path.join(DATA_DIR, emb_file))
+    rows = []
+    for kind in kinds:
+        start = time.time()
+        index = build_index(embeddings, kind)
+        build_time = time.time() - start
+        labels, qps = search_all(index, queries)
+        rows.append({"variant": variant_name, "index": kind, "memory_mb": index_memory(index) / 1024 / 1024,
+                     "build_s": build_time, "qps": qps, "mrr@10": mrr_at_10(labels, query_ids, passage_ids, qrels)})
+        print(f"  {kind:10s} {rows[-1]['memory_mb']:9.1f} MB {qps:9.1f} q/s MRR@10={rows[-1]['mrr@10']:.4f}")
+        del index
+    base = next((r for r in rows if r["index"] == "hnsw_flat"), rows[0])
+    for r in rows:
+        r["mrr@10_delta"] = r["mrr@10"] - base["mrr@10"]
+        r["memory_ratio"] = r["memory_mb"] / base["memory_mb"]
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--index", nargs="+", choices=INDEX_TYPES, default=INDEX_TYPES)
+    parser.add_argument("--qrels", choices=list(QRELS), default="dev")
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    faiss.omp_set_num_threads(faiss.omp_get_max_threads())
+    query_ids, queries = load_h5_embeddings(os.path.join(DATA_DIR, QUERY_FILE))
+    faiss.normalize_L2(queries)
+    qrels = load_qrels(os.path.join(DATA_DIR, QRELS[args.qrels]))
+
+    report = []
+    for variant_name in args.variants:
+        print(f"\n--- {variant_name.upper()} ---")
+        report.extend(evaluate_variant(variant_name, VARIANTS[variant_name], args.index, query_ids, queries, qrels))
+
+    print(f"\n| Variant | Index | Memory MB | x flat | QPS | MRR@10 | Delta |")
+    print("|---------|-------|-----------|--------|-----|--------|-------|")
+    for r in report:
+        print(f"| {r['variant']} | {r['index']} | {r['memory_mb']:.1f} | {r['memory_ratio']:.2f} | {r['qps']:.1f} | {r['mrr@10']:.4f} | {r['mrr@10_delta']:+.4f} |")
+
+    with open(os.path.join(RESULTS_DIR, "compression_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+import os
+import json
+import hashlib
+import argparse
+from itertools import islice
+import numpy as np
+
+DATA_DIR = "data"
+STORE_DIR = "data/embedding_store"
+VARIANT_FILES = {"original": "collection_100k.tsv", "expanded": "expanded_100k.tsv", "validated": "validated_100k.tsv", "doc2query": "doc2query_100k.tsv"}
+CHUNK_DOCS = 10000
+KEY_BYTES = 20
+
+# Whitespace only: case and punctuation change what the encoder sees, so they stay in the key
+def text_key(text):
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).digest()
+
+# Rows of the shared vector file in one variant's document order. Slicing copies only the requested
+# rows, so build_index / ExactSearch read it like the mmap'd .bin embeddings.
+class VariantView:
+    def __init__(self, vectors, rows):
+        self.vectors = vectors
+        self.rows = rows
+
+    @property
+    def shape(self):
+        return (len(self.rows), self.vectors.shape[1])
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        return self.vectors[self.rows[idx]]
+
+# Passage vectors keyed by sha1 of the normalized text, shared by every variant: vectors.f32 holds one
+# float32 row per unique text, keys.sha1 the matching digests, and views/<variant>.rows.npy maps each
+# variant's documents onto those rows. Only texts not already in the store are encoded.
+class EmbeddingStore:
+    def __init__(self, path=STORE_DIR, model=None):
+        self.path = path
+        self.meta_path = os.path.join(path, "meta.json")
+        self.vec_path = os.path.join(path, "vectors.f32")
+        self.key_path = os.path.join(path, "keys.sha1")
+        self.view_dir = os.path.join(path, "views")
+        self.meta = {}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.meta = json.load(f)
+            if model and self.meta.get("model") not in (None, model):
+                raise ValueError(f"Store {path} holds {self.meta['model']} vectors, not {model}")
+        elif model:
+            self.meta["model"] = model
+        self.keys = {}
+        self._vectors = None
+        if self.dim and os.path.exists(self.key_path):
+            self._load_keys()
+
+    @property
+    def dim(self):
+        return self.meta.get("dim")
+
+    # Rows are appended vectors first, keys second; a write cut short leaves extra bytes that are dropped here
+    def _load_keys(self):
+        with open(self.key_path, "rb") as f:
+            data = f.read()
+        n = min(len(data) // KEY_BYTES, os.path.getsize(self.vec_path) // (4 * self.dim))
+        for path, size in ((self.key_path, n * KEY_BYTES), (self.vec_path, n * 4 * self.dim)):
+            if os.path.getsize(path) != size:
+                os.truncate(path, size)
+        self.keys = {data[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(n)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def vectors(self):
+        if not len(self):
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._vectors is None or len(self._vectors) != len(self):
+            self._vectors = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(len(self), self.dim))
+        return self._vectors
+
+    def _append(self, keys, vecs):
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        if not self.dim:
+            os.makedirs(self.path, exist_ok=True)
+            self.meta["dim"] = int(vecs.shape[1])
+            with open(self.meta_path, "w") as f:
+                json.dump(self.meta, f)
+        elif vecs.shape[1] != self.dim:
+            raise ValueError(f"Encoder returned dim {vecs.shape[1]}, store has {self.dim}")
+        with open(self.vec_path, "ab") as f:
+            vecs.tofile(f)
+        with open(self.key_path, "ab") as f:
+            f.write(b"".join(keys))
+        for k in keys:
+            self.keys[k] = len(self.keys)
+
+    # Store rows for `texts`, encoding each distinct missing text once with encode(list) -> (n, dim)
+    def add(self, texts, encode):
+        keys = [text_key(t) for t in texts]
+        missing = {}
+        for k, t in zip(keys, texts):
+            if k not in self.keys and k not in missing:
+                missing[k] = t
+        if missing:
+            self._append(list(missing), encode(list(missing.values())))
+        return np.array([self.keys[k] for k in keys], dtype=np.int64), len(missing)
+
+    # Map (doc_id, text) rows onto store rows chunk by chunk and save them as the variant's view
+    def encode_variant(self, name, docs, encode, chunk=CHUNK_DOCS):
+        docs = iter(docs)
+        ids, rows, encoded = [], [], 0
+        while batch := list(islice(docs, chunk)):
+            r, n = self.add([t for _, t in batch], encode)
+            ids.extend(d for d, _ in batch)
+            rows.append(r)
+            encoded += n
+        os.makedirs(self.view_dir, exist_ok=True)
+        np.save(os.path.join(self.view_dir, f"{name}.rows.npy"), np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64))
+        with open(os.path.join(self.view_dir, f"{name}.ids.txt"), "w") as f:
+            f.writelines(f"{d}\n" for d in ids)
+        return {"variant": name, "docs": len(ids), "encoded": encoded, "reused": len(ids) - encoded}
+
+    def has_view(self, name):
+        return os.path.exists(os.path.join(self.view_dir, f"{name}.rows.npy"))
+
+    def views(self):
+        if not os.path.isdir(self.view_dir):
+            return []
+        return sorted(f[:-len(".rows.npy")] for f in os.listdir(self.view_dir) if f.endswith(".rows.npy"))
+
+    # (passage_ids, vectors) in the same shape load_passages returns
+    def view(self, name):
+        rows = np.load(os.path.join(self.view_dir, f"{name}.rows.npy"), mmap_mode="r")
+        with open(os.path.join(self.view_dir, f"{name}.ids.txt")) as f:
+            ids = np.array([line.strip() for line in f])
+        return ids, VariantView(self.vectors, rows)
+
+    def stats(self):
+        docs = sum(len(np.load(os.path.join(self.view_dir, f"{v}.rows.npy"), mmap_mode="r")) for v in self.views())
+        unique = len(self)
+        return {"unique": unique, "view_docs": docs, "vector_mb": unique * 4 * (self.dim or 0) / 1024 / 1024,
+                "per_variant_mb": docs * 4 * (self.dim or 0) / 1024 / 1024}
+
+# Store view for data/embeddings_<variant>.h5 when the variant has been encoded into the store
+def store_view(passage_file, store_dir=None):
+    name = os.path.basename(passage_file)
+    if not name.startswith("embeddings_"):
+        return None
+    variant = os.path.splitext(name)[0][len("embeddings_"):]
+    store = EmbeddingStore(store_dir or os.path.join(os.path.dirname(passage_file), "embedding_store"))
+    return store.view(variant) if store.has_view(variant) else None
+
+def main():
+    from hqf_de.config import config
+    from hqf_de.models.embeddings import Embedder
+    from hqf_de.pipeline.collection import Collection
+
+    parser = argparse.ArgumentParser(description="Encode variant collections into the shared content-hash embedding store")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANT_FILES), default=list(VARIANT_FILES))
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--model", default=config.embedding_model_name)
+    parser.add_argument("--device", default="cuda")
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.store, args.model)
+    embedder = Embedder(args.model, device=args.device)
+    for variant in args.variants:
+        with Collection(os.path.join(DATA_DIR, VARIANT_FILES[variant])) as c:
+            r = store.encode_variant(variant, c, embedder.encode)
+        print(f"{variant}: {r['docs']} docs, {r['encoded']} encoded, {r['reused']} reused")
+    s = store.stats()
+    print(f"Store: {s['unique']} unique vectors for {s['view_docs']} variant docs, "
+          f"{s['vector_mb']:.1f} MB vs {s['per_variant_mb']:.1f} MB as separate files")
+
+if __name__ == "__main__":
+    main()
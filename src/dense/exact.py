@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import os
+import time
+import argparse
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+
+QUERY_BATCH = 256
+TILE_ROWS = 16384
+THREADS = os.cpu_count() or 1
+
+# threadpoolctl is optional: with it each worker pins BLAS to one thread so tiles don't oversubscribe cores
+HAS_THREADPOOLCTL = importlib.util.find_spec("threadpoolctl") is not None
+
+
+def _blas_limit(n):
+    if HAS_THREADPOOLCTL:
+        from threadpoolctl import threadpool_limits
+        return threadpool_limits(n, user_api="blas")
+    return nullcontext()
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    np.divide(x, norms, out=x, where=norms > 0)
+    return x
+
+
+# Keep the k best columns of each row of (scores, ids); rows come back unsorted
+def _top_k(scores, ids, k):
+    if scores.shape[1] <= k:
+        return scores, ids
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, part, 1), np.take_along_axis(ids, part, 1)
+
+
+# Brute-force inner-product top-k over a (possibly mmap'd) float32 matrix. The corpus is read once per
+# search in row tiles spread over worker threads; each tile is scored against the queries in batches,
+# cut to k with argpartition and merged into the worker's running top-k, so memory stays at
+# threads * (tile + batch * tile) floats plus k candidates per query.
+# Same search(queries, k) -> (D, I) interface as the faiss indexes, scores are cosine when normalize=True.
+class ExactSearch:
+    def __init__(self, embeddings, normalize=True, tile_rows=TILE_ROWS, query_batch=QUERY_BATCH, threads=THREADS):
+        self.embeddings = embeddings
+        self.normalize = normalize
+        self.tile_rows = tile_rows
+        self.query_batch = query_batch
+        self.threads = max(1, threads)
+        self.dim = embeddings.shape[1]
+
+    @property
+    def ntotal(self):
+        return len(self.embeddings)
+
+    def _tile(self, start):
+        tile = np.array(self.embeddings[start:start + self.tile_rows], dtype=np.float32)
+        return _normalize(tile) if self.normalize else tile
+
+    def _scan(self, queries, starts, k):
+        batches = [queries[q0:q0 + self.query_batch] for q0 in range(0, len(queries), self.query_batch)]
+        best = [(np.empty((len(q), 0), dtype=np.float32), np.empty((len(q), 0), dtype=np.int64)) for q in batches]
+        with _blas_limit(1 if self.threads > 1 else None):
+            for start in starts:
+                tile = self._tile(start)
+                ids = np.arange(start, start + len(tile), dtype=np.int64)
+                for b, q in enumerate(batches):
+                    scores = q @ tile.T
+                    s, i = _top_k(scores, np.broadcast_to(ids, scores.shape), k)
+                    best[b] = _top_k(np.hstack([best[b][0], s]), np.hstack([best[b][1], i]), k)
+        return np.vstack([s for s, _ in best]), np.vstack([i for _, i in best])
+
+    def search(self, queries, k):
+        queries = np.array(queries, dtype=np.float32, ndmin=2)
+        if self.normalize:
+            queries = _normalize(queries)
+        starts = list(range(0, self.ntotal, self.tile_rows))
+        workers = min(self.threads, len(starts)) or 1
+        with ThreadPoolExecutor(workers) as pool:
+            parts = list(pool.map(lambda w: self._scan(queries, starts[w::workers], k), range(workers)))
+        s, i = _top_k(np.hstack([p[0] for p in parts]), np.hstack([p[1] for p in parts]), k)
+        order = np.argsort(-s, axis=1, kind="stable")
+        D = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        I = np.full((len(queries), k), -1, dtype=np.int64)
+        D[:, :s.shape[1]] = np.take_along_axis(s, order, 1)
+        I[:, :s.shape[1]] = np.take_along_axis(i, order, 1)
+        return D, I
+
+
+def main():
+    from run_hnsw import DATA_DIR, VARIANTS, QUERY_FILE, load_passages, load_h5_embeddings
+
+    parser = argparse.ArgumentParser(description="Exact dense top-k throughput on a variant's embeddings")
+    parser.add_argument("--variant", choices=list(VARIANTS), default="original")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=100)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, THREADS])
+    parser.add_argument("--tile-rows", type=int, default=TILE_ROWS)
+    args = parser.parse_args()
+
+    _, embeddings = load_passages(os.path.join(DATA_DIR, VARIANTS[args.variant]))
+    _, queries = load_h5_embeddings(os.path.join(DATA_DIR, QUERY_FILE))
+    queries = queries[:args.queries]
+    print(f"Passages: {len(embeddings)}, Queries: {len(queries)}, BLAS pinning: {HAS_THREADPOOLCTL}")
+    for threads in args.threads:
+        index = ExactSearch(embeddings, tile_rows=args.tile_rows, threads=threads)
+        start = time.time()
+        index.search(queries, args.k)
+        print(f"  threads={threads:3d} {len(queries) / (time.time() - start):9.1f} q/s")
+
+if __name__ == "__main__":
+    main()
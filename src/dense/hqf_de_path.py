@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+
+# The scripts in this directory run as `python src/dense/<script>.py`; when the package is not
+# installed as hqf_de, alias the checkout's src/ to it the way benchmarks/__init__ does
+try:
+    import hqf_de
+except ImportError:
+    sys.path.insert(0, str(ROOT))
+    import src as hqf_de
+    sys.modules["hqf_de"] = hqf_de
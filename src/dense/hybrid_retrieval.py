@@ -5,6 +5,10 @@ import argparse
 import subprocess
 from collections import defaultdict
 import numpy as np
+import hqf_de_path
+from hqf_de.telemetry import Recorder, NULL_RECORDER
+from hqf_de.pipeline.cache import ResultCache, file_generation
+from hqf_de.pipeline.collection import Collection
 
 try:
     from rank_bm25 import BM25Okapi
@@ -15,7 +19,9 @@ except ImportError:
 try:
     import faiss
     import h5py
-    from sentence_transformers import SentenceTransformer
+    from hqf_de.models.query_encoder import QueryEncoder
+    from indexes import build_index, load_bin_embeddings, tuned_params
+    from embedding_store import store_view
     HAS_DEPS = True
 except ImportError:
     HAS_DEPS = False
@@ -39,6 +45,8 @@ RESULTS_DIR = "results"
 QUERIES_DIR = "Dense-Retrieval-based-Search-Engine/queries"
 RRF_K = 60
 TOP_K = 1000
+# Hybrid runs have always used M=32; keep it unless a sweep recommends otherwise
+HYBRID_M = 32
 
 VARIANTS = ["original", "expanded", "validated", "doc2query"]
 VARIANT_FILES = {"original": "collection_100k.tsv", "expanded": "expanded_100k.tsv", "validated": "validated_100k.tsv", "doc2query": "doc2query_100k.tsv"}
@@ -51,12 +59,10 @@ def tokenize(text):
 
 def load_documents(variant):
     doc_ids, doc_texts = [], []
-    with open(f"{DATA_DIR}/{VARIANT_FILES[variant]}", 'r') as f:
-        for line in f:
-            parts = line.strip().split('\t')
-            if len(parts) >= 2:
-                doc_ids.append(parts[0])
-                doc_texts.append(parts[1])
+    with Collection(f"{DATA_DIR}/{VARIANT_FILES[variant]}") as c:
+        for doc_id, text in c:
+            doc_ids.append(doc_id)
+            doc_texts.append(text)
     print(f"Loaded {len(doc_ids)} documents")
     return doc_ids, doc_texts
 
@@ -65,18 +71,22 @@ def load_queries():
     for qfile in ["queries.eval.tsv", "queries.dev.tsv"]:
         filepath = f"{QUERIES_DIR}/{qfile}"
         if os.path.exists(filepath):
-            with open(filepath, 'r') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        queries.append((parts[0], parts[1]))
+            with Collection(filepath) as c:
+                queries.extend(c)
     return queries
 
 def load_embeddings(variant):
+    view = store_view(f"{DATA_DIR}/embeddings_{variant}.h5")
+    if view is not None:
+        return view[1], list(view[0])
+    bin_file, pids_file = f"{DATA_DIR}/embeddings_{variant}.bin", f"{DATA_DIR}/passage_ids_{variant}.txt"
+    if os.path.exists(bin_file) and os.path.exists(pids_file):
+        with open(pids_file) as f:
+            return load_bin_embeddings(bin_file), [line.strip() for line in f]
     with h5py.File(f"{DATA_DIR}/embeddings_{variant}.h5", 'r') as f:
         embeddings = f['embedding'][:]
         passage_ids = [pid.decode('utf-8') if isinstance(pid, bytes) else str(pid) for pid in f['id'][:]]
-    return embeddings.astype(np.float32), passage_ids
+    return embeddings.astype(np.float32, copy=False), passage_ids
 
 class BM25Retriever:
     def __init__(self, doc_ids, doc_texts):
@@ -89,28 +99,63 @@ class BM25Retriever:
         return [(self.doc_ids[i], scores[i]) for i in top_indices if scores[i] > 0]
 
 class DenseRetriever:
-    def __init__(self, embeddings, passage_ids):
+    def __init__(self, embeddings, passage_ids, kind="hnsw_flat", params=None, encoder=None):
         self.passage_ids = passage_ids
-        faiss.normalize_L2(embeddings)
-        dim = embeddings.shape[1]
-        self.index = faiss.IndexHNSWFlat(dim, 32)
-        self.index.hnsw.efConstruction = 200
-        self.index.add(embeddings)
-        self.index.hnsw.efSearch = 256
-        self.encoder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        self.index = build_index(embeddings, kind, **(params or {"M": HYBRID_M}))
+        self.encoder = encoder or QueryEncoder().load()
 
     def search(self, query, top_k=TOP_K):
-        query_emb = self.encoder.encode([query], normalize_embeddings=True)
-        scores, indices = self.index.search(query_emb.astype(np.float32), top_k)
+        query_emb = self.encoder.encode(query)[None, :]
+        scores, indices = self.index.search(query_emb, top_k)
         return [(self.passage_ids[idx], float(score)) for idx, score in zip(indices[0], scores[0]) if idx >= 0]
 
-def reciprocal_rank_fusion(bm25_results, dense_results, k=RRF_K):
+def reciprocal_rank_fusion(bm25_results, dense_results, k=RRF_K, top_k=TOP_K):
     scores = defaultdict(float)
     for rank, (doc_id, _) in enumerate(bm25_results, 1):
         scores[doc_id] += 1.0 / (k + rank)
     for rank, (doc_id, _) in enumerate(dense_results, 1):
         scores[doc_id] += 1.0 / (k + rank)
-    return sorted(scores.items(), key=lambda x: -x[1])[:TOP_K]
+    return sorted(scores.items(), key=lambda x: -x[1])[:top_k]
+
+def variant_files(variant):
+    return [f"{DATA_DIR}/{VARIANT_FILES[variant]}", f"{DATA_DIR}/embeddings_{variant}.bin",
+            f"{DATA_DIR}/passage_ids_{variant}.txt", f"{DATA_DIR}/embeddings_{variant}.h5"]
+
+class HybridSearcher:
+    def __init__(self, index_kind="hnsw_flat", rec=NULL_RECORDER, cache=None):
+        self.index_kind = index_kind
+        self.rec = rec
+        self.cache = cache or ResultCache(recorder=rec)
+        self.encoder = None
+        self.variant = None
+
+    # Loading a variant moves the cache to that variant's file generation, dropping stale results
+    def load(self, variant):
+        doc_ids, doc_texts = load_documents(variant)
+        embeddings, passage_ids = load_embeddings(variant)
+        self.bm25 = BM25Retriever(doc_ids, doc_texts)
+        self.dense = DenseRetriever(embeddings, passage_ids, self.index_kind, tuned_params(variant), encoder=self.encoder)
+        self.encoder = self.dense.encoder
+        self.variant = variant
+        self.cache.set_generation(file_generation(*variant_files(variant)))
+        return self
+
+    def search(self, query, top_k=TOP_K):
+        key = self.cache.key(query, "hybrid", top_k, self.variant)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit
+        with self.rec.stage("bm25", 1) as span:
+            bm = self.bm25.search(query, top_k)
+            span.items_out = len(bm)
+        with self.rec.stage("dense", 1) as span:
+            dn = self.dense.search(query, top_k)
+            span.items_out = len(dn)
+        with self.rec.stage("rrf", len(bm) + len(dn)) as span:
+            fused = reciprocal_rank_fusion(bm, dn, top_k=top_k)
+            span.items_out = len(fused)
+        self.cache.put(key, fused)
+        return fused
 
 def run_trec_eval(qrels_file, run_file):
     try:
@@ -134,6 +179,9 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--variant", choices=VARIANTS, default="original")
     parser.add_argument("--eval-only", action="store_true")
+    parser.add_argument("--index", default="hnsw_flat")
+    parser.add_argument("--metrics", type=str)
+    parser.add_argument("--trace", action="store_true")
     args = parser.parse_args()
 
     os.makedirs(RESULTS_DIR, exist_ok=True)
@@ -145,22 +193,30 @@ def main():
         if not HAS_BM25 or not HAS_DEPS:
             print("Missing dependencies")
             return
+        rec = Recorder(trace=args.trace) if args.metrics else NULL_RECORDER
 
-        doc_ids, doc_texts = load_documents(args.variant)
-        embeddings, passage_ids = load_embeddings(args.variant)
+        searcher = HybridSearcher(args.index, rec).load(args.variant)
         queries = load_queries()
 
-        bm25 = BM25Retriever(doc_ids, doc_texts)
-        dense = DenseRetriever(embeddings, passage_ids)
+        # Encode every query once up front in full batches; the search loop then hits the cache
+        with rec.stage("encode", len(queries)):
+            searcher.encoder.encode_many([q for _, q in queries])
 
         all_results = {}
         for i, (qid, query_text) in enumerate(queries):
-            fused = reciprocal_rank_fusion(bm25.search(query_text), dense.search(query_text))
-            all_results[qid] = fused
+            all_results[qid] = searcher.search(query_text)
             if (i + 1) % 1000 == 0:
                 print(f"  {i + 1}/{len(queries)} queries")
 
         write_run_file(all_results, run_file, f"hybrid_{args.variant}")
+        stats = searcher.encoder.stats()
+        print(f"Query encoder: {stats['encoded']} encoded in {stats['batches']} batches, cache hit rate {stats['hit_rate']:.1%}")
+        rec.count("query_cache_hits", stats["hits"])
+        rec.count("query_cache_misses", stats["misses"])
+        print(f"Result cache: hit rate {searcher.cache.stats()['hit_rate']:.1%}")
+        if args.metrics:
+            print(rec.report())
+            rec.export(args.metrics)
 
     print(f"\n{'='*70}\nEVALUATION\n{'='*70}")
     for qrels_name, qrels_file in QRELS.items():
@@ -0,0 +1,119 @@
+import os
+import json
+import struct
+import numpy as np
+import faiss
+from exact import ExactSearch
+
+HNSW_M = 16
+EF_CONSTRUCTION = 200
+EF_SEARCH = 256
+NPROBE = 32
+REFINE_FACTOR = 4
+ADD_CHUNK = 100000
+TUNED_FILE = "results/hnsw_recommended.json"
+
+INDEX_TYPES = ["hnsw_flat", "hnsw_fp16", "hnsw_sq8", "ivfpq", "exact"]
+
+
+# embeddings_<variant>.bin as written by prepare_hybrid_data: int32 count, then float32 rows
+def load_bin_embeddings(path):
+    with open(path, 'rb') as f:
+        n = struct.unpack('i', f.read(4))[0]
+    dim = (os.path.getsize(path) - 4) // 4 // n
+    return np.memmap(path, dtype=np.float32, mode='r', offset=4, shape=(n, dim))
+
+
+# Per-variant HNSW parameters picked by sweep_hnsw.py, if it has been run
+def tuned_params(variant, path=TUNED_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        params = json.load(f).get(variant, {})
+    return {k: params[k] for k in ("M", "ef_construction", "ef_search") if k in params}
+
+
+def _normalized(chunk):
+    chunk = np.array(chunk, dtype=np.float32)
+    faiss.normalize_L2(chunk)
+    return chunk
+
+
+def _train_sample(embeddings, n):
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(embeddings), min(n, len(embeddings)), replace=False))
+    return _normalized(embeddings[rows])
+
+
+# IVF-PQ candidates re-scored exactly against the original (possibly mmap'd) vectors
+class RefinedIndex:
+    def __init__(self, index, originals, factor=REFINE_FACTOR):
+        self.index = index
+        self.originals = originals
+        self.factor = factor
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    def search(self, queries, k):
+        _, cand = self.index.search(queries, k * self.factor)
+        D = np.full((len(queries), k), np.inf, dtype=np.float32)
+        I = np.full((len(queries), k), -1, dtype=np.int64)
+        for qi, rows in enumerate(cand):
+            rows = rows[rows >= 0]
+            if not len(rows):
+                continue
+            order = np.argsort(rows)
+            vecs = _normalized(self.originals[rows[order]])
+            dist = ((vecs - queries[qi]) ** 2).sum(axis=1)
+            top = np.argsort(dist)[:k]
+            D[qi, :len(top)] = dist[top]
+            I[qi, :len(top)] = rows[order][top]
+        return D, I
+
+
+def build_index(embeddings, kind="hnsw_flat", M=HNSW_M, ef_construction=EF_CONSTRUCTION, ef_search=EF_SEARCH,
+                nlist=None, pq_m=None, nprobe=NPROBE, refine=REFINE_FACTOR):
+    n, dim = embeddings.shape
+    if kind == "exact":
+        return ExactSearch(embeddings)
+    if kind == "hnsw_flat":
+        index = faiss.IndexHNSWFlat(dim, M)
+    elif kind == "hnsw_fp16":
+        index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, M)
+    elif kind == "hnsw_sq8":
+        index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, M)
+    elif kind == "ivfpq":
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        pq_m = pq_m or next(m for m in (dim // 8, dim // 4, dim // 2, dim) if dim % m == 0)
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, 8)
+    else:
+        raise ValueError(f"Unknown index type: {kind}")
+
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = ef_construction
+    if not index.is_trained:
+        index.train(_train_sample(embeddings, max(256 * (nlist or 0), 100000)))
+
+    for start in range(0, n, ADD_CHUNK):
+        index.add(_normalized(embeddings[start:start + ADD_CHUNK]))
+
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    if kind == "ivfpq":
+        index.nprobe = nprobe
+        if refine:
+            return RefinedIndex(index, embeddings, refine)
+    return index
+
+
+# Refinement vectors only count as resident when they are not mmap'd
+def index_memory(index):
+    if isinstance(index, ExactSearch):
+        return 0 if isinstance(index.embeddings, np.memmap) else index.embeddings.nbytes
+    base = index.index if isinstance(index, RefinedIndex) else index
+    size = len(faiss.serialize_index(base))
+    if isinstance(index, RefinedIndex) and not isinstance(index.originals, np.memmap):
+        size += index.originals.nbytes
+    return size
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+import argparse
 import struct
 import numpy as np
 import h5py
@@ -7,6 +8,7 @@ from sentence_transformers import SentenceTransformer
 
 DATA_DIR = "data"
 VARIANTS = ["original", "expanded", "validated", "doc2query"]
+QUERY_FILES = ["Dense-Retrieval-based-Search-Engine/queries/queries.eval.tsv", "Dense-Retrieval-based-Search-Engine/queries/queries.dev.tsv"]
 
 def convert_embeddings_to_binary(variant):
     h5_file = f"{DATA_DIR}/embeddings_{variant}.h5"
@@ -36,18 +38,23 @@ def convert_embeddings_to_binary(variant):
     print(f"  -> {bin_file} ({os.path.getsize(bin_file) / 1024 / 1024:.1f} MB)")
     return True
 
-def generate_query_embeddings():
+# hybrid_query falls back to BM25-only for any query id missing here, so every query file
+# that will be run through it must be listed
+def generate_query_embeddings(query_files=QUERY_FILES):
     print("\nGenerating query embeddings...")
     model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
 
-    queries = []
-    for qf in ["Dense-Retrieval-based-Search-Engine/queries/queries.eval.tsv", "Dense-Retrieval-based-Search-Engine/queries/queries.dev.tsv"]:
-        if os.path.exists(qf):
-            with open(qf, 'r') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        queries.append((parts[0], parts[1]))
+    queries, seen = [], set()
+    for qf in query_files:
+        if not os.path.exists(qf):
+            print(f"  {qf} not found, skipping")
+            continue
+        with open(qf, 'r') as f:
+            for line in f:
+                parts = line.strip().split('\t')
+                if len(parts) >= 2 and parts[0] not in seen:
+                    seen.add(parts[0])
+                    queries.append((parts[0], parts[1]))
 
     print(f"  {len(queries)} queries")
     query_ids = [q[0] for q in queries]
@@ -67,13 +74,17 @@ def generate_query_embeddings():
     print(f"  -> {bin_file} ({os.path.getsize(bin_file) / 1024 / 1024:.1f} MB)")
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", nargs="+", default=[], help="extra query TSVs to embed")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("Preparing data for hybrid query processor")
     print("=" * 60)
 
     for variant in VARIANTS:
         convert_embeddings_to_binary(variant)
-    generate_query_embeddings()
+    generate_query_embeddings(QUERY_FILES + args.queries)
 
     print("\n" + "=" * 60)
     print("Done!")
@@ -4,7 +4,10 @@ import numpy as np
 import faiss
 from tqdm import tqdm
 import subprocess
+import argparse
 import os
+from indexes import INDEX_TYPES, build_index, load_bin_embeddings, tuned_params
+from embedding_store import store_view
 
 DATA_DIR = "data"
 RESULTS_DIR = "results"
@@ -22,25 +25,31 @@ def load_h5_embeddings(file_path):
     with h5py.File(file_path, 'r') as f:
         ids = np.array(f['id']).astype(str)
         ids = np.array([x.decode() if isinstance(x, bytes) else x.replace("b'", "").replace("'", "") for x in ids])
-        embeddings = np.array(f['embedding']).astype(np.float32)
+        embeddings = f['embedding'][:].astype(np.float32, copy=False)
     return ids, embeddings
 
-def run_hnsw_retrieval(passage_file, query_file, output_file, variant_name):
-    print(f"\n{'='*60}\nRunning HNSW: {variant_name}\n{'='*60}")
+def load_passages(passage_file):
+    view = store_view(passage_file)
+    if view is not None:
+        return view
+    bin_file = passage_file.replace(".h5", ".bin")
+    pids_file = bin_file.replace("embeddings_", "passage_ids_").replace(".bin", ".txt")
+    if os.path.exists(bin_file) and os.path.exists(pids_file):
+        with open(pids_file) as f:
+            return np.array([line.strip() for line in f]), load_bin_embeddings(bin_file)
+    return load_h5_embeddings(passage_file)
 
-    passage_ids, passage_embeddings = load_h5_embeddings(passage_file)
+def run_hnsw_retrieval(passage_file, query_file, output_file, variant_name, kind="hnsw_flat"):
+    print(f"\n{'='*60}\nRunning HNSW: {variant_name} ({kind})\n{'='*60}")
+
+    passage_ids, passage_embeddings = load_passages(passage_file)
     query_ids, query_embeddings = load_h5_embeddings(query_file)
     print(f"Passages: {len(passage_ids)}, Queries: {len(query_ids)}")
 
-    faiss.normalize_L2(passage_embeddings)
     faiss.normalize_L2(query_embeddings)
 
-    dim = passage_embeddings.shape[1]
-    index = faiss.IndexHNSWFlat(dim, 16)
-    index.hnsw.efConstruction = 200
-    index.hnsw.efSearch = 256
     faiss.omp_set_num_threads(faiss.omp_get_max_threads())
-    index.add(passage_embeddings)
+    index = build_index(passage_embeddings, kind, **tuned_params(variant_name))
 
     K, batch_size = 100, 100
     with open(output_file, "w") as f:
@@ -50,6 +59,8 @@ def run_hnsw_retrieval(passage_file, query_file, output_file, variant_name):
             for qi, qid in enumerate(query_ids[start:start+batch_size]):
                 qid = str(qid).strip().replace("b'", "").replace("'", "")
                 for rank, (pid_idx, score) in enumerate(zip(labels[qi], distances[qi])):
+                    if pid_idx < 0:
+                        break
                     f.write(f"{qid} Q0 {passage_ids[pid_idx]} {rank+1} {score:.6f} hnsw_{variant_name}\n")
     print(f"Saved: {output_file}")
     return output_file
@@ -63,14 +74,19 @@ def run_trec_eval(qrels_file, run_file):
         return "trec_eval not found"
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", choices=INDEX_TYPES, default="hnsw_flat")
+    args = parser.parse_args()
+
     os.makedirs(RESULTS_DIR, exist_ok=True)
     query_file = os.path.join(DATA_DIR, QUERY_FILE)
     all_results = {}
 
     for variant_name, emb_file in VARIANTS.items():
         passage_file = os.path.join(DATA_DIR, emb_file)
-        output_file = os.path.join(RESULTS_DIR, f"run_hnsw_{variant_name}.txt")
-        run_hnsw_retrieval(passage_file, query_file, output_file, variant_name)
+        suffix = "" if args.index == "hnsw_flat" else f"_{args.index}"
+        output_file = os.path.join(RESULTS_DIR, f"run_hnsw_{variant_name}{suffix}.txt")
+        run_hnsw_retrieval(passage_file, query_file, output_file, variant_name, args.index)
         all_results[variant_name] = output_file
 
     print(f"\n{'='*60}\nEVALUATION RESULTS\n{'='*60}")
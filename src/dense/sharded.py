@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+import os
+import zlib
+import shutil
+import heapq
+import struct
+import argparse
+import subprocess
+from pathlib import Path
+import multiprocessing as mp
+import numpy as np
+import faiss
+import hqf_de_path
+from hqf_de.bm25 import BM25Index, global_stats, save_stats, load_stats
+from hqf_de.pipeline.collection import Collection
+from exact import ExactSearch
+from indexes import INDEX_TYPES, build_index, load_bin_embeddings
+
+BIN_DIR = Path(__file__).resolve().parent.parent / "bm25"
+STATS_FILE = "global_stats.txt"
+RRF_K = 60
+TOP_K = 1000
+MIN_RESULTS = 10
+CHUNK = 100000
+
+def shard_of(doc_id, n):
+    return zlib.crc32(str(doc_id).encode()) % n
+
+def shard_dirs(out_dir):
+    return sorted((p for p in Path(out_dir).glob("shard_*") if p.is_dir()), key=lambda p: int(p.name.split("_")[1]))
+
+def _split_collection(tsv, dirs):
+    files = [open(d / "collection.tsv", "w", encoding="utf-8", newline="") for d in dirs]
+    try:
+        with Collection(tsv) as c:
+            for doc_id, text in c:
+                files[shard_of(doc_id, len(dirs))].write(f"{doc_id}\t{text}\n")
+    finally:
+        for f in files:
+            f.close()
+
+# Same layout as prepare_hybrid_data (int32 count, float32 rows) so load_bin_embeddings maps each slice
+def _split_embeddings(embeddings, passage_ids, dirs):
+    passage_ids = np.asarray(passage_ids)
+    owner = np.array([shard_of(pid, len(dirs)) for pid in passage_ids])
+    files = [open(d / "embeddings.bin", "wb") for d in dirs]
+    try:
+        for s, (d, f) in enumerate(zip(dirs, files)):
+            f.write(struct.pack('i', int((owner == s).sum())))
+            with open(d / "passage_ids.txt", "w") as ids:
+                ids.writelines(f"{pid}\n" for pid in passage_ids[owner == s])
+        for start in range(0, len(embeddings), CHUNK):
+            chunk = np.asarray(embeddings[start:start + CHUNK], dtype=np.float32)
+            for s, f in enumerate(files):
+                chunk[owner[start:start + CHUNK] == s].tofile(f)
+    finally:
+        for f in files:
+            f.close()
+
+def _indexer_runs(shard_dir):
+    with open(shard_dir / "index" / "indexer_meta.txt") as f:
+        meta = dict(line.split("\t", 1) for line in f if "\t" in line)
+    return int(meta["total_runs"])
+
+# One indexer, then one merger, per shard directory, all shards at once
+def _index_shards(dirs, bin_dir, merger_args):
+    procs = [subprocess.Popen([str(bin_dir / "indexer"), "collection.tsv"], cwd=d, stdout=subprocess.DEVNULL) for d in dirs]
+    for d, p in zip(dirs, procs):
+        if p.wait():
+            raise RuntimeError(f"indexer failed in {d}")
+    procs = [subprocess.Popen([str(bin_dir / "merger"), str(_indexer_runs(d))] + merger_args,
+                              cwd=d, stdout=subprocess.DEVNULL) for d in dirs]
+    for d, p in zip(dirs, procs):
+        if p.wait():
+            raise RuntimeError(f"merger failed in {d}")
+
+# Document-partitioned build: doc d goes to shard crc32(d) % n with its BM25 index and embedding row,
+# then N, avgdl and df are summed over the shards into global_stats.txt for every shard to score with
+def build(tsv, out_dir, n, passage_file=None, bin_dir=BIN_DIR, merger_args=()):
+    from run_hnsw import load_passages
+    out_dir = Path(out_dir)
+    # A previous build's runs, embeddings or extra shards would otherwise leak into this one
+    for d in shard_dirs(out_dir):
+        shutil.rmtree(d)
+    dirs = [out_dir / f"shard_{i}" for i in range(n)]
+    for d in dirs:
+        (d / "partial").mkdir(parents=True, exist_ok=True)
+        (d / "index").mkdir(exist_ok=True)
+    _split_collection(tsv, dirs)
+    _index_shards(dirs, Path(bin_dir), list(merger_args))
+    stats = global_stats([d / "index" for d in dirs])
+    save_stats(stats, out_dir / STATS_FILE)
+    if passage_file:
+        passage_ids, embeddings = load_passages(passage_file)
+        _split_embeddings(embeddings, passage_ids, dirs)
+    print(f"Built {n} shards in {out_dir}: {stats['docs']} docs, {len(stats['df'])} terms, avgdl {stats['avg_len']:.1f}")
+    return dirs
+
+def _open_shard(shard_dir, stats, kind, threads):
+    bm25 = BM25Index(shard_dir / "index", stats=stats)
+    dense, passage_ids = None, []
+    if (shard_dir / "embeddings.bin").exists():
+        with open(shard_dir / "passage_ids.txt") as f:
+            passage_ids = [line.strip() for line in f]
+        if passage_ids:
+            embeddings = load_bin_embeddings(str(shard_dir / "embeddings.bin"))
+            faiss.omp_set_num_threads(threads)
+            dense = ExactSearch(embeddings, threads=threads) if kind == "exact" else build_index(embeddings, kind)
+    return bm25, dense, passage_ids
+
+# The faiss kinds return squared L2 between unit vectors, smaller is better; 1 - d/2 turns that into
+# the cosine ExactSearch returns, so every kind merges across shards largest-first
+def _dense_search(dense, passage_ids, queries, k):
+    if dense is None:
+        return [[] for _ in queries]
+    scores, labels = dense.search(queries, k)
+    if not isinstance(dense, ExactSearch):
+        scores = 1 - scores / 2
+    return [[(passage_ids[i], float(s)) for i, s in zip(row_i, row_s) if i >= 0] for row_i, row_s in zip(labels, scores)]
+
+# Shard process: loads its slice once, then answers batched ("bm25" | "dense", queries, k, mode)
+# requests on its end of the pipe until it receives None
+def _shard_worker(conn, shard_dir, stats_path, kind, threads):
+    try:
+        bm25, dense, passage_ids = _open_shard(Path(shard_dir), load_stats(stats_path), kind, threads)
+        conn.send(("ok", len(bm25.doc_ids)))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    while (req := conn.recv()) is not None:
+        op, queries, k, mode = req
+        try:
+            if op == "bm25":
+                # min_results=0: the AND -> OR fallback is decided by the broker on the merged count
+                result = [bm25.search(q, mode, k, min_results=0) for q in queries]
+            else:
+                result = _dense_search(dense, passage_ids, queries, k)
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    bm25.close()
+
+def merge_top_k(shard_results, k):
+    return heapq.nlargest(k, (hit for hits in shard_results for hit in hits), key=lambda h: h[1])
+
+def reciprocal_rank_fusion(bm25_results, dense_results, k=RRF_K, top_k=TOP_K):
+    scores = {}
+    for results in (bm25_results, dense_results):
+        for rank, (doc_id, _) in enumerate(results, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda x: -x[1])[:top_k]
+
+# Scatter-gather over one process per shard on this machine: each batch of queries is sent to every
+# shard before any reply is read, so shards search in parallel; per-shard top-k lists are merged by
+# score (comparable because all shards share the global BM25 statistics) and then fused with RRF
+class ShardBroker:
+    def __init__(self, shards_dir, kind="exact", threads=None):
+        shards_dir = Path(shards_dir)
+        dirs = shard_dirs(shards_dir)
+        if not dirs:
+            raise FileNotFoundError(f"No shard_* directories in {shards_dir}")
+        threads = threads or max(1, (os.cpu_count() or 1) // len(dirs))
+        self.conns, self.procs = [], []
+        for d in dirs:
+            parent, child = mp.Pipe()
+            p = mp.Process(target=_shard_worker, args=(child, str(d), str(shards_dir / STATS_FILE), kind, threads), daemon=True)
+            p.start()
+            self.conns.append(parent)
+            self.procs.append(p)
+        try:
+            self.docs = sum(self._gather())
+        except Exception:
+            self.close()
+            raise
+        self.or_fallbacks = 0
+
+    # Every shard's reply is read before raising, so no pipe is left holding a stale reply
+    def _gather(self):
+        out, errors = [], []
+        for i, conn in enumerate(self.conns):
+            status, result = conn.recv()
+            if status == "error":
+                errors.append(f"shard {i}: {result}")
+            out.append(result)
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        return out
+
+    def _scatter(self, op, queries, k, mode=None):
+        for conn in self.conns:
+            conn.send((op, queries, k, mode))
+        return [merge_top_k(per_query, k) for per_query in zip(*self._gather())]
+
+    def bm25(self, queries, k=TOP_K, mode="or", min_results=MIN_RESULTS):
+        results = self._scatter("bm25", list(queries), k, mode)
+        if mode == "and":
+            retry = [i for i, r in enumerate(results) if len(r) < min_results]
+            if retry:
+                self.or_fallbacks += len(retry)
+                for i, r in zip(retry, self._scatter("bm25", [queries[i] for i in retry], k, "or")):
+                    results[i] = r
+        return results
+
+    def dense(self, query_vectors, k=TOP_K):
+        return self._scatter("dense", np.asarray(query_vectors, dtype=np.float32), k)
+
+    def search(self, queries, query_vectors=None, k=TOP_K, mode="or"):
+        bm = self.bm25(queries, k, mode)
+        if query_vectors is None:
+            return bm
+        return [reciprocal_rank_fusion(b, d, top_k=k) for b, d in zip(bm, self.dense(query_vectors, k))]
+
+    def close(self):
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for p in self.procs:
+            p.join(timeout=5)
+        self.conns, self.procs = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def write_run_file(results, query_ids, output_file, run_name):
+    with open(output_file, "w") as f:
+        for qid, docs in zip(query_ids, results):
+            for rank, (doc_id, score) in enumerate(docs, 1):
+                f.write(f"{qid} Q0 {doc_id} {rank} {score:.6f} {run_name}\n")
+
+def main():
+    from run_hnsw import load_h5_embeddings
+
+    parser = argparse.ArgumentParser(description="Document-partitioned BM25 + dense shards with a local scatter-gather broker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("collection")
+    b.add_argument("--out", default="shards")
+    b.add_argument("--shards", type=int, default=4)
+    b.add_argument("--embeddings", help="passage embeddings (.h5, or .bin with passage_ids_*.txt)")
+    b.add_argument("--bin-dir", default=str(BIN_DIR), help="directory holding the compiled indexer and merger")
+    b.add_argument("--codec", choices=["vbyte", "pfor"], default="vbyte")
+    s = sub.add_parser("search")
+    s.add_argument("queries", help="queries TSV (id \\t text)")
+    s.add_argument("--shards-dir", default="shards")
+    s.add_argument("--query-embeddings", help="query embeddings H5 aligned by id; enables dense + RRF")
+    s.add_argument("--index", choices=INDEX_TYPES, default="exact")
+    s.add_argument("--mode", choices=["or", "and"], default="or")
+    s.add_argument("--k", type=int, default=TOP_K)
+    s.add_argument("--batch", type=int, default=100)
+    s.add_argument("--output", default="run_sharded.txt")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.collection, args.out, args.shards, args.embeddings, args.bin_dir, ["--codec", args.codec])
+        return
+
+    with Collection(args.queries) as c:
+        queries = list(c)
+    vectors = None
+    if args.query_embeddings:
+        ids, embeddings = load_h5_embeddings(args.query_embeddings)
+        row = {str(qid).strip(): i for i, qid in enumerate(ids)}
+        queries = [(qid, text) for qid, text in queries if qid in row]
+        vectors = embeddings[[row[qid] for qid, _ in queries]]
+        faiss.normalize_L2(vectors)
+    with ShardBroker(args.shards_dir, args.index) as broker:
+        print(f"{len(broker.conns)} shards, {broker.docs} docs, {len(queries)} queries")
+        results = []
+        for start in range(0, len(queries), args.batch):
+            batch = [text for _, text in queries[start:start + args.batch]]
+            vecs = vectors[start:start + args.batch] if vectors is not None else None
+            results.extend(broker.search(batch, vecs, args.k, args.mode))
+        if args.mode == "and":
+            print(f"AND -> OR fallbacks: {broker.or_fallbacks}")
+    write_run_file(results, [qid for qid, _ in queries], args.output, "sharded_hybrid" if vectors is not None else "sharded_bm25")
+    print(f"Saved: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+from exact import ExactSearch
+from indexes import TUNED_FILE, build_index
+from run_hnsw import DATA_DIR, RESULTS_DIR, VARIANTS, QUERY_FILE, load_passages, load_h5_embeddings
+
+M_GRID = [8, 16, 32, 48]
+EF_CONSTRUCTION_GRID = [100, 200, 400]
+EF_SEARCH_GRID = [16, 32, 64, 128, 256, 512]
+K_GRID = [10, 100]
+NUM_QUERIES = 2000
+LATENCY_QUERIES = 200
+TARGET_RECALL = 0.95
+
+def ground_truth(embeddings, queries, k):
+    return ExactSearch(embeddings).search(queries, k)[1]
+
+def recall_at_k(labels, truth, k):
+    return float(np.mean([len(set(l[:k]) & set(t[:k])) / k for l, t in zip(labels, truth)]))
+
+def measure(index, queries, k):
+    start = time.time()
+    _, labels = index.search(queries, k)
+    qps = len(queries) / (time.time() - start)
+    latencies = []
+    for q in queries[:LATENCY_QUERIES]:
+        start = time.perf_counter()
+        index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return labels, qps, float(np.percentile(latencies, 99))
+
+def pareto(rows):
+    front = []
+    for r in sorted(rows, key=lambda r: (-r["recall"], -r["qps"])):
+        if not front or r["qps"] > front[-1]["qps"]:
+            front.append(r)
+    return front
+
+def sweep_variant(variant_name, emb_file, queries, target):
+    _, embeddings = load_passages(os.path.join(DATA_DIR, emb_file))
+    truth = ground_truth(embeddings, queries, max(K_GRID))
+    rows = []
+    for M in M_GRID:
+        for efc in EF_CONSTRUCTION_GRID:
+            start = time.time()
+            index = build_index(embeddings, "hnsw_flat", M=M, ef_construction=efc)
+            build_time = time.time() - start
+            for efs in EF_SEARCH_GRID:
+                index.hnsw.efSearch = efs
+                for k in K_GRID:
+                    if efs < k:
+                        continue
+                    labels, qps, p99 = measure(index, queries, k)
+                    rows.append({"M": M, "ef_construction": efc, "ef_search": efs, "k": k, "recall": recall_at_k(labels, truth, k),
+                                 "qps": qps, "p99_ms": p99, "build_s": build_time})
+            print(f"  M={M} efC={efc} built in {build_time:.1f}s")
+            del index
+
+    fronts = {k: pareto([r for r in rows if r["k"] == k]) for k in K_GRID}
+    ok = [r for r in fronts[min(K_GRID)] if r["recall"] >= target]
+    best = max(ok, key=lambda r: r["qps"]) if ok else max(fronts[min(K_GRID)], key=lambda r: r["recall"])
+    return rows, fronts, best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument("--queries", type=int, default=NUM_QUERIES)
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL)
+    args = parser.parse_args()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    faiss.omp_set_num_threads(faiss.omp_get_max_threads())
+    _, queries = load_h5_embeddings(os.path.join(DATA_DIR, QUERY_FILE))
+    queries = np.ascontiguousarray(queries[:args.queries])
+    faiss.normalize_L2(queries)
+
+    recommended = {}
+    for variant_name in args.variants:
+        print(f"\n{'='*60}\nSweeping HNSW: {variant_name}\n{'='*60}")
+        rows, fronts, best = sweep_variant(variant_name, VARIANTS[variant_name], queries, args.target_recall)
+        for k, front in fronts.items():
+            print(f"\nPareto front, recall@{k}:")
+            print("| M | efC | efSearch | Recall | QPS | p99 ms |")
+            print("|---|-----|----------|--------|-----|--------|")
+            for r in front:
+                print(f"| {r['M']} | {r['ef_construction']} | {r['ef_search']} | {r['recall']:.4f} | {r['qps']:.0f} | {r['p99_ms']:.2f} |")
+        print(f"\nRecommended: M={best['M']} efC={best['ef_construction']} efSearch={best['ef_search']} "
+              f"(recall@{best['k']}={best['recall']:.4f}, {best['qps']:.0f} q/s)")
+        recommended[variant_name] = best
+        with open(os.path.join(RESULTS_DIR, f"hnsw_sweep_{variant_name}.json"), "w") as f:
+            json.dump({"grid": rows, "pareto": {str(k): v for k, v in fronts.items()}, "recommended": best}, f, indent=2)
+
+    if os.path.exists(TUNED_FILE):
+        with open(TUNED_FILE) as f:
+            recommended = {**json.load(f), **recommended}
+    with open(TUNED_FILE, "w") as f:
+        json.dump(recommended, f, indent=2)
+    print(f"\nSaved: {TUNED_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,17 @@
-from .metrics import Metrics
-from .evaluator import Evaluator
+import importlib
+
+# Submodules are imported on first attribute access so importing the package stays cheap
+_LAZY = {
+    "Metrics": ".metrics",
+    "Evaluator": ".evaluator",
+}
 
 __all__ = ["Metrics", "Evaluator"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,35 @@
 from pathlib import Path
 from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 import json
+import os
+import shutil
 import subprocess
 import time
 
 from .metrics import Metrics, MetricResult
 from ..pipeline.indexer_bridge import Bridge
+from ..pipeline.collection import Collection
 from ..config import config
 
+# Rough peak RSS of one indexer run (10M buffered postings) used to bound concurrent builds
+INDEX_MB = 1500
+SUBSET_FILE = "msmarco_passages_subset.tsv"
+
+
+# Run count of the last indexer pass; partial/ may still hold run_*.bin files from an earlier, larger build
+def _indexer_runs(work_dir):
+    with open(Path(work_dir) / "index" / "indexer_meta.txt") as f:
+        meta = dict(line.split("\t", 1) for line in f if "\t" in line)
+    return int(meta["total_runs"])
+
+
+def _memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2 ** 20
+    except (ValueError, OSError, AttributeError):
+        return INDEX_MB * 4
+
 
 @dataclass
 class EvalResult:
@@ -33,13 +55,11 @@ class Evaluator:
         if not path.exists():
             return {}
         queries = {}
-        with open(path, encoding="utf-8") as f:
-            for line in f:
-                parts = line.strip().split("\t")
-                if len(parts) >= 2:
-                    queries[parts[0]] = parts[1]
-                    if limit and len(queries) >= limit:
-                        break
+        with Collection(path) as c:
+            for qid, text in c:
+                queries[qid] = text
+                if limit and len(queries) >= limit:
+                    break
         return queries
 
     def load_qrels(self, path=None, qids=None):
@@ -57,16 +77,54 @@ class Evaluator:
                     qrels.setdefault(qid, {})[pid] = rel
         return qrels
 
-    def index(self, tsv):
-        binary = self.indexer_path / "indexer"
-        if not binary.exists():
-            return False, 0.0
+    def _run(self, name, args, cwd):
         start = time.time()
         try:
-            result = subprocess.run([str(binary), str(tsv)], cwd=str(self.indexer_path), capture_output=True, text=True, timeout=3600)
+            result = subprocess.run([str(self.indexer_path / name)] + [str(a) for a in args], cwd=str(cwd), capture_output=True, text=True, timeout=3600)
+            if result.returncode != 0:
+                print(f"{name} failed in {cwd}: {result.stderr.strip()[-500:]}")
             return result.returncode == 0, time.time() - start
-        except:
-            return False, 0.0
+        except Exception as e:
+            print(f"{name} failed in {cwd}: {e}")
+            return False, time.time() - start
+
+    # indexer writes partial runs and merger turns them into index/, both relative to work_dir
+    def index(self, tsv, work_dir=None):
+        work_dir = Path(work_dir or self.indexer_path)
+        stats = {"index_time": 0.0, "merge_time": 0.0}
+        if not (self.indexer_path / "indexer").exists() or not (self.indexer_path / "merger").exists():
+            return False, stats
+        work_dir.mkdir(parents=True, exist_ok=True)
+        subset = self.indexer_path / SUBSET_FILE
+        if subset.exists() and not (work_dir / SUBSET_FILE).exists():
+            shutil.copy(subset, work_dir / SUBSET_FILE)
+        ok, stats["index_time"] = self._run("indexer", [Path(tsv).resolve()], work_dir)
+        if not ok:
+            return False, stats
+        ok, stats["merge_time"] = self._run("merger", [_indexer_runs(work_dir)], work_dir)
+        return ok, stats
+
+    def search_batch(self, queries, work_dir):
+        qfile = Path(work_dir) / "queries.tsv"
+        with open(qfile, "w", encoding="utf-8") as f:
+            for qid, text in queries.items():
+                f.write(f"{qid}\t{text}\n")
+        ok, t = self._run("query", [qfile.name], work_dir)
+        runs = {}
+        if ok:
+            with open(Path(work_dir) / f"{qfile.stem}_results.txt") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 5:
+                        runs.setdefault(parts[0], []).append((int(parts[3]), parts[2]))
+        return ok, t, {qid: [pid for _, pid in sorted(r)] for qid, r in runs.items()}
+
+    def evaluate_run(self, runs, qrels, name="unknown", ks=[10, 100, 1000]):
+        all_results = []
+        for qid, judged in qrels.items():
+            retrieved = runs.get(qid, [])[:max(ks)]
+            all_results.append(Metrics.all(retrieved, [float(judged.get(p, 0)) for p in retrieved], set(judged), ks))
+        return EvalResult(method=name, metrics=Metrics.aggregate(all_results), per_query=all_results)
 
     def evaluate(self, queries, qrels, name="unknown", ks=[10, 100, 1000]):
         all_results, latencies = [], []
@@ -82,25 +140,48 @@ class Evaluator:
             all_results.append(Metrics.all(retrieved, relevances, relevant, ks))
         return EvalResult(method=name, metrics=Metrics.aggregate(all_results), per_query=all_results, latencies=latencies, avg_latency=sum(latencies) / len(latencies) if latencies else 0.0)
 
-    def compare(self, results, num_queries=100):
+    def _variant(self, method, tsv, queries, qrels, work_dir):
+        start = time.time()
+        ok, stats = self.index(tsv, work_dir)
+        if not ok:
+            print(f"{method}: index build failed")
+            return None
+        ok, stats["query_time"], runs = self.search_batch(queries, work_dir)
+        if not ok:
+            print(f"{method}: query failed")
+            return None
+        t = time.time()
+        ev = self.evaluate_run(runs, qrels, name=method)
+        stats["eval_time"] = time.time() - t
+        stats["total_time"] = time.time() - start
+        ev.avg_latency = stats["query_time"] * 1000 / len(queries)
+        ev.stats.update(stats)
+        return ev
+
+    # Each variant gets its own work dir with its own index and query backend, so builds,
+    # searches and scoring for all variants overlap, bounded by CPU count and memory
+    def compare(self, results, num_queries=100, variants=None, jobs=None, mem_mb=None):
         queries = self.load_queries(limit=num_queries)
         qrels = self.load_qrels(qids=set(queries.keys()))
         if not queries or not qrels:
             return {}
-        paths = self.bridge.write_comparison(results)
-        evals = {}
-        for method, tsv in paths.items():
-            ok, t = self.index(tsv)
-            if not ok:
-                continue
-            ev = self.evaluate(queries, qrels, name=method)
-            ev.stats["index_time"] = t
-            evals[method] = ev
+        start = time.time()
+        out_dir = self.output_dir / "compare"
+        paths = self.bridge.write_comparison(results, variants, out_dir)
+        write_time = time.time() - start
+        jobs = jobs or max(1, min(len(paths), os.cpu_count() or 1, (mem_mb or _memory_mb() // 2) // INDEX_MB))
+        with ThreadPoolExecutor(jobs) as pool:
+            futures = {m: pool.submit(self._variant, m, tsv, queries, qrels, out_dir / m) for m, tsv in paths.items()}
+            evals = {m: f.result() for m, f in futures.items()}
+        wall = time.time() - start
+        evals = {m: ev for m, ev in evals.items() if ev}
+        for ev in evals.values():
+            ev.stats.update({"write_time": write_time, "compare_wall_time": wall, "jobs": jobs})
         return evals
 
     def save(self, results, path=None):
         path = path or self.output_dir / "results.json"
-        data = {method: {"metrics": {"ndcg@10": r.metrics.ndcg_at_10, "recall@100": r.metrics.recall_at_100, "mrr@10": r.metrics.mrr_at_10}, "avg_latency": r.avg_latency} for method, r in results.items()}
+        data = {method: {"metrics": {"ndcg@10": r.metrics.ndcg_at_10, "recall@100": r.metrics.recall_at_100, "mrr@10": r.metrics.mrr_at_10}, "avg_latency": r.avg_latency, "stats": r.stats} for method, r in results.items()}
         with open(path, "w") as f:
             json.dump(data, f, indent=2)
 
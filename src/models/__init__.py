@@ -1,6 +1,23 @@
-from .llm import LLM
-from .doc2query import Doc2Query
-from .nli import NLI
-from .embeddings import Embedder
+import importlib
 
-__all__ = ["LLM", "Doc2Query", "NLI", "Embedder"]
+# Submodules are imported on first attribute access so importing the package stays cheap
+_LAZY = {
+    "LLM": ".llm",
+    "Doc2Query": ".doc2query",
+    "NLI": ".nli",
+    "CascadeNLI": ".nli",
+    "Embedder": ".embeddings",
+    "QueryEncoder": ".query_encoder",
+    "ModelServer": ".server",
+    "ModelClient": ".server",
+}
+
+__all__ = ["LLM", "Doc2Query", "NLI", "CascadeNLI", "Embedder", "QueryEncoder", "ModelServer", "ModelClient"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
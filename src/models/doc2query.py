@@ -1,7 +1,7 @@
-import torch
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+import threading
 
 
+# `lock` guards the tokenizer, which the pipelined expander uses from its prep and post threads
 class Doc2Query:
     def __init__(self, model="castorini/doc2query-t5-base-msmarco", device="cuda", num_queries=5):
         self.model_name = model
@@ -9,10 +9,12 @@ class Doc2Query:
         self.num_queries = num_queries
         self.model = None
         self.tokenizer = None
+        self.lock = threading.Lock()
 
     def load(self):
         if self.model:
             return self
+        from transformers import T5ForConditionalGeneration, T5Tokenizer
         print(f"Loading Doc2Query: {self.model_name}")
         self.tokenizer = T5Tokenizer.from_pretrained(self.model_name, legacy=False)
         self.model = T5ForConditionalGeneration.from_pretrained(self.model_name)
@@ -22,23 +24,58 @@ class Doc2Query:
         return self
 
     def generate(self, doc, n=None):
+        import torch
         if not self.model:
             self.load()
         n = n or self.num_queries
-        inputs = self.tokenizer(doc, max_length=512, truncation=True, return_tensors="pt")
+        with self.lock:
+            inputs = self.tokenizer(doc, max_length=512, truncation=True, return_tensors="pt")
         if self.device in ["mps", "cuda"]:
             inputs = {k: v.to(self.device) for k, v in inputs.items()}
         with torch.no_grad():
             outputs = self.model.generate(**inputs, max_length=64, do_sample=True, top_k=10, num_return_sequences=n)
+        with self.lock:
+            decoded = [self.tokenizer.decode(out, skip_special_tokens=True).strip() for out in outputs]
         queries = []
-        for out in outputs:
-            q = self.tokenizer.decode(out, skip_special_tokens=True).strip()
+        for q in decoded:
             if q and q not in queries:
                 queries.append(q)
         return queries
 
+    def encode(self, docs):
+        if not self.model:
+            self.load()
+        with self.lock:
+            return self.tokenizer(docs, max_length=512, truncation=True, padding=True, return_tensors="pt")
+
+    def generate_encoded(self, inputs, n=None):
+        import torch
+        n = n or self.num_queries
+        if self.device in ["mps", "cuda"]:
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            return self.model.generate(**inputs, max_length=64, do_sample=True, top_k=10, num_return_sequences=n).cpu()
+
+    def decode(self, outputs, n=None):
+        n = n or self.num_queries
+        with self.lock:
+            decoded = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        results = []
+        for i in range(len(decoded) // n):
+            queries = []
+            for q in decoded[i * n:(i + 1) * n]:
+                q = q.strip()
+                if q and q not in queries:
+                    queries.append(q)
+            results.append(queries)
+        return results
+
+    def generate_batch(self, docs, n=None):
+        return self.decode(self.generate_encoded(self.encode(docs), n), n)
+
     def unload(self):
         if self.model:
+            import torch
             del self.model, self.tokenizer
             self.model = self.tokenizer = None
             if torch.cuda.is_available():
@@ -1,18 +1,18 @@
-import torch
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
 
 
+# encode holds `lock`: the pipelined expander combines two batches at once on one SentenceTransformer
 class Embedder:
     def __init__(self, model="sentence-transformers/all-MiniLM-L6-v2", device="cuda"):
         self.model_name = model
         self.device = device
         self.model = None
+        self.lock = threading.Lock()
 
     def load(self):
         if self.model:
             return self
+        from sentence_transformers import SentenceTransformer
         print(f"Loading Embedder: {self.model_name}")
         self.model = SentenceTransformer(self.model_name, device=self.device)
         return self
@@ -20,9 +20,11 @@ class Embedder:
     def encode(self, texts):
         if not self.model:
             self.load()
-        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        with self.lock:
+            return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
 
     def similarity(self, texts1, texts2=None):
+        from sklearn.metrics.pairwise import cosine_similarity
         e1 = self.encode(texts1)
         return cosine_similarity(e1) if texts2 is None else cosine_similarity(e1, self.encode(texts2))
 
@@ -48,6 +50,7 @@ class Embedder:
 
     def unload(self):
         if self.model:
+            import torch
             del self.model
             self.model = None
             if torch.cuda.is_available():
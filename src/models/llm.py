@@ -1,5 +1,9 @@
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, pipeline
+import threading
+
+MAX_ITEMS = 5
+# Sampling settings shared by the pipeline behind run() and the batched generate_encoded()
+MAX_NEW_TOKENS = 256
+TEMPERATURE = 0.7
 
 GAP_PROMPT = """Analyze this document and list semantic gaps (max 5):
 {document}
@@ -14,29 +18,92 @@ Gaps: {gaps}
 Expansions:"""
 
 
+def _items(text):
+    items = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line[0].isdigit():
+            line = line.split(".", 1)[-1].strip()
+        if line.startswith("-"):
+            line = line[1:].strip()
+        if len(line) > 5:
+            items.append(line)
+    return items
+
+
+def _is_section(line):
+    line = line.strip()
+    return line.startswith("#") or (line.endswith(":") and not line[0].isdigit() and not line.startswith("-"))
+
+
+# Stops each sequence of a batch once its completed lines already hold everything _parse keeps.
+# Only newline-terminated lines are parsed, so the kept items are identical to a full-length run.
+# generate() just calls each criterion, so no StoppingCriteria base is needed to keep transformers unimported.
+class ItemStop:
+    def __init__(self, tokenizer, max_items=MAX_ITEMS, on_section=False, lock=None):
+        self.tokenizer = tokenizer
+        self.lock = lock or threading.Lock()
+        self.max_items = max_items
+        self.on_section = on_section
+        self.start = None
+        self.done = None
+
+    def _finished(self, text):
+        lines = text.split("\n")
+        items = _items(text)
+        if len(items) >= self.max_items:
+            return True
+        return self.on_section and bool(items) and _is_section(lines[-1])
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+        if self.start is None:
+            self.start = input_ids.shape[1] - 1
+            self.done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        # Items only change when a line completes, so most steps cost one token decode per row
+        with self.lock:
+            for i, tok in enumerate(self.tokenizer.batch_decode(input_ids[:, -1:])):
+                if not self.done[i] and "\n" in tok:
+                    text = self.tokenizer.decode(input_ids[i, self.start:], skip_special_tokens=True)
+                    self.done[i] = self._finished(text[:text.rfind("\n")])
+        return self.done.clone()
+
+
+# `lock` guards the tokenizer and the token counter: the pipelined expander encodes, decodes and
+# runs the stopping criterion of neighbouring batches on different threads, and a fast tokenizer
+# used from two threads at once fails with "Already borrowed"
 class LLM:
-    def __init__(self, model="meta-llama/Meta-Llama-3-8B-Instruct", device="cuda"):
+    def __init__(self, model="meta-llama/Meta-Llama-3-8B-Instruct", device="cuda", early_stop=True, stop_on_section=False):
         self.model_name = model
         self.device = device
+        self.early_stop = early_stop
+        self.stop_on_section = stop_on_section
         self.model = None
         self.tokenizer = None
         self.pipe = None
+        self.tokens = 0
+        self.lock = threading.Lock()
 
     def load(self):
         if self.model:
             return self
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, pipeline
         print(f"Loading LLM: {self.model_name}")
         quant = BitsAndBytesConfig(load_in_4bit=True, bnb_4bit_compute_dtype=torch.float16) if self.device == "cuda" else None
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, trust_remote_code=True)
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
         dtype = torch.float16 if self.device in ["mps", "cuda"] else torch.float32
         self.model = AutoModelForCausalLM.from_pretrained(
             self.model_name, quantization_config=quant, torch_dtype=dtype,
             device_map="auto" if self.device == "cuda" else {"": self.device}, trust_remote_code=True
         )
         self.pipe = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer,
-                            max_new_tokens=256, temperature=0.7, do_sample=True)
+                             max_new_tokens=MAX_NEW_TOKENS, temperature=TEMPERATURE, do_sample=True)
         return self
 
     def _format(self, doc, template, **kw):
@@ -45,25 +112,50 @@ class LLM:
             return f"<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\n{content}<|eot_id|><|start_header_id|>assistant<|end_header_id|>\n\n"
         return f"[INST] {content} [/INST]"
 
+    def _stopping(self):
+        if not self.early_stop:
+            return None
+        from transformers import StoppingCriteriaList
+        return StoppingCriteriaList([ItemStop(self.tokenizer, on_section=self.stop_on_section, lock=self.lock)])
+
     def _generate(self, prompt):
         if not self.model:
             self.load()
-        result = self.pipe(prompt, return_full_text=False, pad_token_id=self.tokenizer.pad_token_id)
-        return result[0]["generated_text"].strip()
+        result = self.pipe(prompt, return_full_text=False, pad_token_id=self.tokenizer.pad_token_id, stopping_criteria=self._stopping())
+        text = result[0]["generated_text"]
+        with self.lock:
+            self.tokens += len(self.tokenizer.encode(text, add_special_tokens=False))
+        return text.strip()
+
+    def encode(self, prompts):
+        if not self.model:
+            self.load()
+        with self.lock:
+            return self.tokenizer(prompts, return_tensors="pt", padding=True, add_special_tokens=False)
+
+    def generate_encoded(self, inputs):
+        import torch
+        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            out = self.model.generate(**inputs, max_new_tokens=MAX_NEW_TOKENS, temperature=TEMPERATURE, do_sample=True,
+                                      pad_token_id=self.tokenizer.pad_token_id, stopping_criteria=self._stopping())
+        return out[:, inputs["input_ids"].shape[1]:].cpu()
+
+    def decode(self, outputs):
+        mask = outputs != self.tokenizer.pad_token_id
+        with self.lock:
+            self.tokens += int(mask.sum())
+            return [t.strip() for t in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+    def token_counts(self, outputs):
+        return (outputs != self.tokenizer.pad_token_id).sum(-1).tolist()
+
+    def _generate_batch(self, prompts):
+        out = self.generate_encoded(self.encode(prompts))
+        return self.decode(out), self.token_counts(out)
 
     def _parse(self, text):
-        items = []
-        for line in text.split("\n"):
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if line[0].isdigit():
-                line = line.split(".", 1)[-1].strip()
-            if line.startswith("-"):
-                line = line[1:].strip()
-            if len(line) > 5:
-                items.append(line)
-        return items[:5]
+        return _items(text)[:MAX_ITEMS]
 
     def gaps(self, doc):
         return self._parse(self._generate(self._format(doc, GAP_PROMPT)))
@@ -73,11 +165,27 @@ class LLM:
         return self._parse(self._generate(self._format(doc, EXPAND_PROMPT, gaps=gaps_text)))
 
     def run(self, doc):
+        tokens = self.tokens
         gaps = self.gaps(doc)
-        return {"text": doc, "gaps": gaps, "expansions": self.expand(doc, gaps)}
+        expansions = self.expand(doc, gaps)
+        return {"text": doc, "gaps": gaps, "expansions": expansions, "tokens": self.tokens - tokens}
+
+    def gap_prompts(self, docs):
+        return [self._format(d, GAP_PROMPT) for d in docs]
+
+    def expand_prompts(self, docs, gaps):
+        return [self._format(d, EXPAND_PROMPT, gaps="\n".join(g) if g else "none") for d, g in zip(docs, gaps)]
+
+    def run_batch(self, docs):
+        texts, gap_tokens = self._generate_batch(self.gap_prompts(docs))
+        gaps = [self._parse(t) for t in texts]
+        texts, exp_tokens = self._generate_batch(self.expand_prompts(docs, gaps))
+        return [{"text": d, "gaps": g, "expansions": self._parse(t), "tokens": a + b}
+                for d, g, t, a, b in zip(docs, gaps, texts, gap_tokens, exp_tokens)]
 
     def unload(self):
         if self.model:
+            import torch
             del self.model, self.tokenizer, self.pipe
             self.model = self.tokenizer = self.pipe = None
             if torch.cuda.is_available():
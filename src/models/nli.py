@@ -1,5 +1,8 @@
-import torch
-from transformers import pipeline
+import random
+import threading
+
+# Contradiction-probability band of the small model inside which a pair goes to the large model
+BAND = (0.05, 0.95)
 
 
 class NLI:
@@ -7,10 +10,12 @@ class NLI:
         self.model_name = model
         self.device = device
         self.pipe = None
+        self.lock = threading.Lock()
 
     def load(self):
         if self.pipe:
             return self
+        from transformers import pipeline
         print(f"Loading NLI: {self.model_name}")
         device_id = 0 if self.device == "cuda" else (-1 if self.device == "cpu" else "mps")
         self.pipe = pipeline("text-classification", model=self.model_name, device=device_id)
@@ -30,9 +35,141 @@ class NLI:
             self.load()
         return [e for e in expansions if self.check(doc, e)]
 
+    def encode(self, pairs):
+        if not self.pipe:
+            self.load()
+        inputs = [f"{doc}</s></s>{e}" for doc, exps in pairs for e in exps]
+        if not inputs:
+            return None
+        with self.lock:
+            return self.pipe.tokenizer(inputs, truncation=True, padding=True, return_tensors="pt")
+
+    def classify_encoded(self, inputs):
+        import torch
+        if inputs is None:
+            return []
+        inputs = {k: v.to(self.pipe.model.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            ids = self.pipe.model(**inputs).logits.argmax(-1).tolist()
+        return [self.pipe.model.config.id2label[i] for i in ids]
+
+    def select(self, pairs, labels):
+        out, i = [], 0
+        for _, exps in pairs:
+            out.append([e for e, label in zip(exps, labels[i:i + len(exps)]) if label != "contradiction"])
+            i += len(exps)
+        return out
+
+    def validate_batch(self, pairs):
+        return self.select(pairs, self.classify_encoded(self.encode(pairs)))
+
     def unload(self):
         if self.pipe:
+            import torch
             del self.pipe
             self.pipe = None
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
+
+
+# Two-tier validator: a distilled NLI cross-encoder scores every pair and only pairs whose
+# contradiction probability falls inside `band` are escalated to the large model. `audit` also sends
+# that share of the confident pairs to the large model, to measure agreement with the single-model path.
+class CascadeNLI:
+    def __init__(self, small="cross-encoder/nli-distilroberta-base", large="facebook/bart-large-mnli", device="cuda",
+                 band=BAND, audit=0.0, seed=0):
+        self.model_name = small
+        self.device = device
+        self.large = NLI(large, device)
+        self.band = band
+        self.audit = audit
+        self.rng = random.Random(seed)
+        self.tokenizer = self.model = None
+        self.contradiction = 0
+        self.lock = threading.Lock()
+        self.pairs = self.escalated = self.audited = self.agreed = 0
+
+    def load(self):
+        if self.model:
+            return self
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        print(f"Loading NLI: {self.model_name}")
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name).to(self.device).eval()
+        labels = {v.lower(): k for k, v in self.model.config.id2label.items()}
+        self.contradiction = labels.get("contradiction", 0)
+        return self
+
+    def check(self, premise, hypothesis):
+        return bool(self.validate(premise, [hypothesis]))
+
+    def validate(self, doc, expansions):
+        return self.validate_batch([(doc, expansions)])[0]
+
+    def encode(self, pairs):
+        if not self.model:
+            self.load()
+        flat = [(doc, e) for doc, exps in pairs for e in exps]
+        if not flat:
+            return None
+        with self.lock:
+            return flat, self.tokenizer([d for d, _ in flat], [e for _, e in flat], truncation=True, padding=True, return_tensors="pt")
+
+    def scores(self, inputs):
+        import torch
+        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            return self.model(**inputs).logits.softmax(-1)[:, self.contradiction].tolist()
+
+    def classify_encoded(self, inputs):
+        if inputs is None:
+            return []
+        flat, enc = inputs
+        lo, hi = self.band
+        probs = self.scores(enc)
+        labels = ["contradiction" if p >= hi else "entailment" for p in probs]
+        uncertain = [i for i, p in enumerate(probs) if lo < p < hi]
+        audit = [i for i, p in enumerate(probs) if not lo < p < hi and self.audit and self.rng.random() < self.audit]
+        agreed = 0
+        if uncertain or audit:
+            sent = uncertain + audit
+            large = self.large.classify_encoded(self.large.encode([(flat[i][0], [flat[i][1]]) for i in sent]))
+            for i, label in zip(uncertain, large):
+                labels[i] = label
+            agreed = sum((labels[i] == "contradiction") == (label == "contradiction") for i, label in zip(audit, large[len(uncertain):]))
+        with self.lock:
+            self.pairs += len(flat)
+            self.escalated += len(uncertain)
+            self.audited += len(audit)
+            self.agreed += agreed
+        return labels
+
+    select = NLI.select
+
+    def validate_batch(self, pairs):
+        return self.select(pairs, self.classify_encoded(self.encode(pairs)))
+
+    # Escalated pairs get the large model's decision, so disagreement can only come from confident ones
+    def stats(self):
+        with self.lock:
+            confident = self.pairs - self.escalated
+            agreement = self.agreed / self.audited if self.audited else None
+            return {"pairs": self.pairs, "escalated": self.escalated, "escalation_rate": self.escalated / self.pairs if self.pairs else 0.0,
+                    "audited": self.audited, "audit_agreement": agreement,
+                    "agreement": None if agreement is None else 1 - (1 - agreement) * confident / max(self.pairs, 1)}
+
+    def report(self):
+        s = self.stats()
+        out = f"{s['pairs']} pairs, {s['escalation_rate']:.1%} escalated"
+        if s["agreement"] is not None:
+            out += f", agreement with {self.large.model_name} ~{s['agreement']:.1%} ({s['audited']} audited)"
+        return out
+
+    def unload(self):
+        self.large.unload()
+        if self.model:
+            import torch
+            del self.model
+            self.model = self.tokenizer = None
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
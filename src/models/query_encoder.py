@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+from .embeddings import Embedder
+
+CACHE_SIZE = 100000
+WINDOW_MS = 2.0
+MAX_BATCH = 64
+
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+
+# Live query encoding: concurrent requests arriving within `window_ms` are encoded as one batch,
+# identical in-flight queries share a future, and vectors are kept in an LRU keyed by normalized text
+class QueryEncoder:
+    def __init__(self, embedder=None, cache_size=CACHE_SIZE, window_ms=WINDOW_MS, max_batch=MAX_BATCH, device=None):
+        self.embedder = embedder or Embedder(device=device)
+        self.cache_size = cache_size
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.queue = []
+        self.cond = threading.Condition()
+        self.thread = None
+        self.closed = False
+        self.hits = self.misses = self.batches = self.encoded = 0
+
+    def load(self):
+        self.embedder.load()
+        return self
+
+    def submit(self, query):
+        key = normalize(query)
+        with self.cond:
+            vec = self.cache.get(key)
+            if vec is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                f = Future()
+                f.set_result(vec)
+                return f
+            self.misses += 1
+            if key in self.pending:
+                return self.pending[key]
+            f = self.pending[key] = Future()
+            self.queue.append(key)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._loop, daemon=True)
+                self.thread.start()
+            self.cond.notify()
+            return f
+
+    def encode(self, query):
+        return self.submit(query).result()
+
+    def encode_many(self, queries):
+        futures = [self.submit(q) for q in queries]
+        return np.stack([f.result() for f in futures])
+
+    def _loop(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if not self.queue:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self.queue) < self.max_batch and not self.closed:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self.cond.wait(left)
+                keys, self.queue = self.queue[:self.max_batch], self.queue[self.max_batch:]
+            try:
+                vecs = np.asarray(self.embedder.encode(keys), dtype=np.float32)
+            except Exception as e:
+                with self.cond:
+                    futures = [self.pending.pop(k) for k in keys]
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            with self.cond:
+                self.batches += 1
+                self.encoded += len(keys)
+                for k, v in zip(keys, vecs):
+                    self.cache[k] = v
+                if len(self.cache) > self.cache_size:
+                    for _ in range(len(self.cache) - self.cache_size):
+                        self.cache.popitem(last=False)
+                futures = [self.pending.pop(k) for k in keys]
+            for f, v in zip(futures, vecs):
+                f.set_result(v)
+
+    def stats(self):
+        with self.cond:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "encoded": self.encoded, "batches": self.batches, "cached": len(self.cache),
+                    "mean_batch": self.encoded / self.batches if self.batches else 0.0}
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.closed = False
+
+    def unload(self):
+        self.close()
+        self.embedder.unload()
@@ -0,0 +1,293 @@
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from ..config import SERVER_SOCKET
+from .embeddings import Embedder
+
+WINDOW_MS = 5.0
+MAX_BATCH = 32
+CONNECT_TIMEOUT = 0.2
+
+# Methods a client may call per model
+ALLOWED = {
+    "llm": {"run", "run_batch", "gaps", "expand"},
+    "nli": {"validate", "validate_batch", "check"},
+    "d2q": {"generate", "generate_batch"},
+    "embedder": {"encode"},
+}
+
+
+def _run_batch(model, args):
+    return model.run_batch([a[0] for a in args])
+
+
+def _validate_batch(model, args):
+    return model.validate_batch([(a[0], a[1]) for a in args])
+
+
+def _generate_batch(model, args):
+    return model.generate_batch([a[0] for a in args])
+
+
+def _encode_batch(model, args):
+    texts = [t for a in args for t in a[0]]
+    vecs = model.encode(texts).tolist() if texts else []
+    out, i = [], 0
+    for a in args:
+        out.append(vecs[i:i + len(a[0])])
+        i += len(a[0])
+    return out
+
+
+# Single-item calls from concurrent clients that are merged into one batched call
+COALESCE = {
+    ("llm", "run"): (1, _run_batch),
+    ("nli", "validate"): (2, _validate_batch),
+    ("d2q", "generate"): (1, _generate_batch),
+    ("embedder", "encode"): (1, _encode_batch),
+}
+
+
+def _jsonable(value):
+    return value.tolist() if hasattr(value, "tolist") else value
+
+
+class _Call:
+    __slots__ = ("method", "args", "done", "result", "error")
+
+    def __init__(self, method, args):
+        self.method = method
+        self.args = args
+        self.done = threading.Event()
+        self.result = self.error = None
+
+
+# One thread per model: it owns the model (so GPU work is serialised) and drains its queue,
+# merging requests that arrive within the window into a single batched call
+class _ModelWorker(threading.Thread):
+    def __init__(self, name, model, window, max_batch):
+        super().__init__(daemon=True)
+        self.name_ = name
+        self.model = model
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.batches = self.calls = 0
+
+    def submit(self, method, args):
+        call = _Call(method, args)
+        self.queue.put(call)
+        call.done.wait()
+        if call.error:
+            raise RuntimeError(call.error)
+        return call.result
+
+    def _take(self):
+        calls = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(calls) < self.max_batch:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                calls.append(self.queue.get(timeout=left))
+            except queue.Empty:
+                break
+        return calls
+
+    def _finish(self, calls, fn):
+        try:
+            results = fn()
+            for c, r in zip(calls, results):
+                c.result = r
+        except Exception as e:
+            for c in calls:
+                c.error = f"{type(e).__name__}: {e}"
+        for c in calls:
+            c.done.set()
+
+    def run(self):
+        while True:
+            calls = self._take()
+            groups = {}
+            for c in calls:
+                arity, _ = COALESCE.get((self.name_, c.method), (None, None))
+                key = c.method if arity == len(c.args) else id(c)
+                groups.setdefault(key, []).append(c)
+            for key, group in groups.items():
+                self.batches += 1
+                self.calls += len(group)
+                if isinstance(key, str):
+                    batch = COALESCE[(self.name_, key)][1]
+                    self._finish(group, lambda: batch(self.model, [c.args for c in group]))
+                else:
+                    c = group[0]
+                    self._finish(group, lambda: [_jsonable(getattr(self.model, c.method)(*c.args))])
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            req = json.loads(line)
+            try:
+                result = self.server.models.call(req["model"], req["method"], req.get("args", []))
+                resp = {"result": result}
+            except Exception as e:
+                resp = {"error": str(e)}
+            self.wfile.write((json.dumps(resp) + "\n").encode())
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ModelServer:
+    def __init__(self, models, path=SERVER_SOCKET, window_ms=WINDOW_MS, max_batch=MAX_BATCH):
+        self.path = str(path)
+        self.workers = {name: _ModelWorker(name, m, window_ms / 1000, max_batch) for name, m in models.items() if m is not None}
+        self.server = None
+
+    def call(self, model, method, args):
+        if method == "ping":
+            return {name: {"calls": w.calls, "batches": w.batches} for name, w in self.workers.items()}
+        if model not in self.workers or method not in ALLOWED.get(model, ()):
+            raise ValueError(f"unknown method {model}.{method}")
+        return self.workers[model].submit(method, args)
+
+    def serve_forever(self):
+        for name, w in self.workers.items():
+            print(f"Loading {name}...")
+            w.model.load()
+            w.start()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = _Server(self.path, _Handler)
+        self.server.models = self
+        print(f"Serving {', '.join(self.workers)} on {self.path}")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+
+
+# One connection per thread, so concurrent callers in one process still reach the server in parallel
+class ModelClient:
+    def __init__(self, path=SERVER_SOCKET):
+        self.path = str(path)
+        self.local = threading.local()
+
+    def _conn(self):
+        f = getattr(self.local, "f", None)
+        if f is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            f = self.local.f = sock.makefile("rwb")
+        return f
+
+    def call(self, model, method, *args):
+        f = self._conn()
+        try:
+            f.write((json.dumps({"model": model, "method": method, "args": list(args)}) + "\n").encode())
+            f.flush()
+            line = f.readline()
+        except OSError:
+            self.local.f = None
+            raise
+        if not line:
+            self.local.f = None
+            raise ConnectionError("model server closed the connection")
+        resp = json.loads(line)
+        if "error" in resp:
+            raise RuntimeError(resp["error"])
+        return resp["result"]
+
+    def models(self):
+        return self.call("", "ping")
+
+
+def connect(path=SERVER_SOCKET):
+    if not os.path.exists(str(path)):
+        return None
+    client = ModelClient(path)
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(str(path))
+        sock.close()
+        client.served = client.models()
+    except OSError:
+        return None
+    return client
+
+
+class RemoteModel:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def load(self):
+        return self
+
+    def unload(self):
+        pass
+
+    def __getattr__(self, method):
+        if method not in ALLOWED.get(self.name, ()):
+            raise AttributeError(method)
+        return lambda *args: self.client.call(self.name, method, *args)
+
+
+class RemoteLLM(RemoteModel):
+    def __init__(self, client):
+        super().__init__(client, "llm")
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+    def run(self, doc):
+        result = self.client.call("llm", "run", doc)
+        with self.lock:
+            self.tokens += result.get("tokens", 0)
+        return result
+
+    def run_batch(self, docs):
+        results = self.client.call("llm", "run_batch", docs)
+        with self.lock:
+            self.tokens += sum(r.get("tokens", 0) for r in results)
+        return results
+
+
+# Embedder proxy: only encode crosses the socket, similarity and dedup run locally on the vectors
+class RemoteEmbedder(Embedder):
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+
+    def load(self):
+        return self
+
+    def encode(self, texts):
+        import numpy as np
+        return np.array(self.client.call("embedder", "encode", list(texts)), dtype=np.float32)
+
+    def unload(self):
+        pass
+
+
+def remote_models(client):
+    served = getattr(client, "served", {})
+    return {"llm": RemoteLLM(client) if "llm" in served else None,
+            "nli": RemoteModel(client, "nli") if "nli" in served else None,
+            "d2q": RemoteModel(client, "d2q") if "d2q" in served else None,
+            "embedder": RemoteEmbedder(client) if "embedder" in served else None}
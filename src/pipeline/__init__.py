@@ -1,5 +1,18 @@
-from .expander import Expander
-from .combiner import Combiner
-from .indexer_bridge import Bridge
+import importlib
+
+# Submodules are imported on first attribute access so importing the package stays cheap
+_LAZY = {
+    "Expander": ".expander",
+    "Combiner": ".combiner",
+    "Bridge": ".indexer_bridge",
+}
 
 __all__ = ["Expander", "Combiner", "Bridge"]
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
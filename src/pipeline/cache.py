@@ -0,0 +1,83 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from ..telemetry import NULL_RECORDER
+
+MAX_ENTRIES = 10000
+TTL_S = 300.0
+
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+
+# Generation of an on-disk index: changes whenever any of its files is rewritten
+def file_generation(*paths):
+    h = hashlib.sha1()
+    for p in paths:
+        if os.path.exists(p):
+            st = os.stat(p)
+            h.update(f"{p}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return h.hexdigest()[:16]
+
+
+class ResultCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_S, recorder=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.recorder = recorder or NULL_RECORDER
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.generation = None
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.expired = self.evicted = self.invalidations = 0
+
+    def key(self, query, mode, limit, variant=None):
+        return normalize(query), mode, limit, variant, self.generation
+
+    # Entries are keyed by generation, so switching drops them all rather than letting stale ones age out
+    def set_generation(self, generation):
+        with self.lock:
+            if generation != self.generation:
+                if self.generation is not None:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.generation = generation
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.clock() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        self.recorder.count("cache_hits" if entry is not None else "cache_misses")
+        return None if entry is None else entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            if key[-1] != self.generation:
+                return
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "expired": self.expired, "evicted": self.evicted, "invalidations": self.invalidations, "generation": self.generation}
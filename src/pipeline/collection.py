@@ -0,0 +1,139 @@
+import mmap
+import os
+from pathlib import Path
+
+import numpy as np
+
+CHUNK_BYTES = 8 << 20
+SCAN_BYTES = 64 << 20
+_HEADER = 2
+
+
+def _parse(line):
+    parts = line.split("\t", 2)
+    if len(parts) < 2:
+        return None
+    return parts[0].strip(), parts[1].strip()
+
+
+# TSV collection (id \t text ...) with a cached sidecar of line start offsets for O(1) row access
+# and byte-range sharding. Lines without a tab are not rows, matching the old split("\t") readers.
+class Collection:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".offsets")
+        self._offsets = None
+        self._mm = None
+        self._file = None
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+    def _map(self):
+        if self._mm is None:
+            self._file = open(self.path, "rb")
+            size = os.fstat(self._file.fileno()).st_size
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        return self._mm
+
+    def build_index(self):
+        mm = self._map()
+        size, starts, pos = len(mm), [], 0
+        while pos < size:
+            end = min(size, pos + SCAN_BYTES)
+            if end < size:
+                # Cut the block after its last newline so no line straddles two blocks
+                nl = mm.rfind(b"\n", pos, end)
+                end = nl + 1 if nl >= 0 else (mm.find(b"\n", end) + 1 or size)
+            block = np.frombuffer(mm[pos:end], dtype=np.uint8)
+            nl = np.flatnonzero(block == 10)
+            if not len(nl) or nl[-1] != len(block) - 1:
+                nl = np.append(nl, len(block))
+            line_starts = np.concatenate(([0], nl[:-1] + 1))
+            tabs = np.flatnonzero(block == 9)
+            has_tab = np.searchsorted(tabs, nl) > np.searchsorted(tabs, line_starts)
+            starts.append(line_starts[has_tab] + pos)
+            pos = end
+        offsets = np.concatenate(starts + [[size]]).astype(np.int64)
+        tmp = f"{self.index_path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                self._stat().tofile(f)
+                offsets.tofile(f)
+            os.replace(tmp, self.index_path)
+        except OSError as e:
+            print(f"Offsets not cached ({e})")
+        self._offsets = offsets
+        return self
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            if self.index_path.exists():
+                data = np.fromfile(self.index_path, dtype=np.int64)
+                if len(data) > _HEADER and (data[:_HEADER] == self._stat()).all():
+                    self._offsets = data[_HEADER:]
+                    return self._offsets
+            self.build_index()
+        return self._offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _line(self, start, end):
+        return self._map()[start:end].decode("utf-8").rstrip("\r\n")
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        mm = self._map()
+        start = int(self.offsets[i])
+        end = mm.find(b"\n", start)
+        return _parse(self._line(start, end if end >= 0 else len(mm)))
+
+    def byte_range(self, i, n):
+        rows = len(self)
+        return int(self.offsets[rows * i // n]), int(self.offsets[rows * (i + 1) // n])
+
+    def _iter_bytes(self, start, end):
+        mm = self._map()
+        pos = start
+        while pos < end:
+            stop = min(end, pos + CHUNK_BYTES)
+            if stop < end:
+                nl = mm.rfind(b"\n", pos, stop)
+                stop = nl + 1 if nl >= 0 else (mm.find(b"\n", stop, end) + 1 or end)
+            # split("\n") rather than splitlines(): passages may contain \x1c, \u2028 and friends
+            for line in mm[pos:stop].decode("utf-8").split("\n"):
+                row = _parse(line.rstrip("\r"))
+                if row:
+                    yield row
+            pos = stop
+
+    # Shard i of n, split on row boundaries so each worker reads only its byte range
+    def shard(self, i, n):
+        return self._iter_bytes(*self.byte_range(i, n))
+
+    def rows(self, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        return self._iter_bytes(int(self.offsets[start]), int(self.offsets[stop]))
+
+    def __iter__(self):
+        return self._iter_bytes(0, len(self._map()))
+
+    def close(self):
+        if self._file:
+            if self._mm:
+                self._mm.close()
+            self._file.close()
+        self._mm = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,11 +1,13 @@
 from ..models.embeddings import Embedder
+from ..telemetry import NULL_RECORDER
 
 GENERIC = {"information", "details", "things", "stuff", "content", "topic", "subject", "example", "case", "way", "method", "people", "time", "place", "thing"}
 
 
 class Combiner:
-    def __init__(self, embedder=None, threshold=0.85, max_expansions=10):
+    def __init__(self, embedder=None, threshold=0.85, max_expansions=10, recorder=None):
         self.embedder = embedder or Embedder()
+        self.recorder = recorder or NULL_RECORDER
         self.threshold = threshold
         self.max_expansions = max_expansions
 
@@ -31,9 +33,11 @@ class Combiner:
         if len(expansions) <= 1:
             return expansions
         self.embedder.load()
-        deduped = self.embedder.deduplicate(expansions, self.threshold)
-        if doc:
-            deduped = self.embedder.filter_similar_to_doc(doc, deduped, self.threshold)
+        with self.recorder.stage("dedup", len(expansions)) as span:
+            deduped = self.embedder.deduplicate(expansions, self.threshold)
+            if doc:
+                deduped = self.embedder.filter_similar_to_doc(doc, deduped, self.threshold)
+            span.items_out = len(deduped)
         return deduped
 
     def combine(self, doc, semantic_exp, query_exp):
@@ -0,0 +1,116 @@
+import hashlib
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 3
+NEAR_DUP = 0.8
+SEED = 42
+_PRIME = (1 << 31) - 1
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize(text):
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+def shingles(text, k=SHINGLE):
+    words = text.split()
+    if len(words) <= k:
+        return {text}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+class Deduper:
+    def __init__(self, threshold=NEAR_DUP, num_perm=NUM_PERM, bands=BANDS, shingle=SHINGLE):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        rng = np.random.default_rng(SEED)
+        self.a = rng.integers(1, _PRIME, num_perm, dtype=np.int64)
+        self.b = rng.integers(0, _PRIME, num_perm, dtype=np.int64)
+        self.docs = []
+        self.rep = []
+
+    def signature(self, norm):
+        x = np.array([zlib.crc32(s.encode()) for s in shingles(norm, self.shingle)], dtype=np.int64) % _PRIME
+        return ((np.outer(x, self.a) + self.b) % _PRIME).min(axis=0)
+
+    def _find(self, i):
+        while self.rep[i] != i:
+            self.rep[i] = self.rep[self.rep[i]]
+            i = self.rep[i]
+        return i
+
+    def _union(self, i, j):
+        i, j = self._find(i), self._find(j)
+        # The earliest document of a cluster is its representative
+        if i != j:
+            self.rep[max(i, j)] = min(i, j)
+
+    def fit(self, docs):
+        self.docs = list(docs)
+        self.rep = list(range(len(self.docs)))
+        exact, unique = {}, []
+        for i, (_, text) in enumerate(self.docs):
+            norm = normalize(text)
+            key = hashlib.sha1(norm.encode()).digest()
+            if key in exact:
+                self._union(exact[key], i)
+            else:
+                exact[key] = i
+                unique.append((i, norm))
+
+        sigs = {}
+        buckets = defaultdict(list)
+        for i, norm in unique:
+            sig = sigs[i] = self.signature(norm)
+            for band in range(self.bands):
+                buckets[(band, sig[band * self.rows:(band + 1) * self.rows].tobytes())].append(i)
+        for members in buckets.values():
+            for j in members[1:]:
+                if self._find(members[0]) != self._find(j) and np.mean(sigs[members[0]] == sigs[j]) >= self.threshold:
+                    self._union(members[0], j)
+        self.rep = [self._find(i) for i in range(len(self.docs))]
+        return self
+
+    def representatives(self):
+        return [d for i, d in enumerate(self.docs) if self.rep[i] == i]
+
+    # Every member reuses its representative's expansion appended to its own text; clusters whose
+    # representative has no result (a failed shard, a filtered run) are left out and reported
+    def fan_out(self, results):
+        by_id = {r["doc_id"]: r for r in results}
+        missing = {}
+        for i, (doc_id, text) in enumerate(self.docs):
+            rep_id = self.docs[self.rep[i]][0]
+            r = by_id.get(rep_id)
+            if r is None:
+                missing[rep_id] = missing.get(rep_id, 0) + 1
+                continue
+            if self.rep[i] == i:
+                yield r
+                continue
+            suffix = r["expanded"][len(r["original"]):] if r["expanded"].startswith(r["original"]) else ""
+            yield {**r, "doc_id": doc_id, "original": text, "expanded": text + suffix, "duplicate_of": r["doc_id"]}
+        if missing:
+            print(f"Dedup: no result for {len(missing)} representatives ({', '.join(map(str, list(missing)[:5]))}), "
+                  f"skipped {sum(missing.values())} docs")
+
+    def stats(self, expand_seconds=0.0):
+        reps = sum(1 for i, r in enumerate(self.rep) if r == i)
+        dups = len(self.docs) - reps
+        per_doc = expand_seconds / reps if reps else 0.0
+        return {"docs": len(self.docs), "clusters": reps, "duplicates": dups,
+                "ratio": dups / len(self.docs) if self.docs else 0.0, "seconds_saved": dups * per_doc}
+
+    def report(self, expand_seconds=0.0):
+        s = self.stats(expand_seconds)
+        return f"{s['duplicates']}/{s['docs']} duplicates ({s['ratio']:.1%}) in {s['clusters']} clusters, ~{s['seconds_saved']:.0f}s saved"
@@ -0,0 +1,70 @@
+import threading
+from queue import Queue
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class StagePipeline:
+    def __init__(self, stages, depth=2, recorder=None):
+        self.stages = stages
+        self.depth = depth
+        self.recorder = recorder
+
+    def _worker(self, name, fn, inq, outq, closing):
+        while True:
+            item = inq.get()
+            if item is _DONE:
+                inq.put(_DONE)
+                with closing["lock"]:
+                    closing["left"] -= 1
+                    if closing["left"] == 0:
+                        outq.put(_DONE)
+                return
+            i, value = item
+            if not isinstance(value, _Failed):
+                try:
+                    if self.recorder:
+                        with self.recorder.stage(f"pipe.{name}"):
+                            value = fn(value)
+                    else:
+                        value = fn(value)
+                except Exception as e:
+                    value = _Failed(e)
+            outq.put((i, value))
+
+    def run(self, items):
+        queues = [Queue(maxsize=self.depth) for _ in range(len(self.stages) + 1)]
+        threads = []
+        for (name, fn, workers), inq, outq in zip(self.stages, queues, queues[1:]):
+            closing = {"lock": threading.Lock(), "left": workers}
+            for _ in range(workers):
+                t = threading.Thread(target=self._worker, args=(name, fn, inq, outq, closing), daemon=True)
+                t.start()
+                threads.append(t)
+
+        def feed():
+            for i, item in enumerate(items):
+                queues[0].put((i, item))
+            queues[0].put(_DONE)
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        pending, nxt = {}, 0
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            pending[item[0]] = item[1]
+            while nxt in pending:
+                value = pending.pop(nxt)
+                if isinstance(value, _Failed):
+                    raise value.error
+                yield value
+                nxt += 1
+        for t in threads:
+            t.join()
@@ -1,34 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
 from ..models.llm import LLM
-from ..models.nli import NLI
+from ..models.nli import NLI, CascadeNLI
 from ..models.doc2query import Doc2Query
 from ..models.embeddings import Embedder
+from ..models.server import connect, remote_models
 from .combiner import Combiner
+from .scheduler import StageScheduler
+from .executor import StagePipeline
+from ..config import BATCH_SIZE
+from ..telemetry import NULL_RECORDER
 
 
+# server: False (default) loads every model in-process, True uses the running model server (`hqf-de serve`)
+# if there is one, or pass a connected ModelClient. Models the server does not hold load locally.
+# nli_cascade validates with CascadeNLI (small model first, BART only for uncertain pairs), always locally.
 class Expander:
-    def __init__(self, use_llm=True, use_nli=True, use_d2q=True, device="cuda"):
+    def __init__(self, use_llm=True, use_nli=True, use_d2q=True, device="cuda", recorder=None, triage=None, server=False,
+                 nli_cascade=False, nli_audit=0.0):
         self.device = device
-        self.llm = LLM(device=device) if use_llm else None
-        self.nli = NLI(device=device) if use_nli else None
-        self.d2q = Doc2Query(device=device) if use_d2q else None
-        self.combiner = Combiner(Embedder(device=device))
+        self.recorder = recorder or NULL_RECORDER
+        self.triage = triage
+        self.server = (connect() if server is True else server) or None
+        if server is True and self.server is None:
+            print("No model server running, loading models in-process")
+        remote = remote_models(self.server) if self.server else {}
+        if nli_cascade:
+            remote["nli"] = None
+        if self.server:
+            names = [name for name, m in remote.items() if m is not None]
+            print(f"Model server {self.server.path}: remote {', '.join(names) or 'none'}")
+        self.llm = (remote.get("llm") or LLM(device=device)) if use_llm else None
+        nli = CascadeNLI(device=device, audit=nli_audit) if nli_cascade else NLI(device=device)
+        self.nli = (remote.get("nli") or nli) if use_nli else None
+        self.d2q = (remote.get("d2q") or Doc2Query(device=device)) if use_d2q else None
+        self.combiner = Combiner(remote.get("embedder") or Embedder(device=device), recorder=self.recorder)
+        self.remote = any(m is not None for m in remote.values())
 
     def load(self):
-        if self.llm: self.llm.load()
-        if self.nli: self.nli.load()
-        if self.d2q: self.d2q.load()
-        self.combiner.load()
+        for name, model in [("llm", self.llm), ("nli", self.nli), ("d2q", self.d2q), ("combiner", self.combiner)]:
+            if model:
+                with self.recorder.stage(f"load.{name}"):
+                    model.load()
         return self
 
+    def route(self, doc):
+        r = self.triage.route(doc) if self.triage else "full"
+        self.recorder.count(f"route_{r}")
+        return r
+
     def expand(self, doc_id, doc):
+        rec = self.recorder
+        rec.count("docs")
+        route = self.route(doc)
         result = {"doc_id": doc_id, "original": doc, "gaps": [], "raw_expansions": [],
-                  "valid_expansions": [], "queries": [], "final": [], "expanded": doc}
+                  "valid_expansions": [], "queries": [], "final": [], "expanded": doc, "llm_tokens": 0, "route": route}
+        if route == "skip":
+            return result
 
         raw = []
-        if self.llm:
+        if self.llm and route == "full":
             try:
-                exp = self.llm.run(doc)
+                with rec.stage("llm", 1) as span:
+                    exp = self.llm.run(doc)
+                    span.items_out = len(exp["expansions"])
+                    span.tokens = exp["tokens"]
                 result["gaps"] = exp["gaps"]
+                result["llm_tokens"] = exp["tokens"]
                 raw = exp["expansions"]
                 result["raw_expansions"] = raw
             except Exception as e:
@@ -37,7 +74,9 @@ class Expander:
         valid = raw
         if self.nli and raw:
             try:
-                valid = self.nli.validate(doc, raw)
+                with rec.stage("nli", len(raw)) as span:
+                    valid = self.nli.validate(doc, raw)
+                    span.items_out = len(valid)
                 result["valid_expansions"] = valid
             except Exception as e:
                 print(f"NLI error: {e}")
@@ -45,13 +84,21 @@ class Expander:
         queries = []
         if self.d2q:
             try:
-                queries = self.d2q.generate(doc)
+                with rec.stage("d2q", 1) as span:
+                    queries = self.d2q.generate(doc)
+                    span.items_out = len(queries)
                 result["queries"] = queries
             except Exception as e:
                 print(f"D2Q error: {e}")
 
+        return self.finish(result, valid, queries)
+
+    def finish(self, result, valid, queries):
+        doc = result["original"]
         try:
-            combined = self.combiner.combine(doc, valid, queries)
+            with self.recorder.stage("combiner", len(valid) + len(queries)) as span:
+                combined = self.combiner.combine(doc, valid, queries)
+                span.items_out = len(combined["final"])
             result["final"] = combined["final"]
             result["expanded"] = combined["text"]
         except Exception as e:
@@ -59,13 +106,97 @@ class Expander:
             all_exp = valid + queries
             result["final"] = all_exp[:10]
             result["expanded"] = f"{doc} {' '.join(all_exp[:10])}"
-
         return result
 
+    def _try(self, name, fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            print(f"{name} error: {e}")
+            return None
+
+    # Pipelined stages: CPU stages (tokenize, parse, combine) run on worker threads while
+    # the device stages of neighbouring batches are in flight
+    def _prep(self, b):
+        b["res"] = [{"doc_id": doc_id, "original": doc, "gaps": [], "raw_expansions": [], "valid_expansions": [],
+                     "queries": [], "final": [], "expanded": doc, "llm_tokens": 0, "route": self.route(doc)} for doc_id, doc in b["docs"]]
+        self.recorder.count("docs", len(b["res"]))
+        b["llm_res"] = [r for r in b["res"] if r["route"] == "full"]
+        b["active"] = [r for r in b["res"] if r["route"] != "skip"]
+        texts = [r["original"] for r in b["llm_res"]]
+        b["enc"] = self._try("LLM", lambda: self.llm.encode(self.llm.gap_prompts(texts))) if self.llm and texts else None
+        texts = [r["original"] for r in b["active"]]
+        b["d2q_enc"] = self._try("D2Q", self.d2q.encode, texts) if self.d2q and texts else None
+        return b
+
+    def _llm_generate(self, b):
+        b["out"] = self._try("LLM", self.llm.generate_encoded, b["enc"]) if b["enc"] is not None else None
+        b["enc"] = None
+        return b
+
+    def _llm_gaps(self, b):
+        if b["out"] is not None:
+            gaps = [self.llm._parse(t) for t in self.llm.decode(b["out"])]
+            for r, g, n in zip(b["llm_res"], gaps, self.llm.token_counts(b["out"])):
+                r["gaps"] = g
+                r["llm_tokens"] += n
+            b["enc"] = self._try("LLM", lambda: self.llm.encode(self.llm.expand_prompts([r["original"] for r in b["llm_res"]], gaps)))
+        return b
+
+    def _llm_expansions(self, b):
+        pairs = []
+        if b.get("out") is not None:
+            for r, t, n in zip(b["llm_res"], self.llm.decode(b["out"]), self.llm.token_counts(b["out"])):
+                r["raw_expansions"] = self.llm._parse(t)
+                r["llm_tokens"] += n
+            pairs = [(r["original"], r["raw_expansions"]) for r in b["llm_res"] if r["raw_expansions"]]
+        b["pairs"] = pairs
+        b["nli_enc"] = self._try("NLI", self.nli.encode, pairs) if self.nli and pairs else None
+        return b
+
+    def _device(self, b):
+        b["labels"] = self._try("NLI", self.nli.classify_encoded, b["nli_enc"]) if b["nli_enc"] is not None else None
+        b["d2q_out"] = self._try("D2Q", self.d2q.generate_encoded, b["d2q_enc"]) if b["d2q_enc"] is not None else None
+        b["nli_enc"] = b["d2q_enc"] = None
+        return b
+
+    def _post(self, b):
+        validated = iter(self.nli.select(b["pairs"], b["labels"]) if b["labels"] is not None else [])
+        queries = (self._try("D2Q", self.d2q.decode, b["d2q_out"]) if b["d2q_out"] is not None else None) or [[] for _ in b["active"]]
+        for r, q in zip(b["active"], queries):
+            valid = r["raw_expansions"]
+            if b["labels"] is not None and valid:
+                valid = r["valid_expansions"] = next(validated)
+            r["queries"] = q
+            self.finish(r, valid, q)
+        return b["res"]
+
+    def expand_many(self, docs, batch_size=BATCH_SIZE, depth=2, cpu_workers=2):
+        self.load()
+        if self.remote:
+            # The encode/generate stages need local models; concurrent expand calls let the server batch instead
+            with ThreadPoolExecutor(batch_size) as pool:
+                yield from pool.map(lambda d: self.expand(*d), docs)
+            return
+        stages = [("prep", self._prep, cpu_workers)]
+        if self.llm:
+            stages += [("llm.gaps", self._llm_generate, 1), ("llm.prompts", self._llm_gaps, cpu_workers),
+                       ("llm.expand", self._llm_generate, 1)]
+        stages += [("llm.parse", self._llm_expansions, cpu_workers), ("device", self._device, 1), ("post", self._post, cpu_workers)]
+        batches = ({"docs": docs[i:i + batch_size]} for i in range(0, len(docs), batch_size))
+        for res in StagePipeline(stages, depth, self.recorder if self.recorder.enabled else None).run(batches):
+            yield from res
+
+    def expand_stagewise(self, docs, work_dir, shard_size=10000):
+        return StageScheduler(self, work_dir, shard_size).run(docs)
+
     def d2q_only(self, doc_id, doc):
+        self.recorder.count("docs")
         if self.d2q:
             self.d2q.load()
-            queries = self.d2q.generate(doc)
+            with self.recorder.stage("d2q", 1) as span:
+                queries = self.d2q.generate(doc)
+                span.items_out = len(queries)
         else:
             queries = []
         return {"doc_id": doc_id, "original": doc, "queries": queries, "expanded": f"{doc} {' '.join(queries)}"}
@@ -1,8 +1,14 @@
-import csv
+import time
+from itertools import islice
 import requests
 from pathlib import Path
 from dataclasses import dataclass
 from ..config import config
+from .cache import ResultCache
+from .collection import Collection
+from .results_store import ResultStore, default_path, tsv_field
+
+GENERATION_CHECK_S = 5.0
 
 
 @dataclass
@@ -13,46 +19,82 @@ class SearchResult:
     text: str
 
 
+# Result caching is opt-in: it only takes effect against a backend whose /health reports a generation,
+# since without one a rebuilt index would keep serving the old results
 class Bridge:
-    def __init__(self, data_dir=None, output_dir=None, api_url=None):
+    def __init__(self, data_dir=None, output_dir=None, api_url=None, cache=False):
         self.data_dir = Path(data_dir or config.data_dir)
         self.output_dir = Path(output_dir or config.output_dir)
         self.api_url = api_url or getattr(config, 'indexer_api_url', 'http://localhost:8080')
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.cache = cache if isinstance(cache, ResultCache) else (ResultCache() if cache else None)
+        self.checked = None
 
-    def read(self, filename=None, limit=None):
+    def collection(self, filename=None):
         path = self.data_dir / (filename or getattr(config, 'input_tsv', 'collection.tsv'))
         if not path.exists():
             raise FileNotFoundError(f"Not found: {path}")
-        count = 0
-        with open(path, "r", encoding="utf-8") as f:
-            for row in csv.reader(f, delimiter="\t"):
-                if len(row) >= 2:
-                    yield row[0], row[1]
-                    count += 1
-                    if limit and count >= limit:
-                        break
+        return Collection(path)
+
+    def read(self, filename=None, limit=None):
+        with self.collection(filename) as c:
+            yield from (islice(c, limit) if limit else c)
 
     def write(self, results, filename=None):
         path = self.output_dir / (filename or getattr(config, 'output_tsv', 'expanded.tsv'))
         count = 0
         with open(path, "w", encoding="utf-8", newline="") as f:
-            w = csv.writer(f, delimiter="\t")
             for r in results:
-                w.writerow([r.get('doc_id', r.doc_id if hasattr(r, 'doc_id') else ''), r.get('expanded', r.expanded if hasattr(r, 'expanded') else '')])
+                get = r.get if isinstance(r, dict) else lambda k, d: getattr(r, k, d)
+                f.write(f"{tsv_field(get('doc_id', ''))}\t{tsv_field(get('expanded', ''))}\n")
                 count += 1
         return count, path
 
-    def search(self, query, mode="or", limit=10):
+    # One indexer TSV per variant, projected from a single store of all result fields
+    def write_comparison(self, results, variants=None, out_dir=None):
+        out_dir = Path(out_dir or self.output_dir / "compare")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        store = ResultStore(default_path(out_dir / "results.tsv"))
+        store.write(results)
+        return {v: path for v, (_, path) in store.project_all(out_dir, variants).items()}
+
+    def search(self, query, mode="or", limit=10, variant=None):
+        key = None
+        if self.cache and self.refresh_generation() is not None:
+            key = self.cache.key(query, mode, limit, variant)
+            hit = self.cache.get(key)
+            if hit is not None:
+                return list(hit)
+        params = {"q": query, "mode": mode, "limit": limit}
+        if variant:
+            params["variant"] = variant
         try:
-            resp = requests.get(f"{self.api_url}/search", params={"q": query, "mode": mode, "limit": limit}, timeout=30)
+            resp = requests.get(f"{self.api_url}/search", params=params, timeout=30)
             resp.raise_for_status()
-            return [SearchResult(doc_id=str(r.get("doc_id", "")), passage_id=str(r.get("passage_id", "")), score=float(r.get("score", 0)), text=r.get("text", "")) for r in resp.json().get("results", [])]
+            results = [SearchResult(doc_id=str(r.get("doc_id", "")), passage_id=str(r.get("passage_id", "")), score=float(r.get("score", 0)), text=r.get("text", "")) for r in resp.json().get("results", [])]
         except:
             return []
+        if key:
+            self.cache.put(key, results)
+        return list(results)
 
     def health(self):
         try:
             return requests.get(f"{self.api_url}/health", timeout=5).status_code == 200
         except:
             return False
+
+    # Backends report an index "generation" in /health that changes when a new index is loaded
+    def generation(self):
+        try:
+            resp = requests.get(f"{self.api_url}/health", timeout=5)
+            return resp.json().get("generation") if resp.status_code == 200 else None
+        except:
+            return None
+
+    def refresh_generation(self, force=False):
+        now = time.monotonic()
+        if force or self.checked is None or now - self.checked > GENERATION_CHECK_S:
+            self.checked = now
+            self.cache.set_generation(self.generation())
+        return self.cache.generation
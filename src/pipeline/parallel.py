@@ -0,0 +1,91 @@
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+SHARDS_PER_WORKER = 4
+RETRIES = 2
+
+_expander = None
+
+
+def _init(slots, expander_kwargs, threads, devices):
+    global _expander
+    slot = slots.get()
+    if devices:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(devices[slot % len(devices)])
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    from .expander import Expander
+    _expander = Expander(**expander_kwargs).load()
+
+
+def _run_shard(shard, docs, path, d2q_only):
+    fn = _expander.d2q_only if d2q_only else _expander.expand
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for doc_id, text in docs:
+            f.write(json.dumps(fn(doc_id, text)) + "\n")
+    tmp.replace(path)
+    return shard, len(docs)
+
+
+def shard_path(out_dir, shard):
+    return Path(out_dir) / f"shard_{shard:05d}.jsonl"
+
+
+def merge_shards(out_dir, num_shards):
+    for s in range(num_shards):
+        with open(shard_path(out_dir, s), encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+# Shard outputs from a run with different inputs or settings must not be reused
+def _check_manifest(out_dir, manifest):
+    path = out_dir / "manifest.json"
+    if path.exists():
+        with open(path) as f:
+            if json.load(f) == manifest:
+                return
+        for old in out_dir.glob("shard_*.jsonl"):
+            old.unlink()
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+
+
+def expand_parallel(docs, out_dir, workers, d2q_only=False, devices=None, threads=None, retries=RETRIES, **expander_kwargs):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    size = max(1, -(-len(docs) // (workers * SHARDS_PER_WORKER)))
+    shards = [docs[i:i + size] for i in range(0, len(docs), size)]
+    _check_manifest(out_dir, {"docs": len(docs), "shard_size": size, "first": docs[0][0] if docs else None,
+                              "last": docs[-1][0] if docs else None, "d2q_only": d2q_only, **expander_kwargs})
+    todo = [s for s in range(len(shards)) if not shard_path(out_dir, s).exists()]
+    print(f"{len(shards)} shards, {len(shards) - len(todo)} already done, {workers} workers x {threads} threads")
+
+    ctx = mp.get_context("spawn")
+    for attempt in range(retries + 1):
+        if not todo:
+            break
+        slots = ctx.Queue()
+        for i in range(workers):
+            slots.put(i)
+        failed = []
+        with ProcessPoolExecutor(min(workers, len(todo)), mp_context=ctx, initializer=_init,
+                                 initargs=(slots, expander_kwargs, threads, devices)) as pool:
+            pending = {s: pool.submit(_run_shard, s, shards[s], shard_path(out_dir, s), d2q_only) for s in todo}
+            for s, fut in pending.items():
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"Shard {s} failed (attempt {attempt + 1}): {e}")
+                    failed.append(s)
+        todo = failed
+
+    if todo:
+        raise RuntimeError(f"{len(todo)} shards failed after {retries + 1} attempts: {todo}")
+    return list(merge_shards(out_dir, len(shards)))
@@ -0,0 +1,103 @@
+import gzip
+import importlib.util
+import json
+from itertools import islice
+from pathlib import Path
+
+# pyarrow is optional and slow to import, so only probe for it here
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+CHUNK_ROWS = 10000
+TEXT_FIELDS = ["doc_id", "original", "expanded", "route"]
+LIST_FIELDS = ["gaps", "raw_expansions", "valid_expansions", "queries", "final"]
+INT_FIELDS = ["llm_tokens"]
+
+
+def _join(doc, items):
+    return f"{doc} {' '.join(items)}" if items else doc
+
+
+# Indexer input text for each evaluation variant, built from the stored fields
+VARIANTS = {
+    "original": (["original"], lambda r: r["original"]),
+    "expanded": (["original", "raw_expansions"], lambda r: _join(r["original"], r["raw_expansions"])),
+    "validated": (["original", "valid_expansions"], lambda r: _join(r["original"], r["valid_expansions"])),
+    "doc2query": (["original", "queries"], lambda r: _join(r["original"], r["queries"])),
+    "hqfde": (["expanded"], lambda r: r["expanded"]),
+}
+
+
+def tsv_field(text):
+    return " ".join(str(text).split())
+
+
+def _row(r):
+    row = {k: str(r.get(k) or "") for k in TEXT_FIELDS}
+    row.update({k: list(r.get(k) or []) for k in LIST_FIELDS})
+    row.update({k: int(r.get(k) or 0) for k in INT_FIELDS})
+    if not row["expanded"]:
+        row["expanded"] = row["original"]
+    return row
+
+
+def default_path(tsv_path):
+    return Path(tsv_path).with_suffix(".parquet" if HAS_ARROW else ".jsonl.gz")
+
+
+# Every field of the expansion results, written once in row chunks so any variant's TSV can be
+# projected later without rerunning models. Parquet (zstd) when pyarrow is installed, gzipped JSONL otherwise.
+class ResultStore:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.parquet = self.path.suffix == ".parquet"
+        if self.parquet and not HAS_ARROW:
+            raise ImportError("pyarrow is required for .parquet result stores")
+
+    def _schema(self):
+        import pyarrow as pa
+        return pa.schema([(k, pa.string()) for k in TEXT_FIELDS] + [(k, pa.list_(pa.string())) for k in LIST_FIELDS] +
+                         [(k, pa.int64()) for k in INT_FIELDS])
+
+    def write(self, results, chunk_rows=CHUNK_ROWS):
+        results = iter(results)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        count = 0
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = self._schema()
+            with pq.ParquetWriter(tmp, schema, compression="zstd") as w:
+                while chunk := [_row(r) for r in islice(results, chunk_rows)]:
+                    w.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                    count += len(chunk)
+        else:
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                for r in results:
+                    f.write(json.dumps(_row(r)) + "\n")
+                    count += 1
+        tmp.replace(self.path)
+        return count, self.path
+
+    def rows(self, columns=None):
+        if self.parquet:
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(self.path).iter_batches(batch_size=CHUNK_ROWS, columns=columns):
+                yield from batch.to_pylist()
+        else:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def project(self, variant, out_path):
+        fields, text = VARIANTS[variant]
+        count = 0
+        with open(out_path, "w", encoding="utf-8", newline="") as f:
+            for r in self.rows(["doc_id"] + fields):
+                f.write(f"{tsv_field(r['doc_id'])}\t{tsv_field(text(r))}\n")
+                count += 1
+        return count, Path(out_path)
+
+    def project_all(self, out_dir, variants=None, pattern="{variant}.tsv"):
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        return {v: self.project(v, out_dir / pattern.format(variant=v)) for v in (variants or VARIANTS)}
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import shutil
+import sys
+from pathlib import Path
+
+from ..config import BATCH_SIZE
+
+# Rough peak activation memory per item (MB) used to size batches from free GPU memory
+ITEM_MB = {"llm": 600, "nli": 40, "d2q": 150, "combiner": 20}
+MAX_BATCH = {"llm": 64, "nli": 512, "d2q": 128, "combiner": 1}
+HEADROOM = 0.8
+
+
+def auto_batch_size(stage, device, default=BATCH_SIZE):
+    if device != "cuda":
+        return min(default, MAX_BATCH[stage])
+    import torch
+    if not torch.cuda.is_available():
+        return min(default, MAX_BATCH[stage])
+    free, _ = torch.cuda.mem_get_info()
+    return max(1, min(MAX_BATCH[stage], int(free * HEADROOM / (ITEM_MB[stage] * 2 ** 20))))
+
+
+def _is_oom(e):
+    return "out of memory" in str(e).lower()
+
+
+# What a stage's output depends on besides its input rows; a change invalidates it and every later stage
+def _stage_config(stage, model):
+    if model is None:
+        return None
+    if stage == "combiner":
+        embedder = model.embedder
+        return [getattr(embedder, "model_name", None), model.threshold, model.max_expansions]
+    large = getattr(model, "large", None)
+    return [type(model).__name__, getattr(model, "model_name", None), getattr(model, "early_stop", None),
+            getattr(model, "num_queries", None), getattr(model, "band", None), getattr(large, "model_name", None)]
+
+
+def _digest(rows):
+    h = hashlib.sha1()
+    for row in rows:
+        h.update(json.dumps(row).encode("utf-8") + b"\n")
+    return h.hexdigest()
+
+
+def _empty_cache():
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+class StageScheduler:
+    STAGES = ["llm", "nli", "d2q", "combiner"]
+
+    def __init__(self, expander, work_dir, shard_size=10000):
+        self.exp = expander
+        self.work_dir = Path(work_dir)
+        self.shard_size = shard_size
+        self.recorder = expander.recorder
+
+    def _path(self, shard, stage):
+        return self.work_dir / f"shard_{shard:05d}" / f"{stage}.jsonl"
+
+    def _load(self, path):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def _save(self, path, rows):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(r) + "\n")
+        tmp.replace(path)
+
+    def _batched(self, stage, fn, items, empty):
+        bs = auto_batch_size(stage, self.exp.device)
+        out, i = [], 0
+        while i < len(items):
+            chunk = items[i:i + bs]
+            try:
+                with self.recorder.stage(stage, len(chunk)) as span:
+                    res = fn(chunk)
+                    span.items_out = sum(len(r) if isinstance(r, list) else 1 for r in res)
+            except Exception as e:
+                if _is_oom(e) and bs > 1:
+                    bs //= 2
+                    _empty_cache()
+                    continue
+                print(f"{stage.upper()} error: {e}")
+                res = [empty(item) for item in chunk]
+            out.extend(res)
+            i += len(chunk)
+        return out
+
+    def _llm(self, docs, prev):
+        todo = [i for i, p in enumerate(prev) if p["route"] == "full"]
+        runs = self._batched("llm", lambda c: self.exp.llm.run_batch([docs[i][1] for i in c]), todo, lambda i: {"gaps": [], "expansions": [], "tokens": 0})
+        out = [{"gaps": [], "raw_expansions": [], "llm_tokens": 0} for _ in docs]
+        for i, r in zip(todo, runs):
+            out[i] = {"gaps": r["gaps"], "raw_expansions": r["expansions"], "llm_tokens": r["tokens"]}
+        return out
+
+    def _nli(self, docs, prev):
+        pairs = [(d, p.get("raw_expansions", [])) for (_, d), p in zip(docs, prev)]
+        todo = [i for i, (_, raw) in enumerate(pairs) if raw]
+        # A failed chunk keeps its unvalidated expansions, as the serial path does
+        valid = self._batched("nli", lambda c: self.exp.nli.validate_batch([pairs[i] for i in c]), todo, lambda i: None)
+        out = [{} for _ in docs]
+        for i, v in zip(todo, valid):
+            if v is not None:
+                out[i] = {"valid_expansions": v}
+        return out
+
+    def _d2q(self, docs, prev):
+        todo = [i for i, p in enumerate(prev) if p["route"] != "skip"]
+        queries = self._batched("d2q", lambda c: self.exp.d2q.generate_batch([docs[i][1] for i in c]), todo, lambda i: [])
+        out = [{"queries": []} for _ in docs]
+        for i, q in zip(todo, queries):
+            out[i] = {"queries": q}
+        return out
+
+    def _combiner(self, docs, prev):
+        out = []
+        for (doc_id, doc), p in zip(docs, prev):
+            r = {"doc_id": doc_id, "original": doc, "gaps": [], "raw_expansions": [],
+                 "valid_expansions": [], "queries": [], "final": [], "expanded": doc, "llm_tokens": 0, **p}
+            if r["route"] == "skip":
+                out.append(r)
+                continue
+            valid = r["valid_expansions"] if "valid_expansions" in p else r["raw_expansions"]
+            out.append(self.exp.finish(r, valid, r["queries"]))
+        return out
+
+    # Stage files from a run with different documents, routes or shard size are all dropped; a changed
+    # stage config drops that stage's files and every later stage's, since they were built on its output
+    def _check_manifest(self, manifest):
+        manifest = json.loads(json.dumps(manifest))
+        path = self.work_dir / "manifest.json"
+        if path.exists():
+            with open(path) as f:
+                old = json.load(f)
+            if old == manifest:
+                return
+            if {k: v for k, v in old.items() if k != "stages"} != {k: v for k, v in manifest.items() if k != "stages"}:
+                stale = self.STAGES
+            else:
+                changed = [i for i, s in enumerate(self.STAGES) if old["stages"].get(s) != manifest["stages"][s]]
+                stale = self.STAGES[changed[0]:]
+            for stage in stale:
+                for f in self.work_dir.glob(f"shard_*/{stage}.jsonl"):
+                    f.unlink()
+            for d in self.work_dir.glob("shard_*"):
+                if d.is_dir() and not any(d.iterdir()):
+                    shutil.rmtree(d)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    def run(self, docs):
+        shards = [docs[i:i + self.shard_size] for i in range(0, len(docs), self.shard_size)]
+        state = [[{"route": self.exp.route(d)} for _, d in shard] for shard in shards]
+        models = {"llm": self.exp.llm, "nli": self.exp.nli, "d2q": self.exp.d2q, "combiner": self.exp.combiner}
+        self._check_manifest({"docs": len(docs), "shard_size": self.shard_size, "input": _digest(docs),
+                              "routes": _digest(p["route"] for shard in state for p in shard),
+                              "stages": {stage: _stage_config(stage, models[stage]) for stage in self.STAGES}})
+
+        for stage in self.STAGES:
+            model = models[stage]
+            if model is None:
+                continue
+            loaded = False
+            for s, shard in enumerate(shards):
+                path = self._path(s, stage)
+                rows = self._load(path) if path.exists() else None
+                if rows is None or len(rows) != len(shard):
+                    if not loaded:
+                        with self.recorder.stage(f"load.{stage}"):
+                            model.load()
+                        loaded = True
+                    rows = getattr(self, f"_{stage}")(shard, state[s])
+                    self._save(path, rows)
+                state[s] = rows if stage == "combiner" else [{**p, **r} for p, r in zip(state[s], rows)]
+            if loaded:
+                model.unload()
+                _empty_cache()
+        return [r for shard in state for r in shard]
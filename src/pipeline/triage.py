@@ -0,0 +1,90 @@
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+# full: LLM + NLI + Doc2Query, d2q: Doc2Query only, skip: keep the original text
+ROUTES = ("full", "d2q", "skip")
+MIN_WORDS = 8
+LONG_WORDS = 180
+FULL_SHARE = 0.3
+RARE_DF = 2
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _terms(text):
+    return _TOKEN.findall(text.lower())
+
+
+# Stemmed index terms; bm25.reader pulls in numpy, so it is imported on first use (cli imports FULL_SHARE)
+def _index_terms(text):
+    from ..bm25 import tokenize
+    return tokenize(text)
+
+
+# Too-short passages are skipped, long passages already cover their vocabulary and only get Doc2Query,
+# and the LLM budget goes to the top `full_share` of documents by specificity (mean normalised IDF
+# plus the share of rare terms queries are unlikely to contain)
+class Triage:
+    def __init__(self, full_share=FULL_SHARE, min_words=MIN_WORDS, long_words=LONG_WORDS):
+        self.full_share = full_share
+        self.min_words = min_words
+        self.long_words = long_words
+        self.df = Counter()
+        self.n = 0
+        self.threshold = math.inf
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    # Document frequencies from the BM25 index (lexicon.txt: term offset blocks postings df).
+    # Scoring goes through bm25.tokenize, so documents are looked up by the same stemmed terms.
+    def load_lexicon(self, index_dir="index"):
+        index_dir = Path(index_dir)
+        with open(index_dir / "lexicon.txt", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 5:
+                    self.df[parts[0]] = int(parts[4])
+        with open(index_dir / "doc_lengths.txt") as f:
+            self.n = sum(1 for line in f if line.strip())
+        return self
+
+    def fit(self, docs):
+        terms = [_index_terms(text) for _, text in docs]
+        if not self.n:
+            for t in terms:
+                self.df.update(set(t))
+            self.n = len(terms)
+        scores = sorted((self.score(t) for (_, text), t in zip(docs, terms)
+                         if self.min_words <= len(_terms(text)) <= self.long_words), reverse=True)
+        k = int(len(scores) * self.full_share)
+        self.threshold = scores[k - 1] if k else math.inf
+        return self
+
+    # `terms` are index terms: stemmed, stopwords dropped
+    def score(self, terms):
+        unique = set(terms)
+        if not unique or not self.n:
+            return 0.0
+        log_n = math.log(self.n + 1)
+        idf = sum(math.log((self.n + 1) / (self.df.get(t, 0) + 1)) for t in unique) / (len(unique) * log_n)
+        rare = sum(self.df.get(t, 0) <= RARE_DF for t in unique) / len(unique)
+        return idf + rare
+
+    def route(self, doc):
+        words = len(_terms(doc))
+        if words < self.min_words:
+            r = "skip"
+        elif words > self.long_words:
+            r = "d2q"
+        else:
+            r = "full" if self.score(_index_terms(doc)) >= self.threshold else "d2q"
+        with self.lock:
+            self.counts[r] += 1
+        return r
+
+    def report(self):
+        total = sum(self.counts.values()) or 1
+        return ", ".join(f"{r}: {self.counts[r]} ({self.counts[r] / total:.0%})" for r in ROUTES)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import argparse
+import time
 
 def run_demo(text):
     from hqf_de.pipeline.expander import Expander
@@ -18,9 +19,10 @@ def run_demo(text):
     exp.unload()
 
 
-def run_expansion(limit=None, d2q_only=False):
+def run_expansion(limit=None, d2q_only=False, metrics_dir=None, stage_major=False, workers=1, triage=False, dedup=False, nli_cascade=False):
     from hqf_de.pipeline.expander import Expander
     from hqf_de.pipeline.indexer_bridge import Bridge
+    from hqf_de.telemetry import Recorder
     from hqf_de.config import config
 
     print(f"\n{'='*60}\nHQF-DE Expansion\n{'='*60}")
@@ -33,22 +35,54 @@ def run_expansion(limit=None, d2q_only=False):
 
     docs = list(bridge.read(str(input_path.name), limit=limit))
     print(f"\n{len(docs)} docs loaded")
-
-    exp = Expander(use_llm=not d2q_only, use_nli=not d2q_only, use_d2q=True)
-    exp.load()
-
-    results = []
-    for i, (doc_id, text) in enumerate(docs):
-        r = exp.d2q_only(doc_id, text) if d2q_only else exp.expand(doc_id, text)
-        results.append(r)
-        if (i + 1) % 10 == 0:
-            print(f"  {i + 1}/{len(docs)}")
-
+    deduper = None
+    if dedup:
+        from hqf_de.pipeline.dedup import Deduper
+        deduper = Deduper().fit(docs)
+        docs = deduper.representatives()
+        print(f"{len(docs)} unique after dedup")
+
+    rec = Recorder(enabled=metrics_dir is not None)
+    tri = None
+    if triage:
+        from hqf_de.pipeline.triage import Triage
+        tri = Triage().fit(docs)
+    exp = Expander(use_llm=not d2q_only, use_nli=not d2q_only, use_d2q=True, recorder=rec, triage=tri, nli_cascade=nli_cascade)
     output_name = "expanded_d2q.tsv" if d2q_only else "expanded_hqfde.tsv"
+
+    start = time.perf_counter()
+    if workers > 1:
+        from hqf_de.pipeline.parallel import expand_parallel
+        results = expand_parallel(docs, config.output_dir / "shards", workers, d2q_only=d2q_only,
+                                  use_llm=not d2q_only, use_nli=not d2q_only, use_d2q=True, nli_cascade=nli_cascade)
+    elif stage_major and not d2q_only:
+        results = exp.expand_stagewise(docs, config.output_dir / "stages")
+    else:
+        exp.load()
+        results = []
+        for i, (doc_id, text) in enumerate(docs):
+            r = exp.d2q_only(doc_id, text) if d2q_only else exp.expand(doc_id, text)
+            results.append(r)
+            if (i + 1) % 10 == 0:
+                print(f"  {i + 1}/{len(docs)}")
+        exp.unload()
+    elapsed = time.perf_counter() - start
+
+    if deduper:
+        results = list(deduper.fan_out(results))
+        print(f"Dedup: {deduper.report(elapsed)}")
     n, path = bridge.write(iter(results), filename=output_name)
     print(f"\nDone! {n} docs -> {path}")
+    from hqf_de.pipeline.results_store import ResultStore, default_path
+    print(f"All fields -> {ResultStore(default_path(path)).write(results)[1]}")
+    if tri:
+        print(f"Routes: {tri.report()}")
+    if hasattr(exp.nli, "report") and workers == 1:
+        print(f"NLI cascade: {exp.nli.report()}")
 
-    exp.unload()
+    if metrics_dir:
+        print(rec.report())
+        rec.export(metrics_dir)
 
 
 def run_eval(num_queries=100, num_docs=1000):
@@ -83,13 +117,19 @@ def main():
     parser.add_argument("--evaluate", action="store_true")
     parser.add_argument("--limit", type=int)
     parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--metrics", type=str)
+    parser.add_argument("--stage-major", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--triage", action="store_true")
+    parser.add_argument("--dedup", action="store_true")
+    parser.add_argument("--nli-cascade", action="store_true")
 
     args = parser.parse_args()
 
     if args.demo:
         run_demo(args.demo)
     elif args.expand:
-        run_expansion(limit=args.limit, d2q_only=args.d2q_only)
+        run_expansion(limit=args.limit, d2q_only=args.d2q_only, metrics_dir=args.metrics, stage_major=args.stage_major, workers=args.workers, triage=args.triage, dedup=args.dedup, nli_cascade=args.nli_cascade)
     elif args.evaluate:
         run_eval(num_queries=args.queries, num_docs=args.limit or 1000)
     else:
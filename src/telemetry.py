@@ -0,0 +1,167 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FIELDS = ("calls", "wall_s", "gpu_s", "items_in", "items_out", "tokens", "errors")
+
+
+def _cuda():
+    torch = sys.modules.get("torch")
+    return torch if torch is not None and torch.cuda.is_available() else None
+
+
+class _NullSpan:
+    items_out = tokens = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("rec", "name", "items_in", "items_out", "tokens", "start", "gpu")
+
+    def __init__(self, rec, name, items_in):
+        self.rec = rec
+        self.name = name
+        self.items_in = items_in
+        self.items_out = 0
+        self.tokens = 0
+        self.gpu = None
+
+    def __enter__(self):
+        torch = _cuda()
+        if torch:
+            self.gpu = (torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True))
+            self.gpu[0].record()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        gpu_s = 0.0
+        if self.gpu:
+            self.gpu[1].record()
+            self.gpu[1].synchronize()
+            gpu_s = self.gpu[0].elapsed_time(self.gpu[1]) / 1000
+        self.rec._record(self, self.start, end, gpu_s, exc_type is not None)
+        return False
+
+
+class Recorder:
+    def __init__(self, enabled=True, trace=False, prefix="hqfde"):
+        self.enabled = enabled
+        self.trace = trace
+        self.prefix = prefix
+        self.stats = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self.counters = defaultdict(int)
+        self.events = []
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def stage(self, name, items_in=0):
+        return Span(self, name, items_in) if self.enabled else NULL_SPAN
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] += n
+
+    def _record(self, span, start, end, gpu_s, failed):
+        with self.lock:
+            s = self.stats[span.name]
+            s["calls"] += 1
+            s["wall_s"] += end - start
+            s["gpu_s"] += gpu_s
+            s["items_in"] += span.items_in
+            s["items_out"] += span.items_out
+            s["tokens"] += span.tokens
+            s["errors"] += failed
+            if self.trace:
+                self.events.append({"name": span.name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                                    "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6})
+
+    def peak_memory(self):
+        mem = {"rss_bytes": 0, "gpu_bytes": 0}
+        if resource:
+            mem["rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        torch = _cuda()
+        if torch:
+            mem["gpu_bytes"] = torch.cuda.max_memory_allocated()
+        return mem
+
+    def snapshot(self):
+        with self.lock:
+            return {"time": time.time(), "stages": {k: dict(v) for k, v in self.stats.items()},
+                    "counters": dict(self.counters), "peak_memory": self.peak_memory()}
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.counters.clear()
+            self.events.clear()
+
+    def export_jsonl(self, path):
+        snap = self.snapshot()
+        with open(path, "a") as f:
+            for name, s in snap["stages"].items():
+                f.write(json.dumps({"time": snap["time"], "stage": name, **s}) + "\n")
+            f.write(json.dumps({"time": snap["time"], "counters": snap["counters"], "peak_memory": snap["peak_memory"]}) + "\n")
+        return path
+
+    def export_prometheus(self, path):
+        snap = self.snapshot()
+        lines = []
+        for field in FIELDS:
+            metric = f"{self.prefix}_stage_{field.replace('_s', '_seconds')}_total"
+            lines += [f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{stage="{name}"}} {s[field]}' for name, s in snap["stages"].items()]
+        for name, value in snap["counters"].items():
+            lines += [f"# TYPE {self.prefix}_{name}_total counter", f"{self.prefix}_{name}_total {value}"]
+        for name, value in snap["peak_memory"].items():
+            lines += [f"# TYPE {self.prefix}_peak_{name} gauge", f"{self.prefix}_peak_{name} {value}"]
+        # Write-then-rename so the node exporter never reads a partial file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+        return path
+
+    def export_chrome_trace(self, path):
+        with self.lock:
+            events = list(self.events)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def export(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        paths = [self.export_jsonl(os.path.join(out_dir, "metrics.jsonl")), self.export_prometheus(os.path.join(out_dir, "metrics.prom"))]
+        if self.trace:
+            paths.append(self.export_chrome_trace(os.path.join(out_dir, "trace.json")))
+        return paths
+
+    def report(self):
+        lines = ["| Stage | Calls | Wall s | GPU s | In | Out | Tokens | Errors |", "|-------|-------|--------|-------|----|-----|--------|--------|"]
+        for name, s in self.snapshot()["stages"].items():
+            lines.append(f"| {name} | {s['calls']} | {s['wall_s']:.2f} | {s['gpu_s']:.2f} | {s['items_in']} | {s['items_out']} | {s['tokens']} | {s['errors']} |")
+        return "\n".join(lines)
+
+
+NULL_RECORDER = Recorder(enabled=False)